@@ -0,0 +1,45 @@
+from django.contrib import admin
+from django.utils.html import format_html
+
+from .models import SlowQuery
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    """журнал медленных запросов: сверху — больше всего суммарного времени"""
+    list_display = ('short_sql', 'source', 'calls', 'total_time_ms', 'average_time_ms', 'max_time_ms', 'last_seen')
+    list_filter = ('database', 'last_seen')
+    search_fields = ('normalized_sql', 'source')
+    ordering = ('-total_time',)
+    list_per_page = 50
+    fields = (
+        'normalized_sql', 'source', 'database', 'calls', 'total_time', 'max_time',
+        'first_seen', 'last_seen', 'sql', 'params', 'plan_display',
+    )
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False  # записи только смотрят и удаляют
+
+    @admin.display(description='Запрос')
+    def short_sql(self, obj):
+        return obj.normalized_sql[:120]
+
+    @admin.display(description='Всего, мс', ordering='total_time')
+    def total_time_ms(self, obj):
+        return round(obj.total_time * 1000, 1)
+
+    @admin.display(description='Среднее, мс')
+    def average_time_ms(self, obj):
+        return round(obj.average_time * 1000, 1)
+
+    @admin.display(description='Максимум, мс', ordering='max_time')
+    def max_time_ms(self, obj):
+        return round(obj.max_time * 1000, 1)
+
+    @admin.display(description='План (EXPLAIN)')
+    def plan_display(self, obj):
+        return format_html('<pre style="white-space: pre-wrap;">{}</pre>', obj.plan)
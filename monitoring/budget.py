@@ -0,0 +1,108 @@
+"""Бюджеты SQL-запросов для view и блоков кода.
+
+    @query_budget(7)
+    def task_list(request): ...
+
+    class TaskViewSet(QueryBudgetMixin, ...):
+        query_budgets = {'list': 6, 'retrieve': 5}
+
+    with query_budget(3, 'импорт строки'):
+        ...
+
+Запросы считает обёртка SQL из monitoring/metrics.py (в том числе из
+sync_to_async-потоков async-view). Если блок сделал больше запросов, чем
+разрешено, при settings.QUERY_BUDGET_STRICT (по умолчанию — DEBUG и
+manage.py test) выбрасывается QueryBudgetExceeded со списком запросов,
+иначе — предупреждение в лог monitoring.budget. Бюджет задаёт потолок,
+который не должен зависеть от числа строк (размера страницы и т. п.).
+"""
+import functools
+import logging
+from contextlib import nullcontext
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_active = ContextVar('query_budgets', default=())
+
+# управление транзакцией не считается: его число зависит от СУБД и вложенности atomic (в тестах — SAVEPOINT)
+TRANSACTION_STATEMENTS = ('BEGIN', 'SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def count(sql):
+    budgets = _active.get()
+    if budgets and not sql.startswith(TRANSACTION_STATEMENTS):
+        for budget in budgets:
+            budget.queries.append(sql)
+
+
+class query_budget:
+    """Не больше limit запросов в блоке или view.
+
+    Для view limit может быть функцией от её аргументов — для действий,
+    где число запросов законно растёт с входными данными (несколько файлов).
+    """
+
+    def __init__(self, limit, name=None):
+        self.limit = limit
+        self.name = name
+
+    def __enter__(self):
+        self.queries = []
+        self._token = _active.set(_active.get() + (self,))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _active.reset(self._token)
+        if exc_type is None:
+            self.check()
+
+    def check(self):
+        if len(self.queries) <= self.limit:
+            return
+        message = f'{self.name or "блок"}: {len(self.queries)} SQL-запросов при бюджете {self.limit}'
+        if getattr(settings, 'QUERY_BUDGET_STRICT', settings.DEBUG):
+            raise QueryBudgetExceeded(message + ':\n' + '\n'.join(self.queries))
+        logger.warning(message)
+
+    def __call__(self, view):
+        limit, name = self.limit, self.name or view.__qualname__
+
+        def budget(args, kwargs):
+            return query_budget(limit(*args, **kwargs) if callable(limit) else limit, name)
+
+        if iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def wrapper(*args, **kwargs):
+                with budget(args, kwargs):
+                    return await view(*args, **kwargs)
+        else:
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                with budget(args, kwargs):
+                    return view(*args, **kwargs)
+        return wrapper
+
+
+class QueryBudgetMixin:
+    """Для DRF viewset-ов: query_budgets = {действие: лимит} на весь dispatch (вместе с аутентификацией)"""
+
+    query_budgets = {}
+
+    def query_budget(self, action):
+        limit = self.query_budgets.get(action)
+        if limit is None:
+            return nullcontext()
+        return query_budget(limit, f'{type(self).__name__}.{action}')
+
+    def dispatch(self, request, *args, **kwargs):
+        action = getattr(self, 'action_map', {}).get(request.method.lower())
+        with self.query_budget(action):
+            return super().dispatch(request, *args, **kwargs)
@@ -0,0 +1,222 @@
+"""Метрики запросов в памяти процесса (отдаются в формате Prometheus на /metrics).
+
+На каждый запрос MetricsMiddleware заводит RequestMetrics в contextvar,
+а счётчики в него пишут:
+- обёртка выполнения SQL (connection.execute_wrappers) — число запросов и их
+  время; она же передаёт запросы дольше порога в журнал медленных запросов
+  (monitoring/slow_queries.py), в том числе вне HTTP-запросов, и в открытые
+  бюджеты запросов (monitoring/budget.py);
+- measure('serializer') — время сериализации (TimedSerializerMixin и быстрый
+  сериализатор списка задач); сюда входят и ленивые запросы внутри сериализации.
+
+После ответа значения попадают в гистограммы с метками view (имя маршрута)
+и method. Вне запроса обёртка SQL только засекает время для журнала.
+
+Гистограммы свои у каждого процесса: Prometheus должен опрашивать процессы
+по отдельности (или складывать ряды по instance).
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework.serializers import ListSerializer
+
+from . import budget, slow_queries
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# имя -> (описание, границы корзин)
+HISTOGRAMS = {
+    'taskflow_http_request_duration_seconds': ('Время обработки запроса', DURATION_BUCKETS),
+    'taskflow_db_queries_per_request': ('Число SQL-запросов за запрос', QUERY_BUCKETS),
+    'taskflow_db_duration_seconds': ('Суммарное время SQL-запросов за запрос', DURATION_BUCKETS),
+    'taskflow_serializer_duration_seconds': ('Время сериализации за запрос', DURATION_BUCKETS),
+    'taskflow_http_response_size_bytes': ('Размер тела ответа', SIZE_BUCKETS),
+}
+REQUESTS_TOTAL = 'taskflow_http_requests_total'
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # последняя корзина — +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def format_labels(labels):
+    def escape(value):
+        return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels) + '}'
+
+
+def format_number(value):
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    """гистограммы по (метрика, view, method) и счётчик ответов по статусу"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._requests = Counter()
+
+    def record(self, view, method, status, values):
+        """values: {имя гистограммы: значение}; одна блокировка на запрос"""
+        with self._lock:
+            self._requests[view, method, status] += 1
+            for name, value in values.items():
+                key = (name, view, method)
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = Histogram(HISTOGRAMS[name][1])
+                histogram.observe(value)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._requests.clear()
+
+    def render(self):
+        """текстовый формат экспозиции Prometheus 0.0.4"""
+        with self._lock:
+            histograms = {
+                key: (list(histogram.counts), histogram.sum, histogram.count)
+                for key, histogram in self._histograms.items()
+            }
+            requests = dict(self._requests)
+
+        lines = [f'# HELP {REQUESTS_TOTAL} Ответы по view, методу и статусу', f'# TYPE {REQUESTS_TOTAL} counter']
+        for (view, method, status), count in sorted(requests.items()):
+            labels = format_labels([('view', view), ('method', method), ('status', status)])
+            lines.append(f'{REQUESTS_TOTAL}{labels} {count}')
+
+        for name, (description, buckets) in HISTOGRAMS.items():
+            lines += [f'# HELP {name} {description}', f'# TYPE {name} histogram']
+            for (metric, view, method), (counts, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                labels = [('view', view), ('method', method)]
+                cumulative = 0
+                for bound, bucket_count in zip((*map(float, buckets), '+Inf'), counts):
+                    cumulative += bucket_count
+                    bucket_labels = format_labels([*labels, ('le', format_number(bound))])
+                    lines.append(f'{name}_bucket{bucket_labels} {cumulative}')
+                lines.append(f'{name}_sum{format_labels(labels)} {format_number(total)}')
+                lines.append(f'{name}_count{format_labels(labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class RequestMetrics:
+    """счётчики одного запроса (общие для sync_to_async-потоков этого запроса)"""
+
+    __slots__ = ('view', 'queries', 'db_time', 'serializer_time')
+
+    def __init__(self, view=''):
+        self.view = view  # источник для журнала медленных запросов; имя view — после разрешения URL
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+
+
+_current = ContextVar('request_metrics', default=None)
+
+
+def start(view=''):
+    return _current.set(RequestMetrics(view))
+
+
+def current():
+    return _current.get()
+
+
+def finish(token):
+    metrics = _current.get()
+    _current.reset(token)
+    return metrics
+
+
+@contextmanager
+def measure(name):
+    """добавляет время блока к счётчику name (serializer) текущего запроса"""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        setattr(metrics, f'{name}_time', getattr(metrics, f'{name}_time') + time.perf_counter() - started)
+
+
+def observe_query(execute, sql, params, many, context):
+    """обёртка connection.execute_wrapper: счётчики текущего запроса и журнал медленных запросов"""
+    if slow_queries.recording():
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)  # упавшие запросы не учитываются
+    elapsed = time.perf_counter() - started
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.queries += 1
+        metrics.db_time += elapsed
+    budget.count(sql)
+    limit = slow_queries.threshold()
+    if limit is not None and elapsed >= limit:
+        slow_queries.record(
+            context['connection'], sql, params, many, elapsed, metrics.view if metrics is not None else None,
+        )
+    return result
+
+
+def install_wrapper(sender, connection, **kwargs):
+    # соединения свои у каждого потока и алиаса (и переоткрываются) — обёртка ставится один раз
+    if observe_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(observe_query)
+
+
+def install():
+    """ставит обёртку на уже открытые соединения текущего потока и на все новые"""
+    connection_created.connect(install_wrapper, dispatch_uid='monitoring.metrics.install_wrapper')
+    for connection in connections.all(initialized_only=True):
+        install_wrapper(None, connection)
+
+
+class TimedListSerializer(ListSerializer):
+    @property
+    def data(self):
+        with measure('serializer'):
+            return super().data
+
+
+class TimedSerializerMixin:
+    """Время .data сериализатора (и списка из many=True) попадает в метрики запроса"""
+
+    @property
+    def data(self):
+        with measure('serializer'):
+            return super().data
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        serializer = super().many_init(*args, **kwargs)
+        if type(serializer) is ListSerializer:
+            serializer.__class__ = TimedListSerializer
+        return serializer
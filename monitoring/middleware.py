@@ -0,0 +1,71 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from . import metrics
+
+
+def view_label(request):
+    """имя маршрута (task-list, task_list, ...), без него — шаблон пути"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'  # 404 до view и редиректы CommonMiddleware
+    return match.view_name or match.route
+
+
+class MetricsMiddleware:
+    """Время, SQL-запросы, сериализация и размер ответа каждого запроса -> monitoring.metrics.
+
+    Стоит первой в MIDDLEWARE: время включает все middleware, размер — уже сжатого тела.
+    У потоковых ответов (SSE) время — до начала потока, размер не учитывается.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        token = metrics.start(f'{request.method} {request.path}')
+        try:
+            response = self.get_response(request)
+        finally:
+            request_metrics = metrics.finish(token)
+        self.record(request, response, request_metrics, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        token = metrics.start(f'{request.method} {request.path}')
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_metrics = metrics.finish(token)
+        self.record(request, response, request_metrics, time.perf_counter() - started)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request_metrics = metrics.current()
+        if request_metrics is not None:
+            request_metrics.view = f'{request.method} {view_label(request)}'
+
+    def record(self, request, response, request_metrics, elapsed):
+        values = {
+            'taskflow_http_request_duration_seconds': elapsed,
+            'taskflow_db_queries_per_request': request_metrics.queries,
+            'taskflow_db_duration_seconds': request_metrics.db_time,
+            'taskflow_serializer_duration_seconds': request_metrics.serializer_time,
+        }
+        if not response.streaming:
+            values['taskflow_http_response_size_bytes'] = len(response.content)
+        metrics.registry.record(view_label(request), request.method, str(response.status_code), values)
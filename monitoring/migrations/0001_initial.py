@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=40, unique=True, verbose_name='Отпечаток')),
+                ('normalized_sql', models.TextField(verbose_name='Запрос (без значений)')),
+                ('sql', models.TextField(verbose_name='Самый медленный пример')),
+                ('params', models.TextField(blank=True, verbose_name='Параметры примера')),
+                ('plan', models.TextField(blank=True, verbose_name='План (EXPLAIN)')),
+                ('source', models.CharField(blank=True, max_length=255, verbose_name='Источник')),
+                ('database', models.CharField(max_length=64, verbose_name='БД')),
+                ('calls', models.PositiveIntegerField(default=1, verbose_name='Вызовов')),
+                ('total_time', models.FloatField(default=0, verbose_name='Всего, с')),
+                ('max_time', models.FloatField(default=0, verbose_name='Максимум, с')),
+                ('first_seen', models.DateTimeField(auto_now_add=True, verbose_name='Впервые')),
+                ('last_seen', models.DateTimeField(auto_now=True, verbose_name='Последний раз')),
+            ],
+            options={
+                'verbose_name': 'Медленный запрос',
+                'verbose_name_plural': 'Медленные запросы',
+                'db_table': 'monitoring_slow_query',
+                'ordering': ['-total_time'],
+            },
+        ),
+    ]
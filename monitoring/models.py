@@ -0,0 +1,30 @@
+from django.db import models
+
+
+class SlowQuery(models.Model):
+    """медленный SQL-запрос; повторы с тем же отпечатком копятся в одной строке"""
+    fingerprint = models.CharField('Отпечаток', max_length=40, unique=True)
+    normalized_sql = models.TextField('Запрос (без значений)')
+    sql = models.TextField('Самый медленный пример')
+    params = models.TextField('Параметры примера', blank=True)
+    plan = models.TextField('План (EXPLAIN)', blank=True)
+    source = models.CharField('Источник', max_length=255, blank=True)  # view или команда manage.py
+    database = models.CharField('БД', max_length=64)
+    calls = models.PositiveIntegerField('Вызовов', default=1)
+    total_time = models.FloatField('Всего, с', default=0)
+    max_time = models.FloatField('Максимум, с', default=0)
+    first_seen = models.DateTimeField('Впервые', auto_now_add=True)
+    last_seen = models.DateTimeField('Последний раз', auto_now=True)
+
+    class Meta:
+        db_table = 'monitoring_slow_query'
+        verbose_name = 'Медленный запрос'
+        verbose_name_plural = 'Медленные запросы'
+        ordering = ['-total_time']
+
+    def __str__(self):
+        return self.normalized_sql[:80]
+
+    @property
+    def average_time(self):
+        return self.total_time / self.calls if self.calls else 0
@@ -0,0 +1,136 @@
+"""Журнал медленных SQL-запросов (модель SlowQuery, страница в админке).
+
+Обёртка выполнения SQL из monitoring/metrics.py передаёт сюда каждый
+запрос дольше settings.SLOW_QUERY_THRESHOLD_MS. Для него сразу, на том же
+соединении, снимается план: EXPLAIN (EXPLAIN QUERY PLAN в SQLite), а при
+SLOW_QUERY_EXPLAIN_ANALYZE — EXPLAIN ANALYZE, только для SELECT (ANALYZE
+выполняет запрос ещё раз).
+
+Запросы группируются по отпечатку — тексту без значений (строки, числа,
+списки IN (...)) — и копят число вызовов, суммарное и максимальное время;
+пример, параметры и план хранятся от самого медленного вызова. Запись
+в БД откладывается до коммита текущей транзакции (transaction.on_commit):
+откат не ломается посторонней записью, а собственные запросы журнала
+в него не попадают.
+"""
+import hashlib
+import logging
+import re
+import sys
+from contextlib import nullcontext
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+EXPLAINABLE = ('select', 'with', 'insert', 'update', 'delete')
+# долгий BEGIN IMMEDIATE — ожидание блокировки, а не запрос; к тому же он идёт, пока
+# соединение ещё в autocommit, и запись из on_commit начала бы транзакцию внутри транзакции
+TRANSACTION_STATEMENTS = ('begin', 'commit', 'rollback', 'savepoint', 'release')
+
+_NORMALIZE = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),                     # строки
+    (re.compile(r'(?<![\w."])-?\d+(?:\.\d+)?(?![\w"])'), '?'),  # числа (не в именах)
+    (re.compile(r'%s|\?'), '?'),                               # плейсхолдеры
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),        # IN (?, ?, ...) любой длины
+    (re.compile(r'\s+'), ' '),
+]
+
+_recording = ContextVar('slow_query_recording', default=False)
+
+
+def normalize(sql):
+    for pattern, replacement in _NORMALIZE:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def fingerprint(sql):
+    return hashlib.sha1(normalize(sql).encode()).hexdigest()
+
+
+def threshold():
+    """порог в секундах; None — журнал выключен"""
+    value = getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', 0)
+    return value / 1000 if value else None
+
+
+def command_source():
+    """источник запросов вне HTTP: команда manage.py или скрипт"""
+    argv = sys.argv
+    if len(argv) > 1 and argv[0].endswith(('manage.py', 'django-admin')):
+        return f'manage.py {argv[1]}'
+    return argv[0] if argv else ''
+
+
+def explain(connection, sql, params):
+    statement = sql.lstrip().split(None, 1)[0].lower() if sql.strip() else ''
+    if statement not in EXPLAINABLE:
+        return ''
+    analyze = statement in ('select', 'with') and getattr(settings, 'SLOW_QUERY_EXPLAIN_ANALYZE', False)
+    try:
+        prefix = connection.ops.explain_query_prefix(**({'analyze': True} if analyze else {}))
+    except ValueError:  # ANALYZE не поддерживается этой СУБД
+        prefix = connection.ops.explain_query_prefix()
+    # внутри транзакции — точка сохранения: ошибка EXPLAIN не должна её сломать
+    guard = transaction.atomic(using=connection.alias) if connection.in_atomic_block else nullcontext()
+    try:
+        with guard, connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            rows = cursor.fetchall()
+    except DatabaseError as exc:
+        return f'EXPLAIN не удался: {exc}'
+    return '\n'.join(' '.join(str(value) for value in row) for row in rows)
+
+
+def recording():
+    """идут собственные запросы журнала (EXPLAIN, запись) — их не учитываем"""
+    return _recording.get()
+
+
+def record(connection, sql, params, many, duration, source):
+    """вызывается из обёртки SQL для запросов дольше порога"""
+    if sql.lstrip()[:10].lower().startswith(TRANSACTION_STATEMENTS):
+        return
+    token = _recording.set(True)
+    try:
+        plan = '' if many else explain(connection, sql, params)
+    finally:
+        _recording.reset(token)
+    entry = {
+        'fingerprint': fingerprint(sql),
+        'normalized_sql': normalize(sql),
+        'sql': sql,
+        'params': '' if params is None else repr(params)[:10000],
+        'plan': plan,
+        'source': (source or command_source())[:255],
+        'database': connection.alias,
+    }
+    transaction.on_commit(lambda: save(entry, duration), using=connection.alias)
+
+
+def save(entry, duration):
+    from .models import SlowQuery
+
+    token = _recording.set(True)
+    try:
+        with transaction.atomic():
+            queries = SlowQuery.objects.filter(fingerprint=entry['fingerprint'])
+            updated = queries.update(
+                calls=F('calls') + 1, total_time=F('total_time') + duration, last_seen=timezone.now(),
+            )
+            if not updated:
+                SlowQuery.objects.get_or_create(
+                    fingerprint=entry['fingerprint'], defaults={**entry, 'total_time': duration, 'max_time': duration},
+                )
+            else:
+                sample = {name: entry[name] for name in ('sql', 'params', 'plan', 'source', 'database')}
+                queries.filter(max_time__lt=duration).update(max_time=duration, **sample)
+    except DatabaseError:
+        logger.exception('не удалось записать медленный запрос')  # например, нет миграции
+    finally:
+        _recording.reset(token)
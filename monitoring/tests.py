@@ -0,0 +1,211 @@
+import re
+from contextlib import contextmanager
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+
+from tasks.models import Project, Task
+from . import slow_queries
+from .budget import QueryBudgetExceeded, query_budget
+from .metrics import Registry, registry
+from .models import SlowQuery
+
+User = get_user_model()
+
+
+class QueryBudgetTestMixin:
+    """assertMaxQueries: потолок запросов для блока в тестах (в отличие от assertNumQueries — не точное число)"""
+
+    @contextmanager
+    def assertMaxQueries(self, limit):
+        with query_budget(float('inf')) as budget:
+            yield budget
+        self.assertLessEqual(
+            len(budget.queries), limit,
+            f'{len(budget.queries)} SQL-запросов при бюджете {limit}:\n' + '\n'.join(budget.queries),
+        )
+
+
+def sample(text, name, **labels):
+    """значение ряда name{labels...} из вывода /metrics"""
+    for line in text.splitlines():
+        match = re.fullmatch(r'(\w+)\{(.*)\} (\S+)', line)
+        if match and match[1] == name and dict(re.findall(r'(\w+)="([^"]*)"', match[2])) == labels:
+            return float(match[3])
+    return None
+
+
+@override_settings(API_RESPONSE_CACHE_TIMEOUT=0)
+class MetricsMiddlewareTests(TestCase):
+
+    def setUp(self):
+        registry.reset()
+        self.user = User.objects.create_user('author')
+        project = Project.objects.create(title='Проект', owner=self.user)
+        for number in range(3):
+            Task.objects.create(title=f'Задача {number}', project=project, author=self.user)
+        self.client.force_login(self.user)
+
+    def metrics(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return response.content.decode()
+
+    def test_records_view_queries_serializer_and_size(self):
+        response = self.client.get('/api/tasks/', HTTP_ACCEPT_ENCODING='identity')
+        self.assertEqual(response.status_code, 200)
+        self.client.get('/api/tasks/', HTTP_ACCEPT_ENCODING='identity')
+        text = self.metrics()
+
+        labels = {'view': 'task-list', 'method': 'GET'}
+        self.assertEqual(sample(text, 'taskflow_http_requests_total', status='200', **labels), 2)
+        self.assertEqual(sample(text, 'taskflow_http_request_duration_seconds_count', **labels), 2)
+        self.assertEqual(sample(text, 'taskflow_http_request_duration_seconds_bucket', le='+Inf', **labels), 2)
+        self.assertGreater(sample(text, 'taskflow_db_queries_per_request_sum', **labels), 2)
+        self.assertGreater(sample(text, 'taskflow_db_duration_seconds_sum', **labels), 0)
+        self.assertGreater(sample(text, 'taskflow_serializer_duration_seconds_sum', **labels), 0)
+        self.assertEqual(
+            sample(text, 'taskflow_http_response_size_bytes_sum', **labels), 2 * len(response.content)
+        )
+
+    def test_html_views_and_unmatched_paths(self):
+        self.client.get('/tasks/')
+        self.client.get('/no-such-page/')
+        text = self.metrics()
+        self.assertEqual(sample(text, 'taskflow_http_requests_total', view='task_list', method='GET', status='200'), 1)
+        self.assertEqual(sample(text, 'taskflow_http_requests_total', view='unmatched', method='GET', status='404'), 1)
+
+    def test_queries_outside_requests_are_not_counted(self):
+        Task.objects.count()
+        self.assertEqual(registry.render().count('taskflow_http_requests_total{'), 0)
+
+    @override_settings(METRICS_ALLOWED_IPS=[])
+    def test_metrics_endpoint_is_restricted(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+
+class RegistryTests(TestCase):
+
+    def test_buckets_are_cumulative(self):
+        registry_ = Registry()
+        for queries in (0, 1, 7, 500):
+            registry_.record('view', 'GET', '200', {'taskflow_db_queries_per_request': queries})
+        text = registry_.render()
+        labels = {'view': 'view', 'method': 'GET'}
+        self.assertEqual(sample(text, 'taskflow_db_queries_per_request_bucket', le='0.0', **labels), 1)
+        self.assertEqual(sample(text, 'taskflow_db_queries_per_request_bucket', le='10.0', **labels), 3)
+        self.assertEqual(sample(text, 'taskflow_db_queries_per_request_bucket', le='+Inf', **labels), 4)
+        self.assertEqual(sample(text, 'taskflow_db_queries_per_request_sum', **labels), 508)
+
+
+class SlowQueryLogTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('author')
+        project = Project.objects.create(title='Проект', owner=self.user)
+        Task.objects.create(title='Задача', project=project, author=self.user)
+
+    def test_fingerprint_ignores_values(self):
+        first = slow_queries.fingerprint(
+            'SELECT "t1"."id" FROM "t1" WHERE "t1"."id" IN (1, 2, 3) AND "t1"."title" = \'a\'\'b\' LIMIT 21'
+        )
+        second = slow_queries.fingerprint(
+            'SELECT  "t1"."id" FROM "t1"\nWHERE "t1"."id" IN (%s) AND "t1"."title" = %s LIMIT 5'
+        )
+        self.assertEqual(first, second)
+        self.assertIn('"t1"', slow_queries.normalize('SELECT * FROM "t1" WHERE x = 1'))
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0.000001, API_RESPONSE_CACHE_TIMEOUT=0)
+    def test_slow_queries_are_logged_with_plan_and_source(self):
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get('/api/tasks/?status=todo')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get('/api/tasks/?status=done')
+
+        # разные значения фильтра — один отпечаток
+        entry = SlowQuery.objects.get(normalized_sql__startswith='SELECT COUNT(*)', normalized_sql__contains='"status"')
+        self.assertEqual(entry.calls, 2)
+        self.assertEqual(entry.source, 'GET task-list')
+        self.assertEqual(entry.database, 'default')
+        self.assertIn('tasks_task', entry.plan)
+        self.assertGreaterEqual(entry.total_time, entry.max_time)
+        # запросы журнала (EXPLAIN, запись) в журнал не попадают
+        self.assertFalse(SlowQuery.objects.filter(normalized_sql__contains='EXPLAIN').exists())
+        self.assertFalse(SlowQuery.objects.filter(normalized_sql__contains='monitoring_slow_query').exists())
+
+    def test_queries_outside_requests_name_the_command(self):
+        with override_settings(SLOW_QUERY_THRESHOLD_MS=0.000001), self.captureOnCommitCallbacks(execute=True):
+            Task.objects.filter(title__startswith='За').count()
+        entry = SlowQuery.objects.get(normalized_sql__contains='COUNT(*)')
+        self.assertTrue(entry.source.startswith('manage.py'))
+
+    def test_transaction_statements_are_not_logged(self):
+        with override_settings(SLOW_QUERY_THRESHOLD_MS=0.000001), self.captureOnCommitCallbacks() as callbacks:
+            slow_queries.record(connection, 'BEGIN IMMEDIATE', None, False, 1.0, None)
+        self.assertEqual(callbacks, [])
+
+    def test_nothing_logged_below_threshold(self):
+        with override_settings(SLOW_QUERY_THRESHOLD_MS=60000), self.captureOnCommitCallbacks(execute=True):
+            Task.objects.count()
+        self.assertFalse(SlowQuery.objects.exists())
+
+    def test_admin_lists_top_offenders(self):
+        SlowQuery.objects.create(fingerprint='a', normalized_sql='SELECT ?', sql='SELECT 1', database='default',
+                                 total_time=2, max_time=1, calls=2, plan='SCAN t')
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        response = self.client.get('/admin/monitoring/slowquery/')
+        self.assertContains(response, 'SELECT ?')
+        entry = SlowQuery.objects.get()
+        self.assertContains(self.client.get(f'/admin/monitoring/slowquery/{entry.pk}/change/'), 'SCAN t')
+
+
+class QueryBudgetTests(QueryBudgetTestMixin, TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('author')
+
+    def test_strict_budget_raises_with_queries(self):
+        with override_settings(QUERY_BUDGET_STRICT=True):
+            with self.assertRaisesMessage(QueryBudgetExceeded, 'SELECT'):
+                with query_budget(1, 'проверка'):
+                    User.objects.count()
+                    User.objects.count()
+
+    def test_lenient_budget_logs(self):
+        with override_settings(QUERY_BUDGET_STRICT=False), self.assertLogs('monitoring.budget', 'WARNING') as logs:
+            with query_budget(0, 'проверка'):
+                User.objects.count()
+        self.assertIn('проверка: 1 SQL-запросов при бюджете 0', logs.output[0])
+
+    def test_transaction_statements_are_not_counted(self):
+        with self.assertMaxQueries(1) as budget:
+            with transaction.atomic():
+                User.objects.count()
+        self.assertEqual(len(budget.queries), 1)
+
+    def test_decorator_with_limit_from_arguments(self):
+        @query_budget(lambda count: count)
+        def view(count):
+            for _ in range(count):
+                User.objects.exists()
+            return count
+
+        self.assertEqual(view(3), 3)
+        with override_settings(QUERY_BUDGET_STRICT=True), self.assertRaises(QueryBudgetExceeded):
+            query_budget(1)(lambda: [User.objects.exists() for _ in range(2)])()
+
+    def test_async_views_count_queries_from_threads(self):
+        @query_budget(1, 'async')
+        async def view():
+            return [user async for user in User.objects.all()] + [user async for user in User.objects.all()]
+
+        with override_settings(QUERY_BUDGET_STRICT=True), self.assertRaisesMessage(QueryBudgetExceeded, 'async: 2'):
+            async_to_sync(view)()
@@ -14,3 +14,11 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'taskflow_manager.settings')
 
 application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402 - после настройки Django
+
+if settings.DEBUG:
+    # статика для разработки, как у runserver (uvicorn её сам не раздаёт)
+    from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
+
+    application = ASGIStaticFilesHandler(application)
@@ -0,0 +1,45 @@
+"""Разбор CACHE_URL в словарь для settings.CACHES.
+
+    locmem://[имя]            — память процесса (по умолчанию, один процесс)
+    file:///путь/к/каталогу   — файлы; общий кеш для нескольких процессов на одной машине
+    redis://host:6379/0       — Redis или совместимый сервер (django.core.cache RedisCache)
+    dummy://                  — кеш выключен
+
+Параметры строки запроса: timeout (секунды) и key_prefix, остальные уходят в OPTIONS.
+"""
+from urllib.parse import parse_qsl, unquote, urlsplit, urlunsplit
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'rediss': 'django.core.cache.backends.redis.RedisCache',
+    'dummy': 'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def parse_cache_url(url, base_dir=None):
+    parts = urlsplit(url)
+    try:
+        backend = BACKENDS[parts.scheme]
+    except KeyError:
+        raise ValueError(f'неподдерживаемая схема CACHE_URL: {parts.scheme!r}')
+    query = dict(parse_qsl(parts.query))
+    config = {'BACKEND': backend}
+    if 'timeout' in query:
+        config['TIMEOUT'] = int(query.pop('timeout'))
+    if 'key_prefix' in query:
+        config['KEY_PREFIX'] = query.pop('key_prefix')
+
+    if parts.scheme == 'locmem':
+        config['LOCATION'] = parts.netloc or 'taskflow'
+    elif parts.scheme == 'file':
+        path = unquote(parts.path)
+        if base_dir is not None and not path.startswith('/'):
+            path = str(base_dir / path)
+        config['LOCATION'] = path
+    elif parts.scheme in ('redis', 'rediss'):
+        config['LOCATION'] = urlunsplit((parts.scheme, parts.netloc, parts.path, '', ''))
+    if query:
+        config['OPTIONS'] = query
+    return config
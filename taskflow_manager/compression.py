@@ -0,0 +1,103 @@
+"""Сжатие ответов по Accept-Encoding: brotli (если установлен) или gzip.
+
+Ответы короче settings.RESPONSE_COMPRESSION_MIN_SIZE байт не сжимаются —
+на них заголовки и время сжатия дороже выигрыша. Сжатый ответ отдаётся,
+только если он действительно короче. Для gzip, как в GZipMiddleware,
+добавляются случайные байты в заголовок (защита от BREACH). У brotli такого
+поля нет, поэтому ответы с CSRF-токеном (get_token вызывали при рендеринге)
+сжимаются только gzip. Middleware стоит выше CsrfViewMiddleware, и к её
+process_response флаг CSRF_COOKIE_NEEDS_UPDATE уже сброшен — поэтому токен
+определяется и по выставленной CSRF-cookie (carries_secret).
+"""
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - зависит от окружения
+    brotli = None
+
+
+def accepted_encodings(header):
+    """'gzip, br;q=0.5, *;q=0' -> {'gzip': 1.0, 'br': 0.5, '*': 0.0}"""
+    encodings = {}
+    for item in header.split(','):
+        name, _, params = item.strip().partition(';')
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        encodings[name.strip().lower()] = quality
+    return encodings
+
+
+def carries_secret(request, response):
+    """в теле ответа может быть CSRF-токен (при рендеринге вызывали get_token)
+
+    get_token помечает, что cookie нужно отправить; если CsrfViewMiddleware
+    уже обработала ответ, пометка сброшена, но cookie стоит в ответе. При
+    CSRF_USE_SESSIONS следов нет — тогда секретом считается любой известный
+    запросу токен.
+    """
+    if request.META.get('CSRF_COOKIE_NEEDS_UPDATE'):
+        return True
+    if settings.CSRF_USE_SESSIONS:
+        return 'CSRF_COOKIE' in request.META
+    return settings.CSRF_COOKIE_NAME in response.cookies
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """GZipMiddleware с brotli, выбором по q-значениям и порогом размера"""
+
+    brotli_quality = 5  # для динамических ответов: почти как 11, но в разы быстрее
+
+    def choose_encoding(self, request, allow_brotli=True):
+        encodings = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        supported = ['br', 'gzip'] if brotli is not None and allow_brotli else ['gzip']
+        default = encodings.get('*', 0.0)
+        best, best_quality = None, 0.0
+        for name in supported:
+            quality = encodings.get(name, default)
+            if quality > best_quality:
+                best, best_quality = name, quality
+        return best
+
+    def compress(self, content, encoding):
+        if encoding == 'br':
+            return brotli.compress(content, quality=self.brotli_quality)
+        return compress_string(content, max_random_bytes=self.max_random_bytes)
+
+    def process_response(self, request, response):
+        if response.get('Content-Type', '').startswith('text/event-stream'):
+            return response  # события должны уходить клиенту сразу, без буфера сжатия
+        if response.streaming:
+            # размер заранее неизвестен — как в GZipMiddleware (только gzip)
+            return super().process_response(request, response)
+
+        min_size = getattr(settings, 'RESPONSE_COMPRESSION_MIN_SIZE', 1024)
+        if len(response.content) < min_size or response.has_header('Content-Encoding'):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = self.choose_encoding(request, allow_brotli=not carries_secret(request, response))
+        if encoding is None:
+            return response
+
+        compressed = self.compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
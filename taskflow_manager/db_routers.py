@@ -0,0 +1,212 @@
+"""Маршрутизация чтения на реплики БД.
+
+Реплики перечисляются в settings.DATABASE_REPLICAS ({алиас: вес}), каждый
+алиас — обычная запись в DATABASES. На реплики уходят только чтения,
+явно помеченные как безопасные: внутри replica_reads() (контекстный
+менеджер и декоратор) или в viewset-ах с ReplicaReadMixin. Всё остальное,
+включая любые записи, идёт в default.
+
+После записи пользователь на DATABASE_REPLICA_PIN_SECONDS секунд
+закрепляется за основной БД (cookie, ReadYourWritesMiddleware), чтобы
+сразу видеть свои изменения. Реплика, отстающая больше чем на
+DATABASE_REPLICA_MAX_LAG секунд или недоступная, временно исключается.
+"""
+import random
+import time
+from contextlib import ContextDecorator
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DatabaseError, connections
+from rest_framework.permissions import SAFE_METHODS
+
+PRIMARY = 'default'
+PIN_COOKIE = 'db_primary_pin'
+
+# чтение в текущем контексте можно отдать реплике
+_use_replica = ContextVar('use_replica', default=False)
+# пользователь недавно писал — читаем только с основной БД
+_pinned = ContextVar('pinned_to_primary', default=False)
+# состояние текущего запроса ({'wrote': bool}), заводит middleware
+_request_state = ContextVar('db_request_state', default=None)
+
+# алиас -> (проверено до, отставание приемлемо)
+_lag_cache = {}
+
+
+class replica_reads(ContextDecorator):
+    """Разрешает чтение с реплик внутри блока или функции.
+
+        with replica_reads():
+            ...
+
+        @replica_reads()
+        def view(request): ...
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._tokens = []
+
+    def _recreate_cm(self):
+        # у декоратора свой экземпляр на каждый вызов — токены не смешиваются между потоками
+        return replica_reads(self.enabled)
+
+    def __enter__(self):
+        self._tokens.append(_use_replica.set(self.enabled))
+        return self
+
+    def __exit__(self, *exc):
+        _use_replica.reset(self._tokens.pop())
+        return False
+
+
+class primary_only(replica_reads):
+    """принудительно читает с основной БД (например, перед записью по прочитанным данным)"""
+
+    def __init__(self):
+        super().__init__(enabled=False)
+
+
+def get_replicas():
+    return {
+        alias: weight
+        for alias, weight in getattr(settings, 'DATABASE_REPLICAS', {}).items()
+        if weight > 0
+    }
+
+
+def replica_lag(alias):
+    """отставание реплики в секундах (0, если СУБД не сообщает)"""
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT CASE WHEN pg_is_in_recovery() '
+            'THEN COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) '
+            'ELSE 0 END'
+        )
+        return float(cursor.fetchone()[0])
+
+
+def is_replica_healthy(alias):
+    max_lag = getattr(settings, 'DATABASE_REPLICA_MAX_LAG', None)
+    if max_lag is None:
+        return True
+    now = time.monotonic()
+    checked_until, healthy = _lag_cache.get(alias, (0, True))
+    if now < checked_until:
+        return healthy
+    try:
+        healthy = replica_lag(alias) <= max_lag
+    except DatabaseError:
+        healthy = False
+    _lag_cache[alias] = (now + getattr(settings, 'DATABASE_REPLICA_CHECK_INTERVAL', 5), healthy)
+    return healthy
+
+
+def choose_replica():
+    """взвешенный случайный выбор среди здоровых реплик (None — читать с основной)"""
+    candidates = [(alias, weight) for alias, weight in get_replicas().items() if is_replica_healthy(alias)]
+    if not candidates:
+        return None
+    aliases, weights = zip(*candidates)
+    return random.choices(aliases, weights=weights)[0]
+
+
+def mark_write():
+    state = _request_state.get()
+    if state is not None:
+        state['wrote'] = True
+
+
+class ReplicaRouter:
+    """db_for_read — реплика только внутри replica_reads() и без закрепления за основной БД"""
+
+    def db_for_read(self, model, **hints):
+        if not _use_replica.get() or _pinned.get():
+            return PRIMARY
+        state = _request_state.get()
+        if state is not None and state.get('wrote'):
+            return PRIMARY  # в этом же запросе уже писали
+        return choose_replica() or PRIMARY
+
+    def db_for_write(self, model, **hints):
+        mark_write()
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплики — копии default, объекты с них можно связывать между собой
+        databases = {PRIMARY, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # схема на реплики приходит репликацией (для SQLite — копией файла)
+        return db == PRIMARY
+
+
+class ReadYourWritesMiddleware:
+    """Закрепляет пользователя за основной БД на короткое время после его записи.
+
+    Признак хранится в cookie со сроком DATABASE_REPLICA_PIN_SECONDS, поэтому
+    работает при любом числе процессов и без общего хранилища.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        pinned = _pinned.set(PIN_COOKIE in request.COOKIES)
+        state = _request_state.set({'wrote': False})
+        try:
+            response = self.get_response(request)
+            wrote = _request_state.get()['wrote']
+        finally:
+            _request_state.reset(state)
+            _pinned.reset(pinned)
+        return self.process_response(request, response, wrote)
+
+    async def __acall__(self, request):
+        # под ASGI: запросы ORM из sync_to_async видят копию этого контекста
+        pinned = _pinned.set(PIN_COOKIE in request.COOKIES)
+        state = _request_state.set({'wrote': False})
+        try:
+            response = await self.get_response(request)
+            wrote = _request_state.get()['wrote']
+        finally:
+            _request_state.reset(state)
+            _pinned.reset(pinned)
+        return self.process_response(request, response, wrote)
+
+    def process_response(self, request, response, wrote):
+        if wrote or request.method not in SAFE_METHODS:
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', 5),
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+
+class ReplicaReadMixin:
+    """Для DRF viewset-ов: действия из replica_actions на безопасных методах читают с реплик."""
+
+    replica_actions = ('list', 'retrieve')
+
+    def dispatch(self, request, *args, **kwargs):
+        action = getattr(self, 'action_map', {}).get(request.method.lower())
+        enabled = request.method in SAFE_METHODS and action in self.replica_actions
+        with replica_reads(enabled=enabled):
+            return super().dispatch(request, *args, **kwargs)
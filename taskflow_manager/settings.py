@@ -10,8 +10,13 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import sys
 from pathlib import Path
 
+from .cache_url import parse_cache_url
+from .database_url import parse_database_url
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -41,6 +46,7 @@ INSTALLED_APPS = [
     'django_filters',
     'users',
     'tasks',
+    'monitoring',
 
     'simple_history',  # для django-simple-history
     'import_export',   # для django-import-export
@@ -60,15 +66,54 @@ REST_FRAMEWORK = {
         'rest_framework.filters.OrderingFilter',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
-    'PAGE_SIZE': 10
+    'PAGE_SIZE': 10,
+    # orjson, если установлен (иначе — стандартный json), см. taskflow_manager/renderers.py
+    'DEFAULT_RENDERER_CLASSES': [
+        'taskflow_manager.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'taskflow_manager.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
+API_FAST_JSON = os.environ.get('API_FAST_JSON', '1') not in ('0', 'false', 'no')
+
+# async-версии страницы задач, модалок и чтения API задач/проектов (tasks/views_async.py);
+# имеет смысл под ASGI: uvicorn taskflow_manager.asgi:application --workers 4
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', '0') not in ('0', 'false', 'no')
+
+# доставка SSE-событий между процессами (tasks/events.py): LocalBackend — в пределах
+# процесса, CacheBackend — через общий кеш (CACHE_URL=redis://...)
+TASK_EVENTS_BACKEND = os.environ.get('TASK_EVENTS_BACKEND', 'tasks.events.LocalBackend')
+TASK_EVENTS_HEARTBEAT = 15  # секунд между комментариями-пингами в потоке
+
+# ответы меньше порога не сжимаются (taskflow_manager/compression.py)
+RESPONSE_COMPRESSION_MIN_SIZE = int(os.environ.get('RESPONSE_COMPRESSION_MIN_SIZE', 1024))
+
+# метрики запросов (время, SQL, сериализация, размер ответа) на /metrics, см. monitoring/metrics.py
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') not in ('0', 'false', 'no')
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1').split(',') if ip.strip()]
+# журнал медленных SQL-запросов с планами (админка: Monitoring -> Медленные запросы); 0 — выключить
+SLOW_QUERY_THRESHOLD_MS = int(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 500))
+# EXPLAIN ANALYZE для медленных SELECT (запрос выполняется повторно)
+SLOW_QUERY_EXPLAIN_ANALYZE = os.environ.get('SLOW_QUERY_EXPLAIN_ANALYZE', '0') not in ('0', 'false', 'no')
+# превышение бюджета запросов view (monitoring/budget.py): исключение при разработке и в тестах,
+# в остальных случаях — предупреждение в лог
+QUERY_BUDGET_STRICT = DEBUG or sys.argv[1:2] == ['test']
 
 MIDDLEWARE = [
+    # первой: время запроса целиком и размер уже сжатого ответа
+    'monitoring.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # до всех, кто читает или меняет тело ответа
+    'taskflow_manager.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'taskflow_manager.db_routers.ReadYourWritesMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -96,13 +141,56 @@ WSGI_APPLICATION = 'taskflow_manager.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# База берётся из DATABASE_URL (docker-compose задаёт Postgres), без неё — локальный SQLite.
+# DB_CONN_MAX_AGE — сколько секунд держать соединение между запросами (0 — закрывать сразу),
+# DB_POOL=1 (или размер) — пул соединений psycopg 3 вместо постоянных соединений.
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+DB_POOL = os.environ.get('DB_POOL')
+# SQLITE_TUNING=0 — SQLite без WAL/IMMEDIATE (как было раньше)
+SQLITE_TUNING = os.environ.get('SQLITE_TUNING', '1') not in ('0', 'false', 'no')
+
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': parse_database_url(
+        os.environ.get('DATABASE_URL', 'sqlite:///db.sqlite3'),
+        base_dir=BASE_DIR,
+        conn_max_age=DB_CONN_MAX_AGE,
+        pool=DB_POOL,
+        sqlite_tuning=SQLITE_TUNING,
+    )[0],
 }
 
+# Реплики для чтения: DATABASE_REPLICAS="postgres://...@replica1/taskflow?weight=2,db.replica.sqlite3:1"
+# (URL или путь к копии SQLite с необязательным весом). Локально реплика — копия db.sqlite3.
+DATABASE_REPLICAS = {}  # алиас -> вес при выборе
+for number, entry in enumerate(filter(None, os.environ.get('DATABASE_REPLICAS', '').split(',')), 1):
+    entry = entry.strip()
+    if '://' not in entry:
+        name, _, weight = entry.rpartition(':')
+        if not name or not weight.isdigit():
+            name, weight = entry, '1'
+        entry = f'sqlite:///{name}?weight={weight}'
+    alias = f'replica{number}'
+    DATABASES[alias], extra = parse_database_url(
+        entry, base_dir=BASE_DIR, conn_max_age=DB_CONN_MAX_AGE, pool=DB_POOL, sqlite_tuning=SQLITE_TUNING,
+    )
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS[alias] = extra['weight']
+
+DATABASE_ROUTERS = ['taskflow_manager.db_routers.ReplicaRouter']
+DATABASE_REPLICA_MAX_LAG = 5          # секунд; отстающая реплика временно не используется
+DATABASE_REPLICA_CHECK_INTERVAL = 5   # как часто проверять отставание, секунд
+DATABASE_REPLICA_PIN_SECONDS = 5      # сколько читать с основной БД после своей записи
+
+
+# Кеш: CACHE_URL=locmem:// (по умолчанию), file:///var/tmp/taskflow-cache для нескольких
+# процессов на одной машине или redis://localhost:6379/0
+CACHES = {
+    'default': parse_cache_url(os.environ.get('CACHE_URL', 'locmem://taskflow'), base_dir=BASE_DIR),
+}
+
+# Кеш ответов API (списки проектов и задач), секунд; 0 — выключить
+API_RESPONSE_CACHE_TIMEOUT = int(os.environ.get('API_RESPONSE_CACHE_TIMEOUT', 300))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -153,4 +241,11 @@ FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10 MB
 
 # Настройки для статических файлов
 MEDIA_URL = '/media/'
-MEDIA_ROOT = BASE_DIR / 'media'
\ No newline at end of file
+MEDIA_ROOT = BASE_DIR / 'media'
+# Хранение истории задач (команда prune_task_history)
+TASK_HISTORY_RETENTION = {
+    'keep_all_days': 90,       # моложе — все записи истории
+    'keep_daily_days': 730,    # до этого возраста — одна запись задачи в день, старше — удаляется
+    'batch_size': 5000,
+    'partition_months_ahead': 3,  # PostgreSQL: сколько будущих месячных секций создавать заранее
+}
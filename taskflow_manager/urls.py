@@ -3,22 +3,47 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework.routers import DefaultRouter
-from tasks.views_api import TaskViewSet, ProjectViewSet, AttachmentViewSet
+from tasks.views_api import TaskViewSet, ProjectViewSet, AttachmentViewSet, TaskHistoryViewSet, TagViewSet
+from tasks import views_async
+from tasks.urls import task_urlpatterns
+from monitoring import views as monitoring_views
 
 # создаём роутер для API
 router = DefaultRouter()
 router.register(r'api/tasks', TaskViewSet, basename='task')
 router.register(r'api/projects', ProjectViewSet, basename='project')
 router.register(r'api/attachments', AttachmentViewSet, basename='attachment')
+router.register(r'api/history', TaskHistoryViewSet, basename='history')
+router.register(r'api/tags', TagViewSet, basename='tag')
 
-urlpatterns = [
-    path('admin/', admin.site.urls),
-    
-    # веб-интерфейс задач (HTML)
-    path('tasks/', include('tasks.urls')), 
-    
-    path('', include(router.urls)), 
+# async-чтение задач и проектов под ASGI (см. tasks/views_async.py); раньше роутера
+async_api_urls = [
+    path('api/tasks/', views_async.tasks_api),
+    path('api/tasks/<int:pk>/', views_async.task_api),
+    path('api/projects/', views_async.projects_api),
+    path('api/projects/<int:pk>/', views_async.project_api),
 ]
 
+
+def build_urlpatterns(async_views):
+    """маршруты проекта; async_views — как settings.ASYNC_VIEWS (тесты собирают оба варианта)"""
+    return (async_api_urls if async_views else []) + [
+        path('admin/', admin.site.urls),
+
+        # метрики для Prometheus
+        path('metrics', monitoring_views.metrics, name='metrics'),
+
+        # изменения задач в реальном времени (Server-Sent Events)
+        path('api/events/', views_async.task_events, name='task_events'),
+
+        # веб-интерфейс задач (HTML)
+        path('tasks/', include(task_urlpatterns(async_views))),
+
+        path('', include(router.urls)),
+    ]
+
+
+urlpatterns = build_urlpatterns(settings.ASYNC_VIEWS)
+
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
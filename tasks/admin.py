@@ -1,107 +1,17 @@
-from django.conf import settings
 from django.contrib import admin
 from django.utils.html import format_html
 from simple_history.admin import SimpleHistoryAdmin
-from import_export.admin import ExportMixin
-from import_export import resources, fields
-from import_export.widgets import ForeignKeyWidget
+from import_export.admin import ImportExportMixin
 from import_export.formats.base_formats import CSV, XLSX
 
-from .models import Project, Tag, Task, Comment, Attachment
+from .models import Project, Tag, Task, Comment, Attachment, TaskDailyCount
+from .admin_utils import (
+    AnnotatedCountsMixin, AutocompleteFilterMixin, AutocompleteRelatedFilter, EstimatedCountPaginator,
+)
+from .resources import TaskResource
+from taskflow_manager.db_routers import replica_reads
 
 
-class TaskResource(resources.ModelResource):
-    """Ресурс для экспорта задач"""
-    
-    # Кастомные поля
-    project_title = fields.Field(
-        column_name='Проект',
-        attribute='project',
-        widget=ForeignKeyWidget(Project, 'title')
-    )
-    
-    author_name = fields.Field(
-        column_name='Автор',
-        attribute='author',
-        widget=ForeignKeyWidget(settings.AUTH_USER_MODEL, 'username')
-    )
-    
-    # 1. Кастомный метод для статуса
-    status_display = fields.Field(
-        column_name='Статус',
-        attribute='status'
-    )
-    
-    # 2. Кастомный метод для даты выполнения
-    due_date_formatted = fields.Field(
-        column_name='Дата выполнения'
-    )
-    
-    # 3. Кастомный метод для приоритета
-    priority_category = fields.Field(
-        column_name='Категория приоритета'
-    )
-    
-    class Meta:
-        model = Task
-        fields = (
-            'id', 'title', 'description', 'status_display', 
-            'priority', 'priority_category', 'due_date_formatted',
-            'project_title', 'author_name', 'created_at', 'updated_at'
-        )
-        export_order = fields
-        skip_unchanged = True
-        report_skipped = False
-    
-    # 1 для фильтрации queryset (только задачи с высоким приоритетом)
-    def get_export_queryset(self, request):
-        """Экспортировать только задачи с высоким приоритетом (1-2)"""
-        queryset = super().get_export_queryset(request)
-        return queryset.filter(priority__lte=2)
-    
-    # 2. для преобразования даты
-    def dehydrate_due_date_formatted(self, task):
-        """Преобразовать поле due_date в формат DD-MM-YYYY"""
-        if task.due_date:
-            return task.due_date.strftime('%d-%m-%Y')
-        return 'Нет срока'
-    
-    # 3. для преобразования статуса
-    def dehydrate_status_display(self, task):
-        """Преобразовать поле status в читаемый формат"""
-        status_map = {
-            'todo': 'К выполнению',
-            'in_progress': 'В процессе',
-            'done': 'Выполнено',
-            'backlog': 'Отложено'
-        }
-        return status_map.get(task.status, task.status)
-    
-    # доп.кастомный метод
-    def dehydrate_priority_category(self, task):
-        """Категория приоритета"""
-        if task.priority == 1:
-            return 'Критический'
-        elif task.priority == 2:
-            return 'Высокий'
-        elif task.priority == 3:
-            return 'Средний'
-        elif task.priority == 4:
-            return 'Низкий'
-        else:
-            return 'Минимальный'
-    
-    # форматирование дат создания/обновления
-    def dehydrate_created_at(self, task):
-        if task.created_at:
-            return task.created_at.strftime('%d-%m-%Y %H:%M')
-        return ''
-    
-    def dehydrate_updated_at(self, task):
-        if task.updated_at:
-            return task.updated_at.strftime('%d-%m-%Y %H:%M')
-        return ''
-
 # вспомогательный класс для inline
 class CommentInline(admin.TabularInline):
     """Inline для отображения комментариев внутри задачи."""
@@ -115,7 +25,7 @@ class CommentInline(admin.TabularInline):
 
 # админ класс для проектов/
 @admin.register(Project)
-class ProjectAdmin(admin.ModelAdmin):
+class ProjectAdmin(AnnotatedCountsMixin, admin.ModelAdmin):
     list_display = ('id', 'colored_title', 'owner_link', 'tasks_count', 'created_at')
     list_display_links = ('id', 'colored_title')  # Кликабельные поля
     list_filter = ('created_at',)  # Фильтр по дате создания
@@ -124,6 +34,9 @@ class ProjectAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at', 'updated_at')  # Только для чтения
     date_hierarchy = 'created_at'  # Навигация по датам сверху
     list_per_page = 20
+    list_select_related = ('owner',)  # owner_link без запроса на строку
+    count_annotations = {'tasks_count': 'tasks'}  # считаем одним запросом, см. AnnotatedCountsMixin
+    ordering = ('-created_at',)  # с GROUP BY Meta.ordering не применяется (нужно и для автодополнения)
 
     # Кастомный метод для отображения в list_display
     @admin.display(description='Название (с цветом)')
@@ -140,22 +53,23 @@ class ProjectAdmin(admin.ModelAdmin):
     def owner_link(self, obj):
         from django.urls import reverse
         from django.utils.html import escape
-        url = reverse('admin:users_user_change', args=[obj.owner.id])
+        url = reverse('admin:users_user_change', args=[obj.owner_id])
         return format_html('<a href="{}">{}</a>', url, escape(obj.owner.username))
 
     # Кастомный метод для подсчета задач в проекте
     @admin.display(description='Кол-во задач', ordering='tasks_count')
     def tasks_count(self, obj):
-        return obj.tasks.count()
+        return obj.tasks_count
 
 
 # админ клас для тегов
 @admin.register(Tag)
-class TagAdmin(admin.ModelAdmin):
+class TagAdmin(AnnotatedCountsMixin, admin.ModelAdmin):
     list_display = ('id', 'colored_name', 'tasks_count_display')
     list_display_links = ('id', 'colored_name')
     search_fields = ('name',)
     list_per_page = 25
+    count_annotations = {'tasks_count': 'tasks'}
 
     @admin.display(description='Тег (с цветом)')
     def colored_name(self, obj):
@@ -166,9 +80,9 @@ class TagAdmin(admin.ModelAdmin):
             obj.name
         )
 
-    @admin.display(description='Используется в задачах')
+    @admin.display(description='Используется в задачах', ordering='tasks_count')
     def tasks_count_display(self, obj):
-        return obj.tasks.count()
+        return obj.tasks_count
 
 
 class AttachmentInline(admin.TabularInline):
@@ -196,7 +110,7 @@ class AttachmentInline(admin.TabularInline):
 
 # админ класс для задач (дефолтный)
 @admin.register(Task)
-class TaskAdmin(ExportMixin, SimpleHistoryAdmin):
+class TaskAdmin(AutocompleteFilterMixin, ImportExportMixin, SimpleHistoryAdmin):
     resource_class = TaskResource
     formats = [XLSX, CSV]
 
@@ -215,7 +129,11 @@ class TaskAdmin(ExportMixin, SimpleHistoryAdmin):
     )
     
     list_display_links = ('id', 'title')  # Кликабельные поля
-    list_filter = ('status', 'priority', 'due_date', 'created_at')  # Фильтры справа
+    list_filter = (
+        'status', 'priority', 'due_date', 'created_at',
+        ('project', AutocompleteRelatedFilter),
+    )  # Фильтры справа
+    list_select_related = ('project', 'author')  # для project_link / author_link
     search_fields = ('title', 'description', 'project__title')  # Поиск
     raw_id_fields = ('project', 'author', 'editor')  # Поиск по ID для ForeignKey
     filter_horizontal = ('tags',)  # Виджет для ManyToMany
@@ -225,6 +143,13 @@ class TaskAdmin(ExportMixin, SimpleHistoryAdmin):
     list_per_page = 30
     list_editable = ('status',)  # Редактирование статуса прямо в списке
 
+    # большие таблицы: без точного COUNT(*) на каждый клик,
+    # date_hierarchy по агрегатам из refresh_task_rollups
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    change_list_template = 'admin/tasks/task/change_list_rollup.html'
+    date_hierarchy_rollup = TaskDailyCount
+
     # группировка полей на форме редактирования
     fieldsets = (
         ('Основная информация', {
@@ -243,7 +168,7 @@ class TaskAdmin(ExportMixin, SimpleHistoryAdmin):
     def project_link(self, obj):
         if obj.project:
             from django.urls import reverse
-            url = reverse('admin:tasks_project_change', args=[obj.project.id])
+            url = reverse('admin:tasks_project_change', args=[obj.project_id])
             return format_html('<a href="{}">{}</a>', url, obj.project.title)
         return '-'
 
@@ -251,7 +176,7 @@ class TaskAdmin(ExportMixin, SimpleHistoryAdmin):
     def author_link(self, obj):
         if obj.author:
             from django.urls import reverse
-            url = reverse('admin:users_user_change', args=[obj.author.id])
+            url = reverse('admin:users_user_change', args=[obj.author_id])
             return format_html('<a href="{}">{}</a>', url, obj.author.username)
         return '-'
 
@@ -287,6 +212,11 @@ class TaskAdmin(ExportMixin, SimpleHistoryAdmin):
             obj.editor = request.user
         super().save_model(request, obj, form, change)
 
+    def get_export_data(self, file_format, request, queryset, **kwargs):
+        # экспорт только читает — отдаём его репликам
+        with replica_reads():
+            return super().get_export_data(file_format, request, queryset, **kwargs)
+
     actions = ['export_selected_objects']
     
     def export_selected_objects(self, request, queryset):
@@ -298,15 +228,18 @@ class TaskAdmin(ExportMixin, SimpleHistoryAdmin):
 
 # админ класс для комментов
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(AutocompleteFilterMixin, admin.ModelAdmin):
     list_display = ('id', 'short_content', 'task_link', 'author_link', 'created_at')
     list_display_links = ('id', 'short_content')
-    list_filter = ('created_at', 'task__project')
+    list_filter = ('created_at', ('task__project', AutocompleteRelatedFilter))
+    list_select_related = ('task', 'author')
     search_fields = ('content', 'author__username', 'task__title')
     raw_id_fields = ('task', 'author')
     readonly_fields = ('created_at', 'updated_at')
     date_hierarchy = 'created_at'
     list_per_page = 25
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     @admin.display(description='Комментарий')
     def short_content(self, obj):
@@ -317,20 +250,20 @@ class CommentAdmin(admin.ModelAdmin):
     @admin.display(description='Задача')
     def task_link(self, obj):
         from django.urls import reverse
-        url = reverse('admin:tasks_task_change', args=[obj.task.id])
+        url = reverse('admin:tasks_task_change', args=[obj.task_id])
         return format_html('<a href="{}">{}</a>', url, obj.task.title)
 
     @admin.display(description='Автор')
     def author_link(self, obj):
         from django.urls import reverse
-        url = reverse('admin:users_user_change', args=[obj.author.id])
+        url = reverse('admin:users_user_change', args=[obj.author_id])
         return format_html('<a href="{}">{}</a>', url, obj.author.username)
 
 
 
 
 @admin.register(Attachment)
-class AttachmentAdmin(admin.ModelAdmin):
+class AttachmentAdmin(AutocompleteFilterMixin, admin.ModelAdmin):
     """админка для вложений"""
     list_display = (
         'id',
@@ -343,7 +276,8 @@ class AttachmentAdmin(admin.ModelAdmin):
         'uploaded_at'
     )
     list_display_links = ('id', 'file_icon_display')
-    list_filter = ('file_type', 'uploaded_at', 'task__project')
+    list_filter = ('file_type', 'uploaded_at', ('task__project', AutocompleteRelatedFilter))
+    list_select_related = ('uploaded_by',)  # для task_link хватает task_id
     search_fields = ('original_name', 'description', 'task__title')
     raw_id_fields = ('task', 'uploaded_by')
     readonly_fields = (
@@ -356,6 +290,8 @@ class AttachmentAdmin(admin.ModelAdmin):
     )
     date_hierarchy = 'uploaded_at'
     list_per_page = 25
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     fieldsets = (
         ('Основная информация', {
@@ -384,13 +320,13 @@ class AttachmentAdmin(admin.ModelAdmin):
     @admin.display(description='Задача')
     def task_link(self, obj):
         from django.urls import reverse
-        url = reverse('admin:tasks_task_change', args=[obj.task.id])
-        return format_html('<a href="{}">#{}</a>', url, obj.task.id)
+        url = reverse('admin:tasks_task_change', args=[obj.task_id])
+        return format_html('<a href="{}">#{}</a>', url, obj.task_id)
     
     @admin.display(description='Кто загрузил')
     def uploaded_by_link(self, obj):
         from django.urls import reverse
-        url = reverse('admin:users_user_change', args=[obj.uploaded_by.id])
+        url = reverse('admin:users_user_change', args=[obj.uploaded_by_id])
         return format_html('<a href="{}">{}</a>', url, obj.uploaded_by.username)
     
     @admin.display(description='Тип файла')
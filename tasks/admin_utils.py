@@ -0,0 +1,209 @@
+from hashlib import md5
+
+from django import forms
+from django.contrib import admin
+from django.contrib.admin.views.main import ORDER_VAR
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+from django.db.models import Count, QuerySet
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+
+from . import invalidation
+
+
+class AnnotatedCountsMixin:
+    """Счётчики связанных объектов для changelist без запроса на каждую строку.
+
+    По умолчанию счётчики считаются одной аннотацией в get_queryset
+    (COUNT ... DISTINCT), по ним можно сортировать. Для очень больших
+    таблиц можно включить cached_counts: тогда GROUP BY по всей таблице
+    не выполняется, а счётчики берутся из кеша и досчитываются одним
+    запросом только для строк текущей страницы. Сортировка по счётчику
+    в этом режиме всё равно включает аннотацию.
+
+    Ключи кеша включают версию admin_counts модели (tasks/invalidation.py):
+    её увеличивают сигналы при записях, меняющих счётчики (tasks/signals.py).
+    """
+
+    # имя аннотации -> обратная связь модели, например {'tasks_count': 'tasks'}
+    count_annotations = {}
+    cached_counts = False
+    cached_counts_timeout = 300
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if self.cached_counts and not self.is_sorted_by_count(request):
+            return queryset
+        return queryset.annotate(**{
+            name: Count(relation, distinct=True)
+            for name, relation in self.count_annotations.items()
+        })
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        cl = (getattr(response, 'context_data', None) or {}).get('cl')
+        if self.cached_counts and cl is not None:
+            cl.result_list = list(cl.result_list)
+            self.fill_cached_counts(cl.result_list)
+        return response
+
+    def is_sorted_by_count(self, request):
+        """сортирует ли пользователь changelist по одному из счётчиков (?o=...)"""
+        list_display = list(self.get_list_display(request))
+        if self.get_actions(request):
+            # ChangeList нумерует колонки с учётом чекбокса действий
+            list_display.insert(0, 'action_checkbox')
+        for part in request.GET.get(ORDER_VAR, '').split('.'):
+            try:
+                name = list_display[int(part.lstrip('-'))]
+            except (ValueError, IndexError):
+                continue
+            order_field = getattr(getattr(self, str(name), None), 'admin_order_field', None)
+            if order_field and order_field.lstrip('-') in self.count_annotations:
+                return True
+        return False
+
+    def fill_cached_counts(self, objects):
+        pks = [obj.pk for obj in objects if obj.pk is not None]
+        label = self.model._meta.label_lower
+        version = invalidation.version_token(**{invalidation.ADMIN_COUNTS: [label]})
+        for name, relation in self.count_annotations.items():
+            if objects and hasattr(objects[0], name):
+                continue  # уже посчитано аннотацией
+            keys = {pk: f'admin-count:{label}:{name}:{version}:{pk}' for pk in pks}
+            cached = cache.get_many(keys.values())
+            counts = {pk: cached[key] for pk, key in keys.items() if key in cached}
+            missing = [pk for pk in pks if pk not in counts]
+            if missing:
+                fresh = dict.fromkeys(missing, 0)
+                fresh.update(self.count_related(relation, missing))
+                cache.set_many({keys[pk]: n for pk, n in fresh.items()}, self.cached_counts_timeout)
+                counts.update(fresh)
+            for obj in objects:
+                setattr(obj, name, counts.get(obj.pk, 0))
+
+    def count_related(self, relation, pks):
+        """{pk: кол-во} одним GROUP BY по связанной (или промежуточной) таблице"""
+        rel = self.model._meta.get_field(relation)
+        if rel.many_to_many:
+            model, lookup = rel.through, rel.field.m2m_reverse_field_name()
+        else:
+            model, lookup = rel.related_model, rel.field.name
+        rows = (
+            model._default_manager
+            .filter(**{f'{lookup}__in': pks})
+            .values(lookup)
+            .annotate(n=Count('pk'))
+            .order_by()
+        )
+        return {row[lookup]: row['n'] for row in rows}
+
+
+class AutocompleteRelatedFilter(admin.FieldListFilter):
+    """Фильтр по внешнему ключу с автодополнением вместо полного списка объектов.
+
+    Варианты подгружаются через admin:autocomplete по search_fields админки
+    связанной модели, поэтому на странице списка нет запроса «все проекты».
+    Подключается как ('task__project', AutocompleteRelatedFilter), админка
+    должна наследовать AutocompleteFilterMixin (нужны скрипты select2).
+    """
+
+    template = 'admin/tasks/autocomplete_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = f'{field_path}__{field.target_field.name}__exact'
+        value = params.get(self.lookup_kwarg)
+        self.lookup_val = value[-1] if isinstance(value, list) else value
+        super().__init__(field, request, params, model, model_admin, field_path)
+        self.admin_site = model_admin.admin_site
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def get_facet_counts(self, pk_attname, filtered_qs):
+        return {}
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.lookup_val is None,
+            'query_string': changelist.get_query_string(remove=[self.lookup_kwarg]),
+            'display': _('All'),
+        }
+        yield {'widget': self.render_widget(changelist)}
+
+    def render_widget(self, changelist):
+        remote_model = self.field.remote_field.model
+        choice_field = forms.ModelChoiceField(
+            queryset=remote_model._default_manager.all(),
+            widget=AutocompleteSelect(self.field, self.admin_site),
+            required=False,
+        )
+        return choice_field.widget.render(
+            self.lookup_kwarg,
+            self.lookup_val,
+            attrs={
+                'id': f'autocomplete-filter-{self.field_path}',
+                'data-filter-query': changelist.get_query_string(remove=[self.lookup_kwarg]),
+                'data-filter-param': self.lookup_kwarg,
+            },
+        )
+
+
+class AutocompleteFilterMixin:
+    """подключает select2 и autocomplete.js к страницам админки для AutocompleteRelatedFilter"""
+
+    @property
+    def media(self):
+        return super().media + AutocompleteSelect(None, self.admin_site).media
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор changelist для больших таблиц без COUNT(*) на каждый клик.
+
+    Без фильтров на PostgreSQL берёт оценку планировщика (pg_class.reltuples),
+    если она больше estimate_threshold. В остальных случаях считает точно,
+    но большие результаты кеширует на cache_timeout секунд по тексту запроса.
+    """
+
+    estimate_threshold = 100_000
+    cache_timeout = 300
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return super().count
+        if not queryset.query.where:
+            estimate = self.planner_estimate(queryset)
+            if estimate is not None and estimate >= self.estimate_threshold:
+                return estimate
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+        key = 'admin-count:' + md5(f'{queryset.db}:{sql}:{params}'.encode()).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            if count >= self.estimate_threshold:
+                cache.set(key, count, self.cache_timeout)
+        return count
+
+    def planner_estimate(self, queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        # -1 — таблица ещё ни разу не анализировалась
+        if row is None or row[0] < 0:
+            return None
+        return row[0]
@@ -0,0 +1,279 @@
+"""Общие помощники для команд-бенчмарков (bench_*)."""
+import http.client
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from copy import deepcopy
+from urllib.parse import urlencode, urlsplit
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+from django.db import close_old_connections, connections
+from django.test import Client
+
+
+def percentile(values, p):
+    """p-й перцентиль (0..100) по отсортированной копии, без интерполяции"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, elapsed):
+    """сводка по задержкам в секундах: запросов, rps и перцентили в мс"""
+    return {
+        'requests': len(latencies),
+        'rps': len(latencies) / elapsed if elapsed else 0.0,
+        'mean_ms': statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+
+
+def format_summary(name, summary):
+    return (
+        f"{name:<24} {summary['requests']:>6} запр.  {summary['rps']:>8.1f} rps  "
+        f"p50 {summary['p50_ms']:>7.1f} мс  p95 {summary['p95_ms']:>7.1f} мс  p99 {summary['p99_ms']:>7.1f} мс"
+    )
+
+
+def bench_user(username=None):
+    """пользователь для запросов: заданный или автор с наибольшим числом задач"""
+    User = get_user_model()
+    if username:
+        return User.objects.get(username=username)
+    from django.db.models import Count
+    return User.objects.annotate(n=Count('created_tasks')).order_by('-n').first()
+
+
+def run_clients(user, paths, requests, threads=1, on_request_finished=close_old_connections):
+    """Гоняет GET-запросы тестовым клиентом из нескольких потоков.
+
+    После каждого запроса вызывается on_request_finished — как request_finished
+    в WSGI-обработчике (тестовый клиент сам соединения не закрывает).
+    Возвращает (задержки в секундах, общее время, число ошибок).
+    """
+    latencies, errors = [], []
+    lock = threading.Lock()
+    per_thread = max(1, requests // threads)
+
+    def worker():
+        # testserver не входит в ALLOWED_HOSTS вне тестов
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(user)
+        local, failed = [], 0
+        for i in range(per_thread):
+            started = time.perf_counter()
+            response = client.get(paths[i % len(paths)])
+            local.append(time.perf_counter() - started)
+            failed += response.status_code >= 400
+            on_request_finished()
+        connections.close_all()
+        with lock:
+            latencies.extend(local)
+            errors.append(failed)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return latencies, time.perf_counter() - started, sum(errors)
+
+
+def use_database_settings(settings_dict, alias='default'):
+    """Подменяет настройки соединения alias (для сравнения режимов в бенчмарках).
+
+    Новые потоки создают обёртки соединений из connections.settings,
+    текущая обёртка закрывается и пересоздаётся.
+    """
+    connections[alias].close()
+    connections.settings[alias].clear()
+    connections.settings[alias].update(deepcopy(settings_dict))
+    del connections[alias]
+
+
+def session_cookie(user):
+    """cookie сессии пользователя для запросов к настоящему серверу"""
+    from django.conf import settings
+    client = Client()
+    client.force_login(user)
+    return f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+
+def csrf_token():
+    """(значение cookie csrftoken, токен для X-CSRFToken) для небезопасных запросов к серверу"""
+    from django.http import HttpRequest
+    from django.middleware.csrf import get_token
+    request = HttpRequest()
+    token = get_token(request)
+    return request.META['CSRF_COOKIE'], token
+
+
+def load_collection(path, variables=None):
+    """Запросы Postman-коллекции по порядку, {{переменные}} подставлены.
+
+    Элемент: {'group', 'name', 'method', 'path' (с query), 'headers', 'body'
+    (текст raw/urlencoded или None), 'form' ({поле: значение} для formdata,
+    у файлов значение None)}. Значения переменных — из коллекции и variables.
+    """
+    with open(path, encoding='utf-8') as file:
+        collection = json.load(file)
+    values = {item['key']: item.get('value', '') for item in collection.get('variable', [])}
+    values.update(variables or {})
+
+    def substitute(text):
+        return re.sub(r'\{\{(\w+)\}\}', lambda match: str(values.get(match.group(1), match.group(0))), text)
+
+    def walk(items, group):
+        for item in items:
+            if 'item' in item:
+                yield from walk(item['item'], item['name'])
+                continue
+            request = item['request']
+            url = request['url']['raw'] if isinstance(request['url'], dict) else request['url']
+            parts = urlsplit(substitute(url))
+            body, form = None, None
+            spec = request.get('body') or {}
+            if spec.get('mode') == 'raw':
+                body = substitute(spec.get('raw', ''))
+            elif spec.get('mode') == 'urlencoded':
+                body = urlencode([(field['key'], substitute(field.get('value', ''))) for field in spec['urlencoded']
+                                  if not field.get('disabled')])
+            elif spec.get('mode') == 'formdata':
+                form = {field['key']: None if field.get('type') == 'file' else substitute(field.get('value', ''))
+                        for field in spec['formdata'] if not field.get('disabled')}
+            yield {
+                'group': group,
+                'name': item['name'],
+                'method': request['method'].upper(),
+                'path': parts.path + (f'?{parts.query}' if parts.query else ''),
+                'headers': {header['key']: substitute(header['value']) for header in request.get('header', [])
+                            if not header.get('disabled')},
+                'body': body,
+                'form': form,
+            }
+
+    return list(walk(collection['item'], ''))
+
+
+def best_time(function, repeat):
+    """Лучшее и медианное время function() в секундах и число её SQL-запросов."""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    timings, queries = [], 0
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - started)
+        queries = len(captured)
+    return min(timings), statistics.median(timings), queries
+
+
+def http_load(base_url, paths, requests, concurrency, headers=None):
+    """Нагрузка на HTTP-сервер: concurrency потоков, у каждого своё keep-alive соединение.
+
+    paths — адреса для GET или кортежи (метод, адрес, тело, заголовки).
+    Потоки идут по списку разными отрезками, поэтому при len(paths) >= requests
+    каждый элемент отправляется один раз (например, DELETE разных объектов).
+    Возвращает (задержки в секундах, общее время, число ошибок).
+    """
+    parts = urlsplit(base_url)
+    latencies, errors = [], []
+    lock = threading.Lock()
+    per_thread = max(1, requests // concurrency)
+    headers = {'Host': 'localhost', **(headers or {})}
+
+    def worker(index):
+        connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=60)
+        local, failed = [], 0
+        for i in range(per_thread):
+            item = paths[(index * per_thread + i) % len(paths)]
+            method, path, body, extra = ('GET', item, None, None) if isinstance(item, str) else item
+            started = time.perf_counter()
+            try:
+                connection.request(method, path, body=body, headers={**headers, **(extra or {})})
+                response = connection.getresponse()
+                response.read()
+                failed += response.status >= 400
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                connection.close()
+                connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=60)
+            local.append(time.perf_counter() - started)
+        connection.close()
+        with lock:
+            latencies.extend(local)
+            errors.append(failed)
+
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(concurrency)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return latencies, time.perf_counter() - started, sum(errors)
+
+
+def server_commands(port, workers=2, threads=4):
+    """команды запуска сервера: {'wsgi'|'asgi': (название, модуль, argv, переменные окружения)}"""
+    port, workers = str(port), str(workers)
+    return {
+        'wsgi': (
+            'WSGI gunicorn (sync)', 'gunicorn',
+            [sys.executable, '-m', 'gunicorn', 'taskflow_manager.wsgi:application', '-w', workers,
+             '--threads', str(threads), '-b', f'127.0.0.1:{port}', '--log-level', 'warning'],
+            {'ASYNC_VIEWS': '0'},
+        ),
+        'asgi': (
+            'ASGI uvicorn (async)', 'uvicorn',
+            [sys.executable, '-m', 'uvicorn', 'taskflow_manager.asgi:application', '--workers', workers,
+             '--host', '127.0.0.1', '--port', port, '--lifespan', 'off', '--no-access-log',
+             '--log-level', 'warning'],
+            {'ASYNC_VIEWS': '1'},
+        ),
+    }
+
+
+@contextmanager
+def running_server(command, env, port, timeout=30):
+    """запускает сервер (argv из server_commands), ждёт порт и останавливает его на выходе"""
+    from django.conf import settings
+    log = tempfile.TemporaryFile()
+    process = subprocess.Popen(
+        command, env={**os.environ, **env}, cwd=settings.BASE_DIR, stdout=subprocess.DEVNULL, stderr=log,
+    )
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            if process.poll() is not None:
+                log.seek(0)
+                raise CommandError(f'сервер завершился: {log.read().decode()[-2000:]}')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise CommandError(f'сервер не открыл порт {port} за {timeout} с')
+                time.sleep(0.2)
+        yield process
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        log.close()
@@ -0,0 +1,79 @@
+"""Кеш ответов API.
+
+Ключ ответа включает версии данных, из которых он собран
+(tasks/invalidation.py): у списка — версию пользователя, у объекта — версию
+самой задачи или проекта. После записи старые ответы перестают находиться
+и вытесняются по таймауту.
+"""
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+from .invalidation import USER, version_token
+
+
+def normalized_query(request):
+    """параметры запроса без пустых значений, в стабильном порядке"""
+    items = []
+    for name in sorted(request.query_params):
+        values = sorted(value for value in request.query_params.getlist(name) if value != '')
+        items.extend((name, value) for value in values)
+    return '&'.join(f'{name}={value}' for name, value in items)
+
+
+def request_digest(request):
+    """хост (в ответе абсолютные ссылки) и нормализованные параметры запроса"""
+    return md5(f'{request.get_host()}?{normalized_query(request)}'.encode()).hexdigest()
+
+
+class CachedResponseMixin:
+    """общая часть: ответ action берётся из кеша по ключу или кладётся туда после 200"""
+
+    def cached_action(self, action, key_func, request, *args, **kwargs):
+        timeout = getattr(settings, 'API_RESPONSE_CACHE_TIMEOUT', 0)
+        if not timeout or not request.user.is_authenticated:
+            return action(request, *args, **kwargs)
+        key = key_func(request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = action(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, timeout)
+        return response
+
+
+class CachedListMixin(CachedResponseMixin):
+    """Кеширует ответ list() целиком для каждого пользователя.
+
+    Ключ: имя viewset-а, пользователь, версия его данных, хост (в ответе
+    абсолютные ссылки) и нормализованные параметры запроса. Повторная
+    загрузка того же списка не выполняет ни запросов к данным, ни сериализацию.
+    """
+
+    def get_list_cache_key(self, request):
+        return f'api-list:{self.basename}:{version_token(**{USER: [request.user.pk]})}:{request_digest(request)}'
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_action(super().list, self.get_list_cache_key, request, *args, **kwargs)
+
+
+class CachedDetailMixin(CachedResponseMixin):
+    """Кеширует ответ retrieve() по версии самого объекта.
+
+    Ключ: имя viewset-а, пользователь (чужой объект ему отдаётся 404, а не
+    из кеша), версия объекта в области cache_scope, хост и параметры. Версии
+    пользователя в ключе нет: правка одной задачи не сбрасывает остальные.
+    """
+
+    cache_scope = None  # invalidation.TASK / invalidation.PROJECT
+
+    def get_detail_cache_key(self, request):
+        pk = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        token = version_token(**{self.cache_scope: [str(pk)]})
+        return f'api-detail:{self.basename}:{request.user.pk}:{token}:{request_digest(request)}'
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_action(super().retrieve, self.get_detail_cache_key, request, *args, **kwargs)
@@ -0,0 +1,67 @@
+"""Условия по дням срока задачи с учётом часового пояса.
+
+due_date__date=day оборачивает столбец в функцию (приведение к дате
+в часовом поясе), и индекс по due_date не используется. Здесь день
+превращается в полуоткрытый диапазон [начало первого дня, начало дня
+после последнего) в текущем часовом поясе — условие по самому столбцу,
+индекс (status, due_date) работает.
+
+Task.due_day — хранимый вычисляемый столбец: день срока в UTC, с индексом
+(author, due_day). Если текущий часовой пояс — UTC, due_day_in строит
+условие по нему: день или месяц задач автора — диапазон по этому индексу.
+В другом поясе день в UTC с днём пользователя не совпадает, и due_day_in
+возвращает то же условие, что due_date_in.
+"""
+import calendar
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.db.models import DateField, Func, Q
+from django.utils import timezone
+
+
+class UTCDate(Func):
+    """дата момента времени в UTC; неизменяемое выражение — годится для GeneratedField и индексов"""
+    template = 'DATE(%(expressions)s)'  # SQLite и MySQL хранят datetime в UTC
+    output_field = DateField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        # ::date у timestamptz зависит от TimeZone сессии, AT TIME ZONE с константой — нет
+        return self.as_sql(compiler, connection, template="((%(expressions)s AT TIME ZONE 'UTC')::date)",
+                           **extra_context)
+
+
+def day_start(day, tz=None):
+    """начало дня day в часовом поясе tz (по умолчанию — текущем)"""
+    return timezone.make_aware(datetime.combine(day, time.min), tz or timezone.get_current_timezone())
+
+
+def month_days(day):
+    """первый и последний день месяца, в котором day"""
+    return day.replace(day=1), day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+
+def due_date_in(first=None, last=None, tz=None):
+    """Q: срок с first по last включительно (границы можно не задавать), по столбцу due_date"""
+    condition = Q()
+    if first is not None:
+        condition &= Q(due_date__gte=day_start(first, tz))
+    if last is not None:
+        condition &= Q(due_date__lt=day_start(last + timedelta(days=1), tz))
+    return condition
+
+
+def due_day_usable(tz=None):
+    tz = tz or timezone.get_current_timezone()
+    return tz is dt_timezone.utc or getattr(tz, 'key', None) in ('UTC', 'Etc/UTC')
+
+
+def due_day_in(first=None, last=None, tz=None):
+    """как due_date_in, но по due_day, если день в UTC совпадает с днём пользователя"""
+    if not due_day_usable(tz):
+        return due_date_in(first, last, tz)
+    condition = Q()
+    if first is not None:
+        condition &= Q(due_day__gte=first)
+    if last is not None:
+        condition &= Q(due_day__lte=last)
+    return condition
@@ -0,0 +1,199 @@
+"""События об изменениях задач для Server-Sent Events (/api/events/).
+
+Записи Task, Attachment и Comment (tasks/signals.py) после коммита
+публикуют автору задачи компактное событие:
+
+    {"type": "task", "action": "updated", "task": 5,
+     "fields": ["status", "priority"], "updated_at": "2026-10-19T10:00:00Z"}
+
+Внутри процесса события раздаёт broker: у каждого открытого SSE-соединения
+своя asyncio-очередь, поэтому простаивающий клиент стоит только открытого
+соединения на async-воркере, без запросов к БД.
+
+Между процессами события передаёт backend из settings.TASK_EVENTS_BACKEND:
+- LocalBackend (по умолчанию) — публикация сразу в broker своего процесса;
+- CacheBackend — через общий кеш (Redis, файловый): события пишутся в кеш
+  под возрастающим номером, а один слушатель на процесс забирает новые
+  и раздаёт их локальным подписчикам. С locmem-кешем работает как
+  LocalBackend — это локальная замена для разработки и тестов.
+
+Поток работает только под ASGI (uvicorn taskflow_manager.asgi:application):
+WSGI-сервер собирает async-итератор целиком перед отправкой, и бесконечный
+поток навсегда занял бы поток воркера. Под WSGI /api/events/ отвечает 503,
+а страницы не подписываются на события (streaming_supported).
+"""
+import asyncio
+import itertools
+import json
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.utils.module_loading import import_string
+from rest_framework.fields import DateTimeField
+
+
+def streaming_supported(request):
+    """запрос обслуживает ASGI-сервер — только там SSE-поток уходит клиенту по частям"""
+    return isinstance(request, ASGIRequest)
+
+
+class Subscription:
+    """очередь событий одного SSE-соединения"""
+
+    def __init__(self, broker, user_id, maxsize):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def put(self, event):
+        # вызывается в цикле событий подписчика
+        if self.queue.full():
+            self.queue.get_nowait()  # медленный клиент: теряет самые старые события
+        self.queue.put_nowait(event)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    """Раздача событий подписчикам внутри процесса (потокобезопасно)"""
+
+    def __init__(self, maxsize=100):
+        self.maxsize = maxsize
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        subscription = Subscription(self, user_id, self.maxsize)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.user_id, None)
+
+    def subscriber_count(self, user_id=None):
+        with self._lock:
+            if user_id is not None:
+                return len(self._subscriptions.get(user_id, ()))
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def publish(self, user_id, event):
+        """из любого потока: событие попадает в очереди подписчиков пользователя"""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:
+                self.unsubscribe(subscription)  # цикл событий уже закрыт
+
+
+broker = Broker()
+
+
+class LocalBackend:
+    """События только внутри процесса"""
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+
+    def publish(self, user_id, event):
+        broker.publish(user_id, {**event, 'id': next(self._ids)})
+
+    def ensure_listener(self):
+        pass
+
+
+class CacheBackend:
+    """События между процессами через общий кеш"""
+
+    sequence_key = 'task-events:sequence'
+    ttl = 60  # событие нужно только слушателям, которые проверяют кеш раз в poll_interval
+    poll_interval = 0.5
+
+    def __init__(self):
+        self._listeners = {}
+
+    def event_key(self, number):
+        return f'task-events:{number}'
+
+    def publish(self, user_id, event):
+        cache.add(self.sequence_key, 0, None)
+        number = cache.incr(self.sequence_key)
+        cache.set(self.event_key(number), (user_id, {**event, 'id': number}), self.ttl)
+
+    def ensure_listener(self):
+        """один слушатель кеша на цикл событий процесса"""
+        loop = asyncio.get_running_loop()
+        task = self._listeners.get(loop)
+        if task is None or task.done():
+            self._listeners[loop] = loop.create_task(self.listen())
+
+    async def listen(self):
+        last = await cache.aget(self.sequence_key, 0)
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            if not broker.subscriber_count():
+                continue
+            current = await cache.aget(self.sequence_key, 0)
+            if current < last:  # счётчик вытеснен из кеша — начинаем заново
+                last = current
+            if current == last:
+                continue
+            keys = [self.event_key(number) for number in range(last + 1, current + 1)]
+            found = await cache.aget_many(keys)
+            for key in keys:
+                if key in found:
+                    broker.publish(*found[key])
+            last = current
+
+
+_backends = {}
+
+
+def get_backend():
+    path = getattr(settings, 'TASK_EVENTS_BACKEND', 'tasks.events.LocalBackend')
+    if path not in _backends:
+        _backends[path] = import_string(path)()
+    return _backends[path]
+
+
+def publish(user_id, event):
+    """публикует событие после коммита текущей транзакции"""
+    if user_id is None:
+        return
+    transaction.on_commit(lambda: get_backend().publish(user_id, event))
+
+
+def subscribe(user_id):
+    """подписка для текущего цикла событий (вызывать из async-кода)"""
+    get_backend().ensure_listener()
+    return broker.subscribe(user_id)
+
+
+def task_event(kind, action, task_id, fields=(), updated_at=None, **extra):
+    return {
+        'type': kind,
+        'action': action,
+        'task': task_id,
+        'fields': sorted(fields),
+        'updated_at': DateTimeField().to_representation(updated_at) if updated_at else None,
+        **extra,
+    }
+
+
+def format_sse(event):
+    """событие в формате text/event-stream"""
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
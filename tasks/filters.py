@@ -1,9 +1,30 @@
 import django_filters
-from django.db.models import Q
-from django.utils import timezone
-from datetime import datetime
+from django.db.models import Count, Exists, OuterRef, Q
+from .dates import due_day_in, month_days
 from .models import Task
 
+
+class NumberInFilter(django_filters.BaseInFilter, django_filters.NumberFilter):
+    """список чисел через запятую: ?tags_any=1,2"""
+
+
+def with_any_tag(queryset, tag_ids):
+    """задачи хотя бы с одним из тегов: EXISTS по связям, без JOIN и без дублей строк"""
+    links = Task.tags.through.objects.filter(task_id=OuterRef('pk'), tag_id__in=tag_ids)
+    return queryset.filter(Exists(links))
+
+
+def with_all_tags(queryset, tag_ids):
+    """задачи со всеми тегами: id задач, у которых из списка нашлись все теги (GROUP BY ... HAVING)"""
+    tag_ids = set(tag_ids)
+    matching = (
+        Task.tags.through.objects.filter(tag_id__in=tag_ids)
+        .values('task_id').annotate(found=Count('tag_id')).filter(found=len(tag_ids))
+        .values('task_id')
+    )
+    return queryset.filter(pk__in=matching)
+
+
 class TaskFilter(django_filters.FilterSet):
     # 1. Фильтрация задач по статусу
     status = django_filters.ChoiceFilter(
@@ -32,12 +53,28 @@ class TaskFilter(django_filters.FilterSet):
         label='Дата окончания до (ГГГГ-ММ-ДД)'
     )
     
+    due_month = django_filters.DateFilter(
+        method='filter_due_month',
+        input_formats=['%Y-%m'],
+        label='Месяц окончания (ГГГГ-ММ)'
+    )
+
     # Дополнительные фильтры
     has_due_date = django_filters.BooleanFilter(
         method='filter_has_due_date',
         label='Есть срок выполнения'
     )
     
+    # теги: связи читаются по индексу (tag_id, task_id), см. миграцию 0009
+    tags_any = NumberInFilter(
+        method='filter_tags_any',
+        label='Есть хотя бы один из тегов (id через запятую)'
+    )
+    tags_all = NumberInFilter(
+        method='filter_tags_all',
+        label='Есть все теги (id через запятую)'
+    )
+
     search = django_filters.CharFilter(
         method='filter_search',
         label='Поиск по названию/описанию'
@@ -47,43 +84,33 @@ class TaskFilter(django_filters.FilterSet):
         model = Task
         fields = ['status', 'priority', 'project']
     
-    # Кастомные методы для фильтрации по датам
-    
+    # Кастомные методы для фильтрации по датам: день — диапазон в текущем часовом поясе
+    # по индексу (author, due_day), без приведения столбца к дате (см. tasks/dates.py)
+
     def filter_due_date(self, queryset, name, value):
         """Фильтр по конкретной дате (игнорируя время)"""
         if value:
-            # Преобразуем date в datetime для сравнения
-            start_datetime = timezone.make_aware(
-                datetime.combine(value, datetime.min.time())
-            )
-            end_datetime = timezone.make_aware(
-                datetime.combine(value, datetime.max.time())
-            )
-            
-            return queryset.filter(
-                due_date__gte=start_datetime,
-                due_date__lte=end_datetime
-            )
+            return queryset.filter(due_day_in(value, value))
         return queryset
-    
+
     def filter_due_date_gte(self, queryset, name, value):
         """Фильтр: дата окончания >= указанной даты"""
         if value:
-            start_datetime = timezone.make_aware(
-                datetime.combine(value, datetime.min.time())
-            )
-            return queryset.filter(due_date__gte=start_datetime)
+            return queryset.filter(due_day_in(first=value))
         return queryset
-    
+
     def filter_due_date_lte(self, queryset, name, value):
         """Фильтр: дата окончания <= указанной даты"""
         if value:
-            end_datetime = timezone.make_aware(
-                datetime.combine(value, datetime.max.time())
-            )
-            return queryset.filter(due_date__lte=end_datetime)
+            return queryset.filter(due_day_in(last=value))
         return queryset
-    
+
+    def filter_due_month(self, queryset, name, value):
+        """Фильтр: срок в календарном месяце"""
+        if value:
+            return queryset.filter(due_day_in(*month_days(value)))
+        return queryset
+
     def filter_has_due_date(self, queryset, name, value):
         """Фильтр: есть/нет срок выполнения"""
         if value:
@@ -91,6 +118,18 @@ class TaskFilter(django_filters.FilterSet):
         else:
             return queryset.filter(due_date__isnull=True)
     
+    def filter_tags_any(self, queryset, name, value):
+        """Фильтр: хотя бы один из тегов"""
+        if value:
+            return with_any_tag(queryset, {int(tag_id) for tag_id in value})
+        return queryset
+
+    def filter_tags_all(self, queryset, name, value):
+        """Фильтр: все теги сразу"""
+        if value:
+            return with_all_tags(queryset, {int(tag_id) for tag_id in value})
+        return queryset
+
     def filter_search(self, queryset, name, value):
         """Поиск по названию и описанию"""
         return queryset.filter(
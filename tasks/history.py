@@ -0,0 +1,455 @@
+"""Хранение истории задач (HistoricalTask): сжатие, прореживание, партиции.
+
+Каждое сохранение Task пишет полную копию строки в историю, поэтому
+таблица растёт быстрее самих задач. Здесь собраны операции, которые
+запускает команда prune_task_history:
+
+- compact_history — удаляет подряд идущие записи задачи без изменений полей;
+- thin_history — старше keep_all_days оставляет по одной записи на задачу
+  в день, старше keep_daily_days удаляет всё, кроме последней записи
+  существующей задачи;
+- на PostgreSQL таблица может быть секционирована по history_date по месяцам,
+  тогда удаление старых данных — это DROP секции, а не массовый DELETE.
+
+Удаление идёт пачками по индексам (history_id, history_date): ни список
+всех id, ни одна большая транзакция не нужны.
+"""
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.db.models import Exists, Max, OuterRef, Q, Subquery
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Task
+
+HistoricalTask = Task.history.model
+
+# поля, которые не считаются изменением (меняются при каждом save)
+IGNORED_FIELDS = {'updated_at'}
+
+DEFAULT_RETENTION = {
+    'keep_all_days': 90,     # моложе — храним все записи
+    'keep_daily_days': None,  # до этого возраста — одна запись в день (None — без ограничения)
+    'batch_size': 5000,
+    'partition_months_ahead': 3,
+}
+
+
+def get_retention_settings(**overrides):
+    options = {**DEFAULT_RETENTION, **getattr(settings, 'TASK_HISTORY_RETENTION', {})}
+    options.update({key: value for key, value in overrides.items() if value is not None})
+    return options
+
+
+def tracked_fields():
+    return [
+        field.attname for field in Task._meta.concrete_fields
+        if field.attname not in IGNORED_FIELDS and field.attname != 'id' and not field.generated
+    ]
+
+
+def _delete_batch(ids):
+    with transaction.atomic():
+        return HistoricalTask.objects.filter(history_id__in=ids)._raw_delete(HistoricalTask.objects.db)
+
+
+def _process(batches, dry_run):
+    """удаляет пачки id по мере чтения (в dry_run только считает)"""
+    total = 0
+    for ids in batches:
+        total += len(ids) if dry_run else _delete_batch(ids)
+    return total
+
+
+def _batches_by_date(queryset, batch_size):
+    """history_id строк queryset пачками по индексу (history_date, history_id), без OFFSET
+
+    Следующая пачка начинается после последней строки предыдущей, поэтому
+    удаление между пачками не сдвигает окно и оставленные строки не читаются снова.
+    """
+    queryset = queryset.order_by('history_date', 'history_id')
+    last = None
+    while True:
+        page = queryset
+        if last is not None:
+            page = page.filter(Q(history_date__gt=last[0]) | Q(history_date=last[0], history_id__gt=last[1]))
+        rows = list(page.values_list('history_date', 'history_id')[:batch_size])
+        if rows:
+            yield [history_id for _, history_id in rows]
+        if len(rows) < batch_size:
+            return
+        last = rows[-1]
+
+
+def latest_history_id():
+    return HistoricalTask.objects.aggregate(last=Max('history_id'))['last'] or 0
+
+
+def _compact_batches(fields, batch_size, after):
+    columns = ('id', 'history_id', 'history_type', *fields)
+    while True:
+        rows = list(
+            HistoricalTask.objects.filter(history_id__gt=after).order_by('history_id').values_list(*columns)[:batch_size]
+        )
+        if not rows:
+            return
+        # для первой строки задачи в пачке предыдущая запись лежит до пачки — одна выборка на пачку
+        latest_before = (
+            HistoricalTask.objects.filter(id__in={row[0] for row in rows}, history_id__lte=after)
+            .values('id').annotate(last=Max('history_id')).values('last')
+        )
+        previous = {
+            task_id: values
+            for task_id, _, _, *values in HistoricalTask.objects.filter(history_id__in=latest_before).values_list(*columns)
+        }
+        to_delete = []
+        for task_id, history_id, history_type, *values in rows:
+            if history_type == '~' and previous.get(task_id) == values:
+                to_delete.append(history_id)
+            else:
+                previous[task_id] = values
+        if to_delete:
+            yield to_delete
+        after = rows[-1][1]
+
+
+def compact_history(batch_size=5000, dry_run=False, after=0):
+    """Удаляет изменения (~), которые не отличаются от предыдущей записи задачи.
+
+    Строки с history_id > after читаются пачками по history_id и удаляются
+    пачками же; каждая сравнивается с предыдущей записью той же задачи.
+    after — граница прошлого прохода (prune_task_history --interval): строки
+    до неё уже сжаты и не перечитываются.
+    """
+    return _process(_compact_batches(tracked_fields(), batch_size, after), dry_run)
+
+
+def _superseded():
+    """у задачи есть более поздняя запись или задачи уже нет — строку можно удалить"""
+    newer = HistoricalTask.objects.filter(id=OuterRef('id'), history_id__gt=OuterRef('history_id'))
+    return Q(Exists(newer)) | ~Q(Exists(Task.objects.filter(pk=OuterRef('id'))))
+
+
+def thin_history(keep_all_days, keep_daily_days=None, batch_size=5000, dry_run=False, since=None):
+    """Старше keep_all_days — последняя запись задачи за день, старше keep_daily_days — ничего.
+
+    Записи создания (+) и удаления (-) в дневном интервале сохраняются.
+    Последняя запись существующей задачи не удаляется никогда: без неё у
+    давно не менявшейся задачи не осталось бы истории. since — граница
+    прошлого прохода: раньше неё записи уже прорежены по дням.
+    """
+    now = timezone.now()
+    daily_cutoff = now - timedelta(days=keep_all_days)
+    deleted = 0
+
+    expire_cutoff = None
+    if keep_daily_days is not None:
+        expire_cutoff = now - timedelta(days=keep_daily_days)
+        if is_partitioned():
+            drop_partitions_before(expire_cutoff, dry_run=dry_run)
+        expired = HistoricalTask.objects.filter(_superseded(), history_date__lt=expire_cutoff)
+        deleted += _process(_batches_by_date(expired, batch_size), dry_run)
+
+    # ~ за тот же день позже этой (по текущему часовому поясу, как history_date__date)
+    later_same_day = HistoricalTask.objects.filter(
+        id=OuterRef('id'), history_type='~', history_id__gt=OuterRef('history_id'),
+        history_date__lt=daily_cutoff, history_date__date=OuterRef('day'),
+    )
+    daily = (
+        HistoricalTask.objects.filter(history_type='~', history_date__lt=daily_cutoff)
+        .annotate(day=TruncDate('history_date'))
+        .filter(Exists(later_same_day))
+    )
+    start = max(filter(None, [expire_cutoff, since]), default=None)
+    if start is not None:
+        daily = daily.filter(history_date__gte=start)
+    deleted += _process(_batches_by_date(daily, batch_size), dry_run)
+    return deleted
+
+
+# === Секционирование (только PostgreSQL) ===
+
+TABLE = HistoricalTask._meta.db_table
+
+
+def _partition_name(month):
+    return f'{TABLE}_p{month:%Y_%m}'
+
+
+def _next_month(month):
+    return (month.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass)',
+            [TABLE],
+        )
+        return cursor.fetchone()[0]
+
+
+def list_partitions():
+    """[(имя, начало месяца)] для помесячных секций"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s
+            """,
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    prefix = f'{TABLE}_p'
+    partitions = []
+    for name in names:
+        if name.startswith(prefix):
+            year, month = name[len(prefix):].split('_')
+            partitions.append((name, date(int(year), int(month), 1)))
+    return sorted(partitions, key=lambda item: item[1])
+
+
+def ensure_partitions(start, months_ahead=3):
+    """создаёт помесячные секции с месяца start до текущего + months_ahead"""
+    existing = {name for name, _ in list_partitions()}
+    month = start.replace(day=1)
+    end = timezone.localdate().replace(day=1)
+    for _ in range(months_ahead):
+        end = _next_month(end)
+    created = []
+    with connection.cursor() as cursor:
+        while month <= end:
+            name = _partition_name(month)
+            if name not in existing:
+                cursor.execute(
+                    f'CREATE TABLE "{name}" PARTITION OF "{TABLE}" '
+                    f'FOR VALUES FROM (%s) TO (%s)',
+                    [month.isoformat(), _next_month(month).isoformat()],
+                )
+                created.append(name)
+            month = _next_month(month)
+    return created
+
+
+def _holds_latest_rows(name):
+    """в секции есть последняя запись существующей задачи (её нельзя терять вместе с секцией)"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM "{name}" h '
+            f'WHERE EXISTS (SELECT 1 FROM "{Task._meta.db_table}" t WHERE t.id = h.id) '
+            f'AND NOT EXISTS (SELECT 1 FROM "{TABLE}" n WHERE n.id = h.id AND n.history_id > h.history_id))'
+        )
+        return cursor.fetchone()[0]
+
+
+def drop_partitions_before(cutoff, dry_run=False):
+    """удаляет секции, целиком лежащие раньше cutoff (остаток добивается DELETE)
+
+    Секция с последней записью существующей задачи не удаляется — её
+    прореживает DELETE в thin_history, оставляя эти записи.
+    """
+    cutoff_day = cutoff.date() if hasattr(cutoff, 'date') else cutoff
+    dropped = []
+    for name, month in list_partitions():
+        if _next_month(month) <= cutoff_day and not _holds_latest_rows(name):
+            dropped.append(name)
+            if not dry_run:
+                with connection.cursor() as cursor:
+                    cursor.execute(f'DROP TABLE "{name}"')
+    return dropped
+
+
+def _single(cursor, sql, params=()):
+    cursor.execute(sql, params)
+    return cursor.fetchone()
+
+
+def partition_history_table(months_ahead=3):
+    """Переводит tasks_historicaltask в таблицу, секционированную по history_date.
+
+    Данные не копируются: нынешняя таблица становится первой секцией
+    (до начала следующего месяца), дальше — помесячные секции. Долгие шаги
+    не блокируют запись: CHECK NOT VALID + VALIDATE (по нему ATTACH не
+    сканирует таблицу) и CREATE INDEX CONCURRENTLY для нового первичного
+    ключа (history_id, history_date) — у секционированной таблицы ключ обязан
+    включать ключ секционирования. ACCESS EXCLUSIVE берётся только на короткую
+    транзакцию с изменением каталога. Индексы, внешние ключи и sequence
+    history_id (с тем же именем и значением) переходят к новой таблице.
+
+    Запускается вне транзакции (CONCURRENTLY), только на PostgreSQL.
+    """
+    if connection.vendor != 'postgresql':
+        raise CommandError('секционирование поддерживается только на PostgreSQL')
+    if connection.in_atomic_block:
+        raise CommandError('секционирование запускается вне транзакции (CREATE INDEX CONCURRENTLY)')
+    if is_partitioned():
+        return False
+
+    # запас в сутки: строки, записанные до переключения, должны пройти CHECK первой секции
+    boundary = _next_month(timezone.localdate() + timedelta(days=1))
+    first = _partition_name((boundary - timedelta(days=1)).replace(day=1))
+    check, pkey = f'{first}_range_check', f'{first}_pkey'
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE "{TABLE}" DROP CONSTRAINT IF EXISTS "{check}"')
+        cursor.execute(
+            f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{check}" CHECK (history_date < %s) NOT VALID',
+            [boundary.isoformat()],
+        )
+        cursor.execute(f'ALTER TABLE "{TABLE}" VALIDATE CONSTRAINT "{check}"')
+        cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{pkey}"')  # после прерванного запуска
+        cursor.execute(f'CREATE UNIQUE INDEX CONCURRENTLY "{pkey}" ON "{TABLE}" (history_id, history_date)')
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE "{TABLE}" IN ACCESS EXCLUSIVE MODE')
+        sequence, = _single(cursor, 'SELECT pg_get_serial_sequence(%s, %s)', [TABLE, 'history_id'])
+        identity, column_type = _single(
+            cursor,
+            'SELECT attidentity, format_type(atttypid, atttypmod) FROM pg_attribute '
+            'WHERE attrelid = %s::regclass AND attname = %s',
+            [TABLE, 'history_id'],
+        )
+        if identity:
+            # identity нельзя перенести на секционированную таблицу: обычная sequence с тем же
+            # именем и значением (OWNED BY — её находят pg_get_serial_sequence и sqlsequencereset)
+            last_value, is_called = _single(cursor, f'SELECT last_value, is_called FROM {sequence}')
+            cursor.execute(f'ALTER TABLE "{TABLE}" ALTER COLUMN history_id DROP IDENTITY')
+            cursor.execute(f'CREATE SEQUENCE {sequence} AS {column_type}')
+            cursor.execute('SELECT setval(%s, %s, %s)', [sequence, last_value, is_called])
+        else:
+            cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY NONE')
+            cursor.execute(f'ALTER TABLE "{TABLE}" ALTER COLUMN history_id DROP DEFAULT')
+
+        # первичный ключ первой секции — уже построенный уникальный индекс
+        old_pkey, = _single(
+            cursor, "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'", [TABLE],
+        )
+        cursor.execute(f'ALTER TABLE "{TABLE}" DROP CONSTRAINT "{old_pkey}"')
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{pkey}" PRIMARY KEY USING INDEX "{pkey}"')
+
+        cursor.execute(
+            'SELECT i.relname, pg_get_indexdef(i.oid) FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid '
+            'WHERE x.indrelid = %s::regclass AND NOT x.indisunique',
+            [TABLE],
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+            [TABLE],
+        )
+        foreign_keys = cursor.fetchall()
+
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{first}"')
+        cursor.execute(
+            f'CREATE TABLE "{TABLE}" (LIKE "{first}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING GENERATED) '
+            f'PARTITION BY RANGE (history_date)'
+        )
+        cursor.execute(f'ALTER TABLE "{TABLE}" DROP CONSTRAINT "{check}"')
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD PRIMARY KEY (history_id, history_date)')
+        cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY "{TABLE}".history_id')
+        cursor.execute(f'ALTER TABLE "{TABLE}" ALTER COLUMN history_id SET DEFAULT nextval(%s)', [sequence])
+        # те же внешние ключи: ATTACH находит их у секции и не проверяет заново
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{name}" {definition}')
+        cursor.execute(
+            f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{first}" FOR VALUES FROM (MINVALUE) TO (%s)',
+            [boundary.isoformat()],
+        )
+        cursor.execute(f'ALTER TABLE "{first}" DROP CONSTRAINT "{check}"')
+        # индексы (с именами из миграций) — у родителя, готовые индексы секции к ним подключаются
+        for name, definition in indexes:
+            cursor.execute(f'ALTER INDEX "{name}" RENAME TO "{name}_p0"')
+            columns = definition.split(' USING ', 1)[1]
+            cursor.execute(f'CREATE INDEX "{name}" ON ONLY "{TABLE}" USING {columns}')
+            cursor.execute(f'ALTER INDEX "{name}" ATTACH PARTITION "{name}_p0"')
+        cursor.execute(f'CREATE TABLE "{TABLE}_default" PARTITION OF "{TABLE}" DEFAULT')
+        ensure_partitions(boundary, months_ahead)
+    return True
+
+
+# === Диффы по полям ===
+
+# поле в API -> колонка HistoricalTask
+DIFF_FIELDS = {
+    'title': 'title',
+    'status': 'status',
+    'priority': 'priority',
+    'due_date': 'due_date',
+    'project': 'project_id',
+    'editor': 'editor_id',
+}
+
+
+def history_with_previous(queryset=None):
+    """История задач с номером предыдущей записи той же задачи (previous_id).
+
+    Номер — один коррелированный подзапрос на строку: по индексу
+    (id, history_id) это одна проба назад. Окно LAG считалось бы по всем
+    строкам queryset до фильтра курсора, а здесь фильтры по дате и курсор
+    (after()/since) попадают в WHERE, и подзапрос выполняется только для
+    строк страницы. Сами предыдущие значения подгружает attach_previous()
+    одним запросом на страницу.
+    """
+    if queryset is None:
+        queryset = HistoricalTask.objects.all()
+    predecessor = (
+        HistoricalTask.objects
+        .filter(id=OuterRef('id'), history_id__lt=OuterRef('history_id'))
+        .order_by('-history_id')
+        .values('history_id')
+    )
+    return (
+        queryset
+        .annotate(previous_id=Subquery(predecessor[:1]))
+        .values(
+            'history_id', 'id', 'history_type', 'history_date', 'history_user_id',
+            *DIFF_FIELDS.values(), 'previous_id',
+        )
+        .order_by('history_date', 'history_id')
+    )
+
+
+def attach_previous(rows):
+    """rows (страница history_with_previous) + row['previous'] — значения DIFF_FIELDS предыдущей записи или None"""
+    rows = list(rows)
+    previous = HistoricalTask.objects.filter(
+        history_id__in={row['previous_id'] for row in rows if row['previous_id']}
+    ).values('history_id', *DIFF_FIELDS.values())
+    by_id = {values['history_id']: values for values in previous}
+    for row in rows:
+        row['previous'] = by_id.get(row['previous_id'])
+    return rows
+
+
+def history_since(queryset, since):
+    """строки истории начиная с since (предыдущие значения — и из записей до since)"""
+    return history_with_previous(queryset.filter(history_date__gte=since))
+
+
+def history_after(rows, history_date, history_id):
+    """keyset-условие (history_date, history_id) > (history_date, history_id)"""
+    return rows.filter(
+        Q(history_date__gt=history_date) | Q(history_date=history_date, history_id__gt=history_id)
+    )
+
+
+def row_changes(row):
+    """{поле: [было, стало]} для строки после attach_previous()"""
+    previous = row['previous'] or {}
+    changes = {}
+    for name, column in DIFF_FIELDS.items():
+        old, new = previous.get(column), row[column]
+        if row['history_type'] == '+':
+            old = None
+        elif row['history_type'] == '-' or old == new:
+            continue
+        if old != new:
+            changes[name] = [old, new]
+    return changes
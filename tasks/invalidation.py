@@ -0,0 +1,117 @@
+"""Поколения (версии) данных для инвалидации любых кешей.
+
+Для пользователя, проекта и задачи в кеше хранится монотонно растущий
+счётчик. Каждый кеш-ключ включает версии тех объектов, от которых зависит
+значение (version_token), а запись увеличивает их (bump). Старые ключи
+перестают находиться и вытесняются сами — удалений по маске нет.
+
+Области (scope) и кто их читает (tasks/caching.py):
+- user — всё, что видит пользователь: списки API целиком;
+- project, task — сам объект со вложенными данными: ответы retrieve.
+  Правка задачи не сбрасывает закешированные чужие задачи и проекты;
+- admin_counts — счётчики связанных объектов в админке
+  (AnnotatedCountsMixin.cached_counts), версия на модель changelist-а,
+  например admin_counts=['tasks.project'].
+
+Увеличение версий вызывается из сигналов (tasks/signals.py), а там, где
+сигналов нет, — явно: invalidate_tasks после bulk_create/bulk_update,
+invalidate_task_queryset перед QuerySet.update.
+
+Внутри транзакции версии увеличиваются сразу и ещё раз после коммита:
+иначе параллельный запрос успел бы закешировать старые данные под новой
+версией до того, как запись станет видна.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+USER = 'user'
+PROJECT = 'project'
+TASK = 'task'
+ADMIN_COUNTS = 'admin_counts'
+
+
+def _key(scope, pk):
+    return f'data-version:{scope}:{pk}'
+
+
+def _initial_version():
+    # счётчик могут вытеснить из кеша: новое значение от времени не совпадёт со старыми
+    return time.time_ns() // 1000
+
+
+def get_versions(**scopes):
+    """get_versions(user=[1], task=[5, 6]) -> {('user', 1): v, ('task', 5): v, ...} одним get_many"""
+    keys = {
+        _key(scope, pk): (scope, pk)
+        for scope, pks in scopes.items()
+        for pk in pks
+    }
+    found = cache.get_many(keys)
+    missing = {key: _initial_version() for key in keys if key not in found}
+    if missing:
+        for key, version in missing.items():
+            cache.add(key, version, None)
+        found.update(cache.get_many(missing))
+    return {keys[key]: found.get(key, 0) for key in keys}
+
+
+def version_token(**scopes):
+    """строка для кеш-ключа: 'task:5=3|user:1=17'"""
+    versions = get_versions(**{scope: sorted(pks) for scope, pks in scopes.items()})
+    return '|'.join(f'{scope}:{pk}={version}' for (scope, pk), version in sorted(versions.items()))
+
+
+def _bump_now(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_version(), None)
+
+
+def bump(**scopes):
+    """bump(user=[1], project=[2]) — увеличивает версии (None в списках пропускаются)"""
+    keys = {
+        _key(scope, pk)
+        for scope, pks in scopes.items()
+        for pk in pks
+        if pk is not None
+    }
+    if not keys:
+        return
+    _bump_now(keys)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump_now(keys))
+
+
+def invalidate_tasks(tasks):
+    """для задач, записанных в обход сигналов (bulk_create/bulk_update)"""
+    task_ids, users, projects = set(), set(), set()
+    for task in tasks:
+        task_ids.add(task.pk)
+        users.add(task.author_id)
+        projects.add(task.project_id)
+        # прежние автор/проект, если их поменяли (снимок DirtyFieldsMixin)
+        for attname, (old, _) in getattr(task, 'get_dirty_fields', dict)().items():
+            if attname == 'author_id':
+                users.add(old)
+            elif attname == 'project_id':
+                projects.add(old)
+    # новые или перенесённые задачи меняют счётчики задач проектов в админке
+    bump(task=task_ids, user=users, project=projects, admin_counts=['tasks.project'])
+
+
+def invalidate_task_queryset(queryset):
+    """перед QuerySet.update(): одна выборка затронутых задач, авторов и проектов
+
+    Новые значения author/project в update() сюда не попадают — их версии
+    (и admin_counts=['tasks.project'] при переносе) увеличивает вызывающий.
+    """
+    rows = list(queryset.values_list('pk', 'author_id', 'project_id'))
+    bump(
+        task=[row[0] for row in rows],
+        user={row[1] for row in rows},
+        project={row[2] for row in rows},
+    )
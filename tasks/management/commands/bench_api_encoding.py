@@ -0,0 +1,87 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from rest_framework.renderers import JSONRenderer
+from taskflow_manager import compression
+from taskflow_manager.compression import CompressionMiddleware
+from taskflow_manager.renderers import FastJSONRenderer, orjson
+from tasks.bench import bench_user, percentile
+
+
+def best_time(function, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает время кодирования JSON (json и orjson), размер ответа и время сжатия '
+        '(gzip, brotli) для страницы /api/tasks/?page_size=100'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/tasks/?page_size=100', help='Адрес для запросов')
+        parser.add_argument('--repeat', type=int, default=20, help='Повторов (для кодирования берётся лучшее время)')
+        parser.add_argument('--user', default=None, help='Пользователь (по умолчанию — автор с наибольшим числом задач)')
+
+    def handle(self, *args, **options):
+        user = bench_user(options['user'])
+        if user is None:
+            raise CommandError('нет пользователей с задачами')
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(user)
+        repeat = options['repeat']
+
+        with override_settings(API_RESPONSE_CACHE_TIMEOUT=0):
+            response = client.get(options['path'], HTTP_ACCEPT_ENCODING='identity')
+        if response.status_code != 200:
+            raise CommandError(f'{options["path"]}: HTTP {response.status_code}')
+        data = response.data
+        self.stdout.write(f"{options['path']}: {len(data.get('results', data))} объектов")
+
+        self.stdout.write('\nКодирование JSON:')
+        renderers = [('json (JSONRenderer)', JSONRenderer())]
+        if orjson is not None:
+            renderers.append(('orjson (FastJSONRenderer)', FastJSONRenderer()))
+        else:
+            self.stdout.write(self.style.WARNING('  orjson не установлен — FastJSONRenderer работает как JSONRenderer'))
+        rendered = {}
+        for name, renderer in renderers:
+            elapsed, content = best_time(lambda: renderer.render(data, 'application/json'), repeat)
+            rendered[name] = content
+            self.stdout.write(f'  {name:<28} {elapsed * 1000:>7.2f} мс  {len(content):>9} байт')
+        if len(set(rendered.values())) > 1:
+            self.stdout.write(self.style.ERROR('  вывод рендереров РАЗЛИЧАЕТСЯ'))
+
+        self.stdout.write('\nСжатие:')
+        content = rendered[renderers[-1][0]]
+        middleware = CompressionMiddleware(lambda request: None)
+        encodings = ['gzip'] + (['br'] if compression.brotli is not None else [])
+        if compression.brotli is None:
+            self.stdout.write(self.style.WARNING('  brotli не установлен — только gzip'))
+        for encoding in encodings:
+            elapsed, compressed = best_time(lambda: middleware.compress(content, encoding), repeat)
+            self.stdout.write(
+                f'  {encoding:<28} {elapsed * 1000:>7.2f} мс  {len(compressed):>9} байт  '
+                f'({len(compressed) / len(content):.0%} от исходного)'
+            )
+
+        self.stdout.write('\nЗапрос целиком (кеш ответов выключен):')
+        with override_settings(API_RESPONSE_CACHE_TIMEOUT=0):
+            for accept in ['identity'] + encodings:
+                latencies, size = [], 0
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    response = client.get(options['path'], HTTP_ACCEPT_ENCODING=accept)
+                    latencies.append(time.perf_counter() - started)
+                    size = len(response.content)
+                self.stdout.write(
+                    f'  Accept-Encoding: {accept:<12} {size:>9} байт  '
+                    f'p50 {percentile(latencies, 50) * 1000:>7.1f} мс  p95 {percentile(latencies, 95) * 1000:>7.1f} мс'
+                )
@@ -0,0 +1,49 @@
+from importlib.util import find_spec
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from tasks.bench import (
+    bench_user, format_summary, http_load, running_server, server_commands, session_cookie, summarize,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает синхронный WSGI (gunicorn) и асинхронный ASGI (uvicorn, ASYNC_VIEWS=1): '
+        'пропускная способность и p99 при высокой конкурентности'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Всего запросов на сервер')
+        parser.add_argument('--concurrency', type=int, default=64, help='Одновременных соединений')
+        parser.add_argument('--workers', type=int, default=2, help='Процессов сервера')
+        parser.add_argument('--threads', type=int, default=4, help='Потоков на процесс gunicorn')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--paths', default='/api/tasks/,/tasks/', help='Адреса через запятую')
+        parser.add_argument('--user', default=None, help='Пользователь (по умолчанию — автор с наибольшим числом задач)')
+
+    def handle(self, *args, **options):
+        if str(settings.DATABASES['default']['NAME']).startswith(':memory:') or \
+                'mode=memory' in str(settings.DATABASES['default']['NAME']):
+            raise CommandError('серверам нужна общая БД: in-memory SQLite не подходит')
+        user = bench_user(options['user'])
+        if user is None:
+            raise CommandError('нет пользователей с задачами')
+        headers = {'Cookie': session_cookie(user), 'Accept': 'application/json'}
+        paths = [path.strip() for path in options['paths'].split(',') if path.strip()]
+        port = options['port']
+        servers = server_commands(port, options['workers'], options['threads'])
+        self.stdout.write(
+            f"{options['requests']} запросов, {options['concurrency']} соединений, "
+            f"{options['workers']} процесса, адреса: {', '.join(paths)}"
+        )
+        for name, module, command, env in servers.values():
+            if find_spec(module) is None:
+                self.stdout.write(self.style.WARNING(f'{name}: пропущен, не установлен {module}'))
+                continue
+            with running_server(command, env, port):
+                http_load(f'http://127.0.0.1:{port}', paths, options['concurrency'], options['concurrency'], headers)
+                latencies, elapsed, errors = http_load(
+                    f'http://127.0.0.1:{port}', paths, options['requests'], options['concurrency'], headers,
+                )
+                self.stdout.write(f'{format_summary(name, summarize(latencies, elapsed))}  ошибок: {errors}')
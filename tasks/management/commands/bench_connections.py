@@ -0,0 +1,68 @@
+import threading
+from copy import deepcopy
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from tasks.bench import bench_user, format_summary, run_clients, summarize, use_database_settings
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность /api/tasks/ при соединении на каждый запрос, '
+        'постоянных соединениях (CONN_MAX_AGE) и пуле psycopg 3'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Всего запросов на режим')
+        parser.add_argument('--threads', type=int, default=4, help='Число параллельных клиентов')
+        parser.add_argument('--user', default=None, help='Пользователь (по умолчанию — автор с наибольшим числом задач)')
+        parser.add_argument('--path', default='/api/tasks/', help='Адрес для запросов')
+
+    def handle(self, *args, **options):
+        user = bench_user(options['user'])
+        if user is None:
+            raise CommandError('нет пользователей — создайте данные (например, seed)')
+        original = deepcopy(connections.settings['default'])
+
+        modes = {
+            'connect (max_age=0)': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False},
+            'persistent (max_age=600)': {'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': True},
+        }
+        if original['ENGINE'].endswith('postgresql') and self.pool_available():
+            options_with_pool = {**original.get('OPTIONS', {}), 'pool': {'min_size': 2, 'max_size': options['threads']}}
+            modes['pool (psycopg 3)'] = {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'OPTIONS': options_with_pool}
+        else:
+            self.stdout.write('пул пропущен: нужен PostgreSQL и psycopg[pool]')
+
+        connects = []
+        lock = threading.Lock()
+
+        def count_connect(sender, **kwargs):
+            with lock:
+                connects.append(1)
+
+        connection_created.connect(count_connect)
+        try:
+            for name, overrides in modes.items():
+                use_database_settings({**original, **overrides})
+                connects.clear()
+                latencies, elapsed, errors = run_clients(
+                    user, [options['path']], options['requests'], options['threads'],
+                )
+                self.stdout.write(
+                    f"{format_summary(name, summarize(latencies, elapsed))}  "
+                    f"соединений: {len(connects)}, ошибок: {errors}"
+                )
+                if 'pool' in overrides.get('OPTIONS', {}):
+                    connections['default'].close_pool()
+        finally:
+            connection_created.disconnect(count_connect)
+            use_database_settings(original)
+
+    def pool_available(self):
+        try:
+            import psycopg_pool  # noqa: F401
+        except ImportError:
+            return False
+        return True
@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.test import RequestFactory, override_settings
+from tasks.bench import bench_user
+from tasks.serializers import TaskListFastSerializer, TaskSerializer
+from tasks.views_api import TaskViewSet
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает время сериализации списка задач: TaskSerializer и TaskListFastSerializer (на 1000 задач)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=1000, help='Сколько задач сериализовать')
+        parser.add_argument('--repeat', type=int, default=5, help='Повторов (берётся лучшее время)')
+        parser.add_argument('--user', default=None, help='Автор задач (по умолчанию — у кого их больше всего)')
+
+    def handle(self, *args, **options):
+        user = bench_user(options['user'])
+        if user is None:
+            raise CommandError('нет пользователей с задачами')
+        request = RequestFactory().get('/api/tasks/', HTTP_HOST='localhost')
+        request.user = user
+        view = TaskViewSet(request=request, format_kwarg=None, action='list')
+        queryset = view.get_queryset().order_by('-created_at')[:options['tasks']]
+        context = {'request': request}
+
+        results = {}
+        for name, build in (
+            ('TaskSerializer', lambda: TaskSerializer(queryset.all(), many=True, context=context).data),
+            ('TaskListFastSerializer', lambda: TaskListFastSerializer(
+                TaskListFastSerializer.prepare(queryset.all()), context=context).data),
+        ):
+            best, queries, data = None, 0, None
+            for _ in range(options['repeat']):
+                with override_settings(DEBUG=True):
+                    reset_queries()
+                    started = time.perf_counter()
+                    data = build()
+                    elapsed = time.perf_counter() - started
+                    queries = len(connection.queries)
+                best = elapsed if best is None else min(best, elapsed)
+            results[name] = data
+            per_thousand = best / max(len(data), 1) * 1000 * 1000
+            self.stdout.write(
+                f'{name:<24} задач: {len(data):>6}  время: {best * 1000:>8.1f} мс  '
+                f'({per_thousand:.1f} мс на 1000)  запросов: {queries}'
+            )
+
+        same = [dict(row) for row in results['TaskSerializer']] == results['TaskListFastSerializer']
+        style = self.style.SUCCESS if same else self.style.ERROR
+        self.stdout.write(style('JSON совпадает' if same else 'JSON РАЗЛИЧАЕТСЯ'))
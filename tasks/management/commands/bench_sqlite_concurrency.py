@@ -0,0 +1,90 @@
+import tempfile
+import threading
+import time
+from copy import deepcopy
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, transaction
+from taskflow_manager.database_url import SQLITE_TUNED_OPTIONS
+from tasks.bench import format_summary, summarize, use_database_settings
+
+SQLITE_TUNED_KEYS = set(SQLITE_TUNED_OPTIONS)
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест SQLite: N потоков создают и читают задачи, '
+        'сравнение настроек по умолчанию и режима WAL + BEGIN IMMEDIATE'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Число потоков')
+        parser.add_argument('--operations', type=int, default=200, help='Операций на поток')
+        parser.add_argument('--list-ratio', type=float, default=0.7, help='Доля чтений среди операций')
+
+    def handle(self, *args, **options):
+        original = deepcopy(connections.settings['default'])
+        if not original['ENGINE'].endswith('sqlite3'):
+            raise CommandError('бенчмарк предназначен для SQLite')
+        base_options = {k: v for k, v in original.get('OPTIONS', {}).items() if k not in SQLITE_TUNED_KEYS}
+        modes = {
+            'по умолчанию': {**base_options, 'timeout': 5},
+            'WAL + IMMEDIATE': {**base_options, **SQLITE_TUNED_OPTIONS},
+        }
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                for number, (name, db_options) in enumerate(modes.items()):
+                    # каждый режим — на своей свежей базе (журнал WAL сохраняется в файле)
+                    use_database_settings({
+                        **original,
+                        'NAME': Path(directory) / f'bench{number}.sqlite3',
+                        'OPTIONS': db_options,
+                        'CONN_MAX_AGE': None,
+                    })
+                    call_command('migrate', verbosity=0)
+                    self.run_mode(name, options)
+        finally:
+            use_database_settings(original)
+
+    def run_mode(self, name, options):
+        from django.contrib.auth import get_user_model
+        from tasks.models import Project, Task
+
+        user = get_user_model().objects.create_user('bench_sqlite')
+        project = Project.objects.create(title='Бенчмарк', owner=user)
+        latencies, errors = [], []
+        lock = threading.Lock()
+
+        def worker(index):
+            local, failed = [], 0
+            for i in range(options['operations']):
+                started = time.perf_counter()
+                try:
+                    if (i * 7919 + index) % 100 < options['list_ratio'] * 100:
+                        list(Task.objects.filter(author=user).order_by('-created_at')[:20])
+                    else:
+                        with transaction.atomic():
+                            # чтение перед записью — тот самый случай, когда DEFERRED падает
+                            task_project = Project.objects.get(pk=project.pk)
+                            Task.objects.create(title=f'Задача {index}-{i}', project=task_project, author=user)
+                except OperationalError:
+                    failed += 1
+                local.append(time.perf_counter() - started)
+            connections.close_all()
+            with lock:
+                latencies.extend(local)
+                errors.append(failed)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{format_summary(name, summarize(latencies, elapsed))}  "
+            f"ошибок «database is locked»: {sum(errors)}"
+        )
@@ -0,0 +1,348 @@
+import json
+import platform
+import re
+import secrets
+import subprocess
+from contextlib import nullcontext
+from importlib.util import find_spec
+from io import StringIO
+from pathlib import Path
+from urllib.parse import quote, urlsplit
+
+import django
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.http import QueryDict
+from django.test import RequestFactory
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.utils import timezone
+from tasks.bench import (
+    bench_user, best_time, csrf_token, format_summary, http_load, load_collection, running_server,
+    server_commands, session_cookie, summarize,
+)
+from tasks.filters import TaskFilter
+from tasks.models import Attachment, Project, Task
+from tasks.serializers import TaskSerializer
+from tasks.views_api import TaskViewSet
+
+DETAIL = re.compile(r'^/api/(projects|tasks|attachments)/1/')
+
+
+class Command(BaseCommand):
+    help = (
+        'Воспроизводит запросы postman_collection.json на локальном сервере (rps и p50/p95/p99 по каждому), '
+        'гоняет микробенчмарки TaskSerializer, TaskFilter и send_task_reminders и сохраняет результаты в JSON '
+        'для сравнения между коммитами'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--collection', default=str(settings.BASE_DIR / 'postman_collection.json'))
+        parser.add_argument('--base-url', default=None, help='Адрес сервера (по умолчанию — base_url коллекции)')
+        parser.add_argument('--serve', choices=['wsgi', 'asgi'], default=None,
+                            help='Запустить свой сервер (gunicorn или uvicorn) на --port вместо --base-url')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--workers', type=int, default=2, help='Процессов сервера (с --serve)')
+        parser.add_argument('--threads', type=int, default=4, help='Потоков на процесс gunicorn (с --serve)')
+        parser.add_argument('--requests', type=int, default=200, help='Запросов на каждый адрес')
+        parser.add_argument('--concurrency', type=int, default=8, help='Одновременных соединений')
+        parser.add_argument('--only', default='', help='Только запросы, где метод+адрес или имя содержат '
+                                                       'одну из подстрок (через запятую)')
+        parser.add_argument('--read-only', action='store_true', help='Только GET (не менять данные на сервере)')
+        parser.add_argument('--password', default=None,
+                            help='Пароль пользователя для запроса входа в админку (без него вход пропускается)')
+        parser.add_argument('--no-http', action='store_true', help='Без нагрузки на сервер')
+        parser.add_argument('--no-micro', action='store_true', help='Без микробенчмарков')
+        parser.add_argument('--micro-tasks', type=int, default=500, help='Задач для микробенчмарка сериализатора')
+        parser.add_argument('--repeat', type=int, default=5, help='Повторов микробенчмарков (берётся лучшее время)')
+        parser.add_argument('--reminder-days', type=int, default=1, help='--days для send_task_reminders')
+        parser.add_argument('--user', default=None, help='Пользователь (по умолчанию — автор с наибольшим числом задач)')
+        parser.add_argument('--output', default=None,
+                            help='Файл результатов (по умолчанию bench_results/<дата>-<коммит>.json)')
+        parser.add_argument('--compare', default=None, help='JSON прошлого прогона: показать изменения')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1 or options['repeat'] < 1:
+            raise CommandError('--requests, --concurrency и --repeat должны быть положительными')
+        user = bench_user(options['user'])
+        if user is None:
+            raise CommandError('нет пользователей с задачами')
+        previous = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                previous = json.load(file)
+
+        results = {'meta': self.meta(user, options), 'endpoints': {}, 'micro': {}}
+        if not options['no_http']:
+            results['endpoints'] = self.run_http(user, options)
+        if not options['no_micro']:
+            results['micro'] = self.run_micro(user, options)
+
+        output = Path(options['output'] or settings.BASE_DIR / 'bench_results' / (
+            f"{timezone.now():%Y%m%d-%H%M%S}-{results['meta']['commit'] or 'nogit'}.json"
+        ))
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding='utf-8')
+        self.stdout.write(self.style.SUCCESS(f'Результаты: {output}'))
+        if previous is not None:
+            self.compare(previous, results)
+
+    def meta(self, user, options):
+        try:
+            commit = subprocess.run(
+                ['git', 'describe', '--always', '--dirty'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, timeout=10,
+            ).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            commit = ''
+        return {
+            'commit': commit,
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'tasks': Task.objects.count(),
+            'user': user.username,
+            'user_tasks': Task.objects.filter(author=user).count(),
+            'server': options['serve'] or options['base_url'] or 'base_url коллекции',
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+        }
+
+    # нагрузка по коллекции
+
+    def run_http(self, user, options):
+        if options['serve'] and connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            raise CommandError('серверу нужна общая БД: in-memory SQLite не подходит')
+        cookie, token = csrf_token()
+        variables = {'admin_username': user.username, 'admin_password': options['password'] or '',
+                     'csrf_token': token}
+        if options['serve']:
+            variables['base_url'] = f"http://127.0.0.1:{options['port']}"
+        elif options['base_url']:
+            variables['base_url'] = options['base_url']
+        items = [item for item in load_collection(options['collection'], variables) if self.selected(item, options)]
+        if not items:
+            raise CommandError('в коллекции не осталось запросов для прогона')
+        base_url = variables.get('base_url') or self.collection_base_url(options['collection'])
+        headers = {'Cookie': f'{session_cookie(user)}; {settings.CSRF_COOKIE_NAME}={cookie}',
+                   'Accept': 'application/json'}
+        self.stdout.write(
+            f"{len(items)} адресов по {options['requests']} запросов, {options['concurrency']} соединений, "
+            f"сервер: {base_url}"
+        )
+
+        fixtures = Fixtures(user)
+        results = {}
+        try:
+            with self.server(options):
+                # прогрев: первые запросы к свежему процессу сервера не учитываем
+                http_load(base_url, ['/api/tasks/'], options['concurrency'], options['concurrency'], headers)
+                for item in items:
+                    key = f"{item['method']} {item['path']}"
+                    requests = self.concrete(item, fixtures, options['requests'], cookie)
+                    if item['method'] == 'GET':  # и кеши ответов
+                        http_load(base_url, requests, options['concurrency'], options['concurrency'], headers)
+                    latencies, elapsed, errors = http_load(
+                        base_url, requests, options['requests'], options['concurrency'], headers,
+                    )
+                    summary = {'name': item['name'], **summarize(latencies, elapsed), 'errors': errors}
+                    results[key] = summary
+                    style = self.style.WARNING if errors else (lambda text: text)
+                    self.stdout.write(style(f'{format_summary(f"{key:<64}", summary)}  ошибок: {errors}'))
+        finally:
+            fixtures.cleanup()
+        return results
+
+    def selected(self, item, options):
+        if options['read_only'] and item['method'] != 'GET':
+            return False
+        if item['path'].startswith('/admin/login/') and item['method'] == 'POST' and not options['password']:
+            self.stdout.write(self.style.WARNING(f"{item['name']}: пропущен, нужен --password"))
+            return False
+        needles = [needle.strip() for needle in options['only'].split(',') if needle.strip()]
+        key = f"{item['method']} {item['path']}"
+        return not needles or any(needle in key or needle in item['name'] for needle in needles)
+
+    def collection_base_url(self, path):
+        with open(path, encoding='utf-8') as file:
+            variables = {item['key']: item.get('value') for item in json.load(file).get('variable', [])}
+        return variables.get('base_url') or 'http://127.0.0.1:8000'
+
+    def server(self, options):
+        if not options['serve']:
+            return nullcontext()
+        name, module, command, env = server_commands(
+            options['port'], options['workers'], options['threads'],
+        )[options['serve']]
+        if find_spec(module) is None:
+            raise CommandError(f'{name}: не установлен {module}')
+        return running_server(command, env, options['port'])
+
+    def concrete(self, item, fixtures, count, cookie):
+        """count запросов для http_load: id объектов из коллекции (1) заменяются настоящими"""
+        method, path = item['method'], item['path']
+        extra = dict(item['headers'])
+        if path.startswith('/admin/login/'):
+            # вход создаёт новую сессию — общую cookie сессии не отправляем
+            extra['Cookie'] = f'{settings.CSRF_COOKIE_NAME}={cookie}'
+        body = item['body']
+        if item['form'] is not None:
+            form = {
+                name: value if value is not None else SimpleUploadedFile('bench.txt', b'benchmark\n' * 64,
+                                                                         'text/plain')
+                for name, value in item['form'].items()
+            }
+            body = encode_multipart(BOUNDARY, form)
+            extra['Content-Type'] = MULTIPART_CONTENT
+        elif body is not None:
+            body = re.sub(r'("project_id"\s*:\s*)1\b', rf'\g<1>{fixtures.project.pk}', body)
+            # сроки из коллекции уже в прошлом — валидатор их не пропустит; переносим на следующий год
+            body = re.sub(r'("due_date"\s*:\s*")\d{4}', rf'\g<1>{timezone.localdate().year + 1}', body)
+
+        match = DETAIL.match(path)
+        if method == 'DELETE' and match:
+            ids = fixtures.pool(match.group(1), count)  # каждый DELETE — свой объект
+        else:
+            ids = [fixtures.target(match.group(1), method) if match else None] * count
+        task_id = fixtures.target('tasks', method)
+        requests = []
+        for number, pk in enumerate(ids):
+            concrete = DETAIL.sub(f'/api/\\g<1>/{pk}/', path) if pk else path
+            concrete = re.sub(r'([?&]task_id=)1\b', rf'\g<1>{task_id}', concrete)
+            data = body
+            if isinstance(body, str):
+                # названия задач у автора уникальны — повторная отправка того же тела получила бы 400
+                data = re.sub(r'("title"\s*:\s*"[^"]*)"', rf'\g<1> {number}"', body).encode()
+            requests.append((method, quote(concrete, safe="/?=&%:,+"), data, extra))
+        return requests
+
+    # микробенчмарки
+
+    def run_micro(self, user, options):
+        view = TaskViewSet(action='list', action_map={'get': 'list'}, args=(), kwargs={}, format_kwarg=None)
+        request = view.initialize_request(RequestFactory().get('/api/tasks/', HTTP_HOST='localhost'))
+        request.user = user
+        view.request = request
+        queryset = view.get_queryset()
+        tasks = queryset.order_by('-created_at')[:options['micro_tasks']]
+        context = {'request': request}
+        page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE') or 10
+
+        benchmarks = [
+            (f"TaskSerializer ({len(tasks)} задач)",
+             lambda: TaskSerializer(tasks.all(), many=True, context=context).data),
+        ]
+        # фильтры — из запросов списка задач в коллекции
+        seen = set()
+        for item in load_collection(options['collection']):
+            parts = urlsplit(item['path'])
+            params = QueryDict(parts.query)
+            if item['method'] != 'GET' or parts.path != '/api/tasks/' or not set(params) & set(TaskFilter.base_filters):
+                continue
+            if parts.query in seen:
+                continue
+            seen.add(parts.query)
+            benchmarks.append((f'TaskFilter ?{parts.query}', self.filter_benchmark(params, queryset, request, page_size)))
+        benchmarks.append((
+            f"send_task_reminders --days {options['reminder_days']}",
+            lambda: call_command('send_task_reminders', days=options['reminder_days'], dry_run=True,
+                                 stdout=StringIO()),
+        ))
+
+        results = {}
+        for name, function in benchmarks:
+            best, median, queries = best_time(function, options['repeat'])
+            results[name] = {'best_ms': best * 1000, 'median_ms': median * 1000, 'queries': queries}
+            self.stdout.write(
+                f'{name:<64} лучшее {best * 1000:>8.1f} мс  медиана {median * 1000:>8.1f} мс  запросов: {queries}'
+            )
+        return results
+
+    def filter_benchmark(self, params, queryset, request, page_size):
+        def run():
+            # как список API: проверка параметров, COUNT и первая страница
+            filtered = TaskFilter(params, queryset=queryset, request=request).qs
+            filtered.count()
+            list(filtered[:page_size])
+        return run
+
+    # сравнение
+
+    def compare(self, previous, current):
+        self.stdout.write(f"\nСравнение с {previous.get('meta', {}).get('commit') or 'прошлым прогоном'}:")
+        for key, summary in current['endpoints'].items():
+            old = previous.get('endpoints', {}).get(key)
+            if old:
+                self.stdout.write(self.change(
+                    f'{key:<64}', ('rps', old['rps'], summary['rps'], True),
+                    ('p95', old['p95_ms'], summary['p95_ms'], False),
+                ))
+        for name, result in current['micro'].items():
+            old = previous.get('micro', {}).get(name)
+            if old:
+                self.stdout.write(self.change(f'{name:<64}', ('время', old['best_ms'], result['best_ms'], False)))
+
+    def change(self, label, *metrics):
+        parts, worse = [], False
+        for name, old, new, higher_is_better in metrics:
+            delta = (new - old) / old * 100 if old else 0.0
+            worse |= (delta < -10) if higher_is_better else (delta > 10)
+            parts.append(f'{name} {delta:+6.1f}%')
+        line = f"{label} {'  '.join(parts)}"
+        return self.style.WARNING(line) if worse else line
+
+
+class Fixtures:
+    """объекты для запросов коллекции с id; всё созданное за прогон удаляется в cleanup()"""
+
+    def __init__(self, user):
+        self.user = user
+        self.marks = {model: model.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+                      for model in (Project, Task, Attachment)}
+        # изменяющие запросы работают со своими объектами, чтения — с данными пользователя
+        self.name = f'bench {secrets.token_hex(4)}'  # названия задач у автора уникальны
+        self.project = Project.objects.create(title=self.name, owner=user)
+        self.task = Task.objects.create(title=self.name, project=self.project, author=user)
+        self.attachment = self.attachments(self.task, 1)[0]
+        self.reads = {
+            'projects': Project.objects.filter(owner=user).order_by('pk').first() or self.project,
+            'tasks': Task.objects.filter(author=user).order_by('-created_at').first() or self.task,
+            'attachments': Attachment.objects.filter(task__author=user).order_by('pk').first() or self.attachment,
+        }
+        self.writes = {'projects': self.project, 'tasks': self.task, 'attachments': self.attachment}
+
+    def target(self, kind, method):
+        return (self.reads if method == 'GET' else self.writes)[kind].pk
+
+    def attachments(self, task, count):
+        return Attachment.objects.bulk_create([
+            Attachment(task=task, file='attachments/bench/missing.txt', file_type='document',
+                       original_name='bench.txt', uploaded_by=self.user)
+            for _ in range(count)
+        ])
+
+    def pool(self, kind, count):
+        """count новых объектов для DELETE"""
+        if kind == 'projects':
+            objects = Project.objects.bulk_create([Project(title=self.name, owner=self.user) for _ in range(count)])
+        elif kind == 'tasks':
+            objects = Task.objects.bulk_create(
+                [Task(title=f'{self.name} {number}', project=self.project, author=self.user) for number in range(count)]
+            )
+        else:
+            objects = self.attachments(self.task, count)
+        return [obj.pk for obj in objects]
+
+    def cleanup(self):
+        uploaded = Attachment.objects.filter(
+            pk__gt=self.marks[Attachment], task__author=self.user,
+        ).exclude(file='attachments/bench/missing.txt').values_list('file', flat=True)
+        for name in uploaded:
+            default_storage.delete(name)
+        Project.objects.filter(pk__gt=self.marks[Project], owner=self.user).delete()
+        Task.objects.filter(pk__gt=self.marks[Task], author=self.user).delete()
+        Attachment.objects.filter(pk__gt=self.marks[Attachment], task__author=self.user).delete()
@@ -0,0 +1,145 @@
+import csv
+import os
+import time
+
+import tablib
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from tasks.resources import TaskImportLookups, TaskResource
+
+User = get_user_model()
+
+
+def iter_csv_rows(path):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        yield from reader
+
+
+def iter_xlsx_rows(path):
+    from openpyxl import load_workbook
+
+    # read_only — построчное чтение без загрузки всей книги в память
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield ['' if value is None else value for value in row]
+    finally:
+        workbook.close()
+
+
+READERS = {
+    'csv': iter_csv_rows,
+    'xlsx': iter_xlsx_rows,
+}
+
+
+class Command(BaseCommand):
+    help = 'Массовый импорт задач из CSV/XLSX (формат совпадает с экспортом из админки)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу CSV или XLSX')
+        parser.add_argument(
+            '--format',
+            choices=sorted(READERS),
+            help='Формат файла (по умолчанию — по расширению)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пачки для bulk_create/bulk_update (по умолчанию: 1000)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=20000,
+            help='Сколько строк обрабатывать за одну транзакцию (по умолчанию: 20000)'
+        )
+        parser.add_argument(
+            '--user',
+            help='Логин пользователя: автор по умолчанию и автор записей истории'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Проверить файл без записи в БД'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {file_format}')
+        if options['batch_size'] < 1 or options['chunk_size'] < 1:
+            raise CommandError('Размеры пачки и чанка должны быть положительными')
+
+        user = None
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f"Пользователь {options['user']} не найден")
+
+        rows = READERS[file_format](path)
+        headers = next(rows, None)
+        if not headers:
+            raise CommandError('Файл пуст')
+
+        started = time.perf_counter()
+        lookups = TaskImportLookups()
+        resource = TaskResource(lookups=lookups, batch_size=options['batch_size'])
+        self.stdout.write(
+            f"Справочники загружены: пользователей {len(lookups.user_ids)}, "
+            f"проектов {len(lookups.project_ids)}"
+        )
+
+        totals = {'new': 0, 'update': 0, 'skip': 0, 'invalid': 0, 'error': 0}
+        processed = 0
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= options['chunk_size']:
+                processed += self.import_chunk(resource, headers, chunk, user, totals, options, processed)
+                chunk = []
+                self.report_progress(processed, started)
+        if chunk:
+            processed += self.import_chunk(resource, headers, chunk, user, totals, options, processed)
+            self.report_progress(processed, started)
+
+        elapsed = time.perf_counter() - started
+        rate = processed / elapsed if elapsed else 0
+        summary = (
+            f"\nИмпорт завершён{' (DRY RUN)' if options['dry_run'] else ''}. "
+            f"Строк: {processed}, создано: {totals['new']}, обновлено: {totals['update']}, "
+            f"без изменений: {totals['skip']}, с ошибками валидации: {totals['invalid']}, "
+            f"ошибок: {totals['error']}. Время: {elapsed:.1f} с, {rate:.0f} строк/с"
+        )
+        if totals['invalid'] or totals['error']:
+            self.stdout.write(self.style.WARNING(summary))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
+
+    def import_chunk(self, resource, headers, chunk, user, totals, options, offset):
+        dataset = tablib.Dataset(*chunk, headers=headers)
+        result = resource.import_data(
+            dataset,
+            dry_run=options['dry_run'],
+            use_transactions=True,
+            user=user,
+        )
+        for key in totals:
+            totals[key] += result.totals.get(key, 0)
+
+        for row_number, errors in result.row_errors()[:10]:
+            for error in errors:
+                self.stderr.write(f"  строка {offset + row_number}: {error.error}")
+        for invalid in result.invalid_rows[:10]:
+            self.stderr.write(f"  строка {offset + invalid.number}: {invalid.error_dict}")
+        for error in result.base_errors:
+            self.stderr.write(f"  {error.error}")
+        return len(chunk)
+
+    def report_progress(self, processed, started):
+        elapsed = time.perf_counter() - started
+        rate = processed / elapsed if elapsed else 0
+        self.stdout.write(f"  обработано {processed} строк ({rate:.0f} строк/с)")
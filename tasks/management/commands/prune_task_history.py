@@ -0,0 +1,77 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from tasks import history
+
+
+class Command(BaseCommand):
+    help = (
+        'Сжимает и прореживает историю задач (HistoricalTask) по настройкам '
+        'TASK_HISTORY_RETENTION; на PostgreSQL поддерживает секционирование по месяцам'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-all-days', type=int, default=None,
+                            help='Сколько дней хранить все записи')
+        parser.add_argument('--keep-daily-days', type=int, default=None,
+                            help='До какого возраста хранить дневные снимки (старше — удаляются)')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Размер пакета удаления')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать, что будет удалено')
+        parser.add_argument('--partition', action='store_true',
+                            help='PostgreSQL: перевести таблицу истории на помесячные секции')
+        parser.add_argument('--interval', type=int, default=None,
+                            help='Запускаться повторно каждые N секунд (режим планировщика)')
+
+    def handle(self, *args, **options):
+        retention = history.get_retention_settings(
+            keep_all_days=options['keep_all_days'],
+            keep_daily_days=options['keep_daily_days'],
+            batch_size=options['batch_size'],
+        )
+
+        if options['partition']:
+            converted = history.partition_history_table(retention['partition_months_ahead'])
+            self.stdout.write('Таблица истории секционирована' if converted else 'Таблица уже секционирована')
+
+        # границы прошлого прохода: в режиме --interval старые строки уже сжаты и прорежены
+        self.compacted_through, self.thinned_since = 0, None
+        while True:
+            self.prune(retention, options['dry_run'])
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def prune(self, retention, dry_run):
+        started = time.monotonic()
+        if history.is_partitioned() and not dry_run:
+            created = history.ensure_partitions(timezone.localdate(), retention['partition_months_ahead'])
+            if created:
+                self.stdout.write(f"Созданы секции: {', '.join(created)}")
+
+        compacted_through = history.latest_history_id()
+        # день на стыке мог быть прорежен не до конца — захватываем его ещё раз
+        thinned_since = timezone.now() - timedelta(days=retention['keep_all_days'] + 1)
+        compacted = history.compact_history(
+            batch_size=retention['batch_size'], dry_run=dry_run, after=self.compacted_through,
+        )
+        thinned = history.thin_history(
+            retention['keep_all_days'],
+            retention['keep_daily_days'],
+            batch_size=retention['batch_size'],
+            dry_run=dry_run,
+            since=self.thinned_since,
+        )
+        if not dry_run:
+            self.compacted_through, self.thinned_since = compacted_through, thinned_since
+        prefix = '[dry-run] ' if dry_run else ''
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{prefix}Записей без изменений: {compacted}, '
+                f'удалено по сроку хранения: {thinned} '
+                f'({time.monotonic() - started:.1f} с)'
+            )
+        )
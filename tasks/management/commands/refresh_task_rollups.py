@@ -0,0 +1,48 @@
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from tasks.models import Task, TaskDailyCount
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает дневные агрегаты задач (TaskDailyCount) для date_hierarchy в админке'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=None,
+            help='Пересчитать только последние N дней (по умолчанию: всю таблицу)'
+        )
+
+    def handle(self, *args, **options):
+        days = options['days']
+        tasks = Task.objects.all()
+        rollups = TaskDailyCount.objects.all()
+        if days is not None:
+            since = timezone.localdate() - timedelta(days=days)
+            tasks = tasks.filter(created_at__gte=timezone.make_aware(datetime.combine(since, time.min)))
+            rollups = rollups.filter(day__gte=since)
+
+        # один GROUP BY по дням вместо агрегатов на каждую загрузку changelist
+        counts = (
+            tasks.annotate(day=TruncDate('created_at'))
+            .values('day')
+            .annotate(n=Count('id'))
+            .order_by()
+        )
+        objs = [TaskDailyCount(day=row['day'], tasks_count=row['n']) for row in counts]
+
+        with transaction.atomic():
+            rollups.delete()
+            TaskDailyCount.objects.bulk_create(objs, batch_size=1000)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Дней пересчитано: {len(objs)}, задач: {sum(o.tasks_count for o in objs)}"
+            )
+        )
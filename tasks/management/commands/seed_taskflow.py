@@ -0,0 +1,149 @@
+import multiprocessing
+import random
+import time
+from datetime import datetime, time as dt_time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, connections
+from django.db.models import Max
+from django.utils import timezone
+from tasks.models import Project, Tag, Task
+from tasks.seed import COLORS, TAG_NAMES, WORDS, generate_files, init_worker, run_chunk, seed_chunk, user_weights
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерирует синтетические данные для нагрузочных тестов: пользователей, проекты, теги, задачи, '
+        'комментарии, вложения и историю (bulk_create в параллельных процессах, детерминированно по --seed)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=10000, help='Сколько задач создать')
+        parser.add_argument('--users', type=int, default=50, help='Сколько пользователей создать')
+        parser.add_argument('--projects-per-user', type=int, default=3, help='Проектов на пользователя (в среднем)')
+        parser.add_argument('--tags', type=int, default=30, help='Сколько тегов должно быть')
+        parser.add_argument('--comments', type=float, default=1.5, help='Комментариев на задачу (в среднем)')
+        parser.add_argument('--attachments', type=float, default=0.2, help='Доля задач с вложениями')
+        parser.add_argument('--files', type=int, default=20, help='Сколько разных файлов сгенерировать для вложений')
+        parser.add_argument('--no-history', action='store_true', help='Не создавать записи истории')
+        parser.add_argument('--seed', type=int, default=1, help='Зерно генератора')
+        parser.add_argument('--prefix', default='seed', help='Префикс логинов и названий')
+        parser.add_argument('--workers', type=int, default=max(1, min(8, multiprocessing.cpu_count())),
+                            help='Процессов-воркеров (1 — без пула)')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Задач в одной транзакции воркера')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Размер пачки bulk_create')
+        parser.add_argument('--until', default=None,
+                            help='Дата отсчёта YYYY-MM-DD: задачи создаются за два года до неё (по умолчанию — сегодня)')
+
+    def handle(self, *args, **options):
+        if options['tasks'] < 0 or options['users'] < 1 or options['chunk_size'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--users, --chunk-size и --batch-size должны быть положительными, --tasks — не меньше 0')
+        workers = options['workers']
+        if workers > 1 and connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            raise CommandError('воркерам нужна общая БД: in-memory SQLite — только с --workers 1')
+        prefix, seed = options['prefix'], options['seed']
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(f'пользователи {prefix}_* уже есть — задайте другой --prefix')
+
+        started = time.perf_counter()
+        plan = self.create_reference_data(options)
+        self.stdout.write(
+            f"пользователей {len(plan['users'])}, проектов {sum(map(len, plan['projects'].values()))}, "
+            f"тегов {len(plan['tags'])}, файлов {len(plan['files'])}"
+        )
+
+        first_id = plan['first_id'] = (Task.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        chunk_size = options['chunk_size']
+        jobs = [
+            (index, first_id + start, min(chunk_size, options['tasks'] - start))
+            for index, start in enumerate(range(0, options['tasks'], chunk_size))
+        ]
+        totals = {}
+        if workers > 1 and len(jobs) > 1:
+            connections.close_all()  # воркеры (fork) открывают свои соединения
+            with multiprocessing.Pool(min(workers, len(jobs)), initializer=init_worker, initargs=(plan,)) as pool:
+                for counts in pool.imap_unordered(run_chunk, jobs):
+                    self.report(totals, counts, options['tasks'], started)
+        else:
+            for job in jobs:
+                self.report(totals, seed_chunk(plan, *job), options['tasks'], started)
+
+        # id задач задавались явно — последовательность PostgreSQL нужно сдвинуть
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Task]):
+                cursor.execute(sql)
+        # задачи только у новых пользователей — чужие кеши (версии пользователей) не устаревают
+        call_command('refresh_task_rollups', stdout=self.stdout)
+
+        elapsed = time.perf_counter() - started
+        summary = ', '.join(f'{name}: {count}' for name, count in totals.items())
+        self.stdout.write(self.style.SUCCESS(f'Готово за {elapsed:.1f} с (seed={seed}). {summary}'))
+
+    def create_reference_data(self, options):
+        """пользователи, проекты, теги и файлы — в основном процессе; план для воркеров"""
+        rng = random.Random(f"{options['seed']}:reference")
+        prefix = options['prefix']
+        until = options['until']
+        now = timezone.make_aware(datetime.combine(
+            datetime.strptime(until, '%Y-%m-%d').date() if until else timezone.localdate(), dt_time.min,
+        ))
+
+        password = make_password(f'{prefix}-password')  # один хеш на всех: PBKDF2 на пользователя — минуты
+        User.objects.bulk_create([
+            User(
+                username=f'{prefix}_{number:06d}', email=f'{prefix}_{number:06d}@example.com',
+                password=password, first_name=rng.choice(WORDS).capitalize(),
+            )
+            for number in range(options['users'])
+        ], batch_size=options['batch_size'])
+        user_ids = list(
+            User.objects.filter(username__startswith=f'{prefix}_').order_by('username').values_list('pk', flat=True)
+        )
+
+        projects = []
+        for user_id in user_ids:
+            for number in range(rng.randint(1, max(1, 2 * options['projects_per_user'] - 1))):
+                projects.append(Project(
+                    title=f'{rng.choice(WORDS).capitalize()} {number + 1}', color=rng.choice(COLORS), owner_id=user_id,
+                ))
+        Project.objects.bulk_create(projects, batch_size=options['batch_size'])
+        projects_by_user = {}
+        rows = Project.objects.filter(owner_id__in=user_ids).order_by('pk').values_list('pk', 'owner_id')
+        for project_id, owner_id in rows:
+            projects_by_user.setdefault(owner_id, []).append(project_id)
+
+        names = [TAG_NAMES[i % len(TAG_NAMES)] + ('' if i < len(TAG_NAMES) else f'-{i // len(TAG_NAMES)}')
+                 for i in range(options['tags'])]
+        Tag.objects.bulk_create(
+            [Tag(name=name, color=COLORS[i % len(COLORS)]) for i, name in enumerate(names)], ignore_conflicts=True,
+        )
+        tag_ids = list(Tag.objects.filter(name__in=names).order_by('name').values_list('pk', flat=True))
+
+        files = generate_files(default_storage, options['files'], options['seed']) if options['attachments'] else []
+        return {
+            'seed': options['seed'],
+            'now': now,
+            'users': user_ids,
+            'user_weights': user_weights(len(user_ids)),
+            'projects': projects_by_user,
+            'tags': tag_ids,
+            'files': files,
+            'comments': options['comments'],
+            'attachments': options['attachments'],
+            'history': not options['no_history'],
+            'batch_size': options['batch_size'],
+        }
+
+    def report(self, totals, counts, total_tasks, started):
+        for name, count in counts.items():
+            totals[name] = totals.get(name, 0) + count
+        elapsed = time.perf_counter() - started
+        rate = totals['tasks'] / elapsed if elapsed else 0
+        self.stdout.write(f"  задач {totals['tasks']}/{total_tasks} ({rate:.0f} задач/с)")
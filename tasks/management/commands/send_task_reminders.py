@@ -1,7 +1,9 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from datetime import timedelta
+from tasks.dates import due_date_in
 from tasks.models import Task
+from taskflow_manager.db_routers import replica_reads
 import logging
 
 logger = logging.getLogger(__name__)
@@ -27,19 +29,22 @@ class Command(BaseCommand):
         days = options['days']
         dry_run = options['dry_run']
         
-        today = timezone.now().date()
+        today = timezone.localdate()
         target_date = today + timedelta(days=days)
         
         self.stdout.write(f"Поиск задач на {target_date.strftime('%d.%m.%Y')}")
         
         # Находим задачи, срок которых наступает через указанное количество дней
+        # диапазон по due_date, а не due_date__date — работает индекс (status, due_date)
         upcoming_tasks = Task.objects.filter(
-            due_date__date=target_date,  # срок выполнения в указанный день
+            due_date_in(target_date, target_date),  # срок выполнения в указанный день
             status__in=['todo', 'in_progress'],  # только невыполненные
-            due_date__isnull=False  # только задачи со сроком
         ).select_related('author', 'project')
         
-        task_count = upcoming_tasks.count()
+        # выборка только читает — можно с реплики
+        with replica_reads():
+            upcoming_tasks = list(upcoming_tasks)
+        task_count = len(upcoming_tasks)
         self.stdout.write(f"Найдено задач: {task_count}")
         
         if task_count == 0:
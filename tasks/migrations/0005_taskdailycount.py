@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0004_attachment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskDailyCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True, verbose_name='День')),
+                ('tasks_count', models.PositiveIntegerField(default=0, verbose_name='Кол-во задач')),
+            ],
+            options={
+                'verbose_name': 'Задачи за день',
+                'verbose_name_plural': 'Задачи по дням',
+                'db_table': 'tasks_task_daily_count',
+                'ordering': ['day'],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:40
+
+import tasks.dates
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0005_taskdailycount'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='due_day',
+            field=models.GeneratedField(db_persist=True, expression=tasks.dates.UTCDate('due_date'), output_field=models.DateField(), verbose_name='День срока'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['author', 'due_day'], name='tasks_task_author__5eb8f7_idx'),
+        ),
+    ]
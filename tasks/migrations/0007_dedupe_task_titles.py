@@ -0,0 +1,46 @@
+from django.db import migrations
+from django.db.models import Count
+
+
+def dedupe_titles(apps, schema_editor):
+    """перед ограничением уникальности: повторные названия у автора получают суффикс « (2)», « (3)»…
+
+    Переименованные задачи (id, было -> стало) выводятся в stdout migrate —
+    это изменение пользовательских данных, его должно быть видно.
+    """
+    Task = apps.get_model('tasks', 'Task')
+    renamed = []
+    max_length = Task._meta.get_field('title').max_length
+    duplicates = (
+        Task.objects.values('author_id', 'title').annotate(n=Count('id')).filter(n__gt=1).order_by()
+    )
+    for group in duplicates.iterator():
+        author_id, title = group['author_id'], group['title']
+        taken = set(Task.objects.filter(author_id=author_id).values_list('title', flat=True))
+        ids = Task.objects.filter(author_id=author_id, title=title).order_by('id').values_list('id', flat=True)
+        number = 1
+        for pk in list(ids)[1:]:  # самая ранняя задача сохраняет название
+            while True:
+                number += 1
+                suffix = f' ({number})'
+                candidate = title[:max_length - len(suffix)] + suffix
+                if candidate not in taken:
+                    break
+            taken.add(candidate)
+            Task.objects.filter(pk=pk).update(title=candidate)
+            renamed.append((pk, title, candidate))
+    if renamed:
+        print(f'\n  Повторяющиеся названия задач у одного автора переименованы: {len(renamed)}')
+        for pk, title, candidate in renamed:
+            print(f'    задача {pk}: {title!r} -> {candidate!r}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0006_task_due_day'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_titles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0007_dedupe_task_titles'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='task',
+            constraint=models.UniqueConstraint(fields=('author', 'title'), name='tasks_task_author_title_uniq', violation_error_message='у вас уже есть задача с таким названием'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """индекс (tag_id, task_id) по связям задач с тегами: фильтры tags_any/tags_all и счётчики тегов
+    читают связи по тегу, не заходя в таблицу (у автоматической through-модели Meta.indexes нет)"""
+
+    dependencies = [
+        ('tasks', '0008_task_unique_title'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX tasks_task_tags_tag_task_idx ON tasks_task_tags (tag_id, task_id)',
+            'DROP INDEX tasks_task_tags_tag_task_idx',
+        ),
+    ]
@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """индекс (id, history_id) по истории задач: предыдущая запись задачи (history_with_previous)
+    и «есть ли более поздняя запись» при прореживании — одна проба по индексу, без сортировки
+    всей истории задачи (у модели истории simple_history своих Meta.indexes нет)"""
+
+    dependencies = [
+        ('tasks', '0009_task_tags_tag_task_index'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX tasks_historicaltask_id_history_idx ON tasks_historicaltask (id, history_id)',
+            'DROP INDEX tasks_historicaltask_id_history_idx',
+        ),
+    ]
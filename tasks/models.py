@@ -1,8 +1,112 @@
-from django.db import models
+from contextlib import contextmanager
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, models, transaction
 from django.conf import settings
+from django.utils import timezone
 from simple_history.models import HistoricalRecords
 import os
 
+from .dates import UTCDate
+
+
+class DirtyFieldsMixin:
+    """Отслеживание изменённых полей модели.
+
+    При загрузке из БД запоминается снимок значений. save() существующего
+    объекта пишет только изменённые колонки (update_fields + auto_now поля),
+    а если ничего не изменилось — не делает UPDATE вовсе: нет сигналов,
+    записи в истории и сдвига updated_at. Значения сравниваются после
+    field.to_python, поэтому '3' и 3 или строка даты и datetime — одно и то же.
+    """
+
+    # поля, изменение которых само по себе не считается изменением объекта
+    dirty_ignored_fields = ('updated_at',)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.snapshot_fields()
+        return instance
+
+    def _tracked_fields(self):
+        return [
+            field for field in self._meta.concrete_fields
+            if not field.primary_key and not field.generated and field.attname not in self.dirty_ignored_fields
+        ]
+
+    @staticmethod
+    def _normalize(field, value):
+        try:
+            value = field.to_python(value)
+        except ValidationError:
+            return value  # пусть ошибку покажет сам save()
+        if isinstance(field, models.DateTimeField) and value is not None and settings.USE_TZ:
+            if timezone.is_naive(value):
+                value = timezone.make_aware(value)
+        return value
+
+    def snapshot_fields(self, attnames=None):
+        """запоминает текущие значения загруженных полей (или только attnames)"""
+        snapshot = getattr(self, '_field_snapshot', None)
+        if snapshot is None or attnames is None:
+            snapshot = self._field_snapshot = {}
+        for field in self._tracked_fields():
+            if field.attname in self.__dict__ and (attnames is None or field.attname in attnames):
+                snapshot[field.attname] = self._normalize(field, self.__dict__[field.attname])
+
+    def get_dirty_fields(self):
+        """{attname: (было, стало)} для полей, изменённых с момента загрузки"""
+        snapshot = getattr(self, '_field_snapshot', {})
+        dirty = {}
+        for field in self._tracked_fields():
+            if field.attname not in self.__dict__:
+                continue  # отложенное поле, не загружалось и не менялось
+            new = self._normalize(field, self.__dict__[field.attname])
+            old = snapshot.get(field.attname, models.NOT_PROVIDED)
+            if old != new:
+                dirty[field.attname] = (None if old is models.NOT_PROVIDED else old, new)
+        return dirty
+
+    def is_dirty(self):
+        return bool(self.get_dirty_fields())
+
+    def save(self, *args, **kwargs):
+        tracked = (
+            not self._state.adding
+            and hasattr(self, '_field_snapshot')
+            and not args
+            and kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+        )
+        if tracked:
+            dirty = self.get_dirty_fields()
+            if not dirty:
+                return
+            auto_now = [
+                field.attname for field in self._meta.concrete_fields
+                if getattr(field, 'auto_now', False)
+            ]
+            kwargs['update_fields'] = [*dirty, *auto_now]
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if not adding:
+            # UPDATE не возвращает вычисляемые столбцы — старое значение не оставляем,
+            # поле перечитается из БД при обращении
+            for field in self._meta.concrete_fields:
+                if field.generated:
+                    self.__dict__.pop(field.attname, None)
+        self.snapshot_fields(self._attnames(kwargs.get('update_fields')))
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self.snapshot_fields(self._attnames(fields))
+
+    def _attnames(self, names):
+        if names is None:
+            return None
+        return {self._meta.get_field(name).attname for name in names}
+
 class Project(models.Model):
     """проект (категория) для группировки задач."""
     title = models.CharField('Название', max_length=255)
@@ -38,7 +142,34 @@ class Tag(models.Model):
     def __str__(self):
         return self.name
 
-class Task(models.Model):
+
+TITLE_CONSTRAINT = 'tasks_task_author_title_uniq'
+TITLE_TAKEN = 'у вас уже есть задача с таким названием'
+
+
+def is_title_conflict(error):
+    """IntegrityError из-за уникальности (author, title)? Текст ошибки у каждой СУБД свой"""
+    message = str(error)
+    return TITLE_CONSTRAINT in message or 'tasks_task.author_id, tasks_task.title' in message
+
+
+@contextmanager
+def unique_title():
+    """Запись задачи без предварительного SELECT: повтор названия ловит ограничение БД.
+
+    Блок выполняется в точке сохранения (внешняя транзакция не ломается),
+    нарушение уникальности превращается в ValidationError по полю title.
+    """
+    try:
+        with transaction.atomic():
+            yield
+    except IntegrityError as error:
+        if not is_title_conflict(error):
+            raise
+        raise ValidationError({'title': TITLE_TAKEN}, code='unique')
+
+
+class Task(DirtyFieldsMixin, models.Model):
     """дефолтная сущность - задача."""
     STATUS_CHOICES = [
         ('todo', 'К выполнению'),
@@ -57,6 +188,11 @@ class Task(models.Model):
     )
     priority = models.IntegerField('Приоритет', default=3)  # 1-5, где 1 - высший
     due_date = models.DateTimeField('Срок выполнения', null=True, blank=True)
+    # день срока в UTC — для запросов «на день» и «за месяц» по индексу (см. tasks/dates.py)
+    due_day = models.GeneratedField(
+        expression=UTCDate('due_date'), output_field=models.DateField(), db_persist=True,
+        verbose_name='День срока',
+    )
     completed_at = models.DateTimeField('Дата завершения', null=True, blank=True)
     
     # связи
@@ -91,7 +227,7 @@ class Task(models.Model):
     created_at = models.DateTimeField('Дата создания', auto_now_add=True)
     updated_at = models.DateTimeField('Дата изменения', auto_now=True)
 
-    history = HistoricalRecords()
+    history = HistoricalRecords(excluded_fields=['due_day'])  # вычисляется из due_date
 
     class Meta:
         db_table = 'tasks_task'
@@ -101,6 +237,13 @@ class Task(models.Model):
         indexes = [
             models.Index(fields=['status', 'due_date']),
             models.Index(fields=['author', 'created_at']),
+            models.Index(fields=['author', 'due_day']),
+        ]
+        constraints = [
+            # индекс (author, title) заодно обслуживает поиск задачи автора по названию
+            models.UniqueConstraint(
+                fields=['author', 'title'], name=TITLE_CONSTRAINT, violation_error_message=TITLE_TAKEN,
+            ),
         ]
 
 
@@ -206,21 +349,42 @@ class Attachment(models.Model):
         
         super().save(*args, **kwargs)
     
+    FILE_ICONS = {
+        'image': '🖼️',
+        'document': '📄',
+        'archive': '🗜️',
+        'other': '📎',
+    }
+
     def get_file_icon(self):
         """возвращает иконку в зависимости от типа файла"""
-        icons = {
-            'image': '🖼️',
-            'document': '📄',
-            'archive': '🗜️',
-            'other': '📎',
-        }
-        return icons.get(self.file_type, '📎')
+        return self.FILE_ICONS.get(self.file_type, '📎')
     
     def get_readable_size(self):
         """возвращает размер файла в читаемом формате"""
-        if self.file_size < 1024:
-            return f"{self.file_size} Б"
-        elif self.file_size < 1024 * 1024:
-            return f"{self.file_size / 1024:.1f} КБ"
-        else:
-            return f"{self.file_size / (1024 * 1024):.1f} МБ"
\ No newline at end of file
+        return readable_size(self.file_size)
+
+
+def readable_size(size):
+    """размер файла в читаемом формате (без экземпляра модели — для быстрых сериализаторов)"""
+    if size < 1024:
+        return f"{size} Б"
+    elif size < 1024 * 1024:
+        return f"{size / 1024:.1f} КБ"
+    else:
+        return f"{size / (1024 * 1024):.1f} МБ"
+
+
+class TaskDailyCount(models.Model):
+    """предрасчитанное кол-во задач по дням создания (date_hierarchy в админке)"""
+    day = models.DateField('День', unique=True)
+    tasks_count = models.PositiveIntegerField('Кол-во задач', default=0)
+
+    class Meta:
+        db_table = 'tasks_task_daily_count'
+        verbose_name = 'Задачи за день'
+        verbose_name_plural = 'Задачи по дням'
+        ordering = ['day']
+
+    def __str__(self):
+        return f'{self.day}: {self.tasks_count}'
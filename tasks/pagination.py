@@ -1,5 +1,13 @@
-from rest_framework.pagination import PageNumberPagination
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .history import history_after
+
 
 class TaskPagination(PageNumberPagination):
     page_size = 10
@@ -14,4 +22,57 @@ class TaskPagination(PageNumberPagination):
             'next': self.get_next_link(),
             'previous': self.get_previous_link(),
             'results': data
-        })
\ No newline at end of file
+        })
+
+
+class HistoryCursorPagination(BasePagination):
+    """Keyset-пагинация истории по (history_date, history_id).
+
+    Курсор — последняя отданная пара, следующая страница строится условием
+    (history_date, history_id) > курсор, поэтому не зависит от OFFSET
+    и не «съезжает» при появлении новых записей.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = history_after(queryset, *self.decode_cursor(cursor))
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def decode_cursor(self, cursor):
+        try:
+            history_date, history_id = urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+            return datetime.fromisoformat(history_date), int(history_id)
+        except (ValueError, UnicodeDecodeError):
+            raise NotFound('неверный курсор')
+
+    def encode_cursor(self, row):
+        return urlsafe_b64encode(f"{row['history_date'].isoformat()}|{row['history_id']}".encode()).decode()
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data
+        })
@@ -0,0 +1,359 @@
+from copy import copy
+from datetime import datetime, time
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from import_export import resources, fields
+from import_export.instance_loaders import CachedInstanceLoader
+from import_export.widgets import ForeignKeyWidget, Widget
+from simple_history.utils import bulk_create_with_history, bulk_update_with_history
+
+from .invalidation import invalidate_tasks
+from .models import TITLE_TAKEN, Project, Task
+
+User = get_user_model()
+
+# поля модели, которые заполняются при импорте (для bulk_update и skip_unchanged)
+IMPORT_ATTRIBUTES = ('title', 'description', 'status', 'priority', 'due_date', 'project_id', 'author_id')
+
+
+class TaskImportLookups:
+    """Справочники для импорта: логины и названия проектов -> id.
+
+    Загружаются одним запросом на таблицу, дальше строки резолвятся
+    по словарям без обращений к БД.
+    """
+
+    def __init__(self):
+        self.default_user_id = None
+        self.user_ids = dict(User.objects.values_list('username', 'id'))
+        self.project_ids = {}  # (owner_id, title) -> id
+        self.project_ids_by_title = {}  # title -> [id, ...]
+        for pk, title, owner_id in Project.objects.values_list('id', 'title', 'owner_id'):
+            self.project_ids.setdefault((owner_id, title), pk)
+            self.project_ids_by_title.setdefault(title, []).append(pk)
+
+        self.task_ids = {}  # (author_id, title) -> id, для названий текущей пачки
+
+    def user_id(self, username):
+        return self.user_ids.get(username)
+
+    def load_task_titles(self, pairs, batch_size=1000):
+        """id существующих задач для пар (author_id, title): запрос на пачку, по индексу (author, title)"""
+        self.task_ids = {}
+        pairs = list(pairs)
+        for start in range(0, len(pairs), batch_size):
+            batch = pairs[start:start + batch_size]
+            rows = Task.objects.filter(
+                author_id__in={author_id for author_id, _ in batch}, title__in={title for _, title in batch},
+            ).values_list('author_id', 'title', 'id')
+            for author_id, title, pk in rows:
+                self.task_ids[(author_id, title)] = pk
+
+    def project_id(self, title, owner_id=None):
+        """проект ищем сначала среди проектов автора, потом по уникальному названию"""
+        if owner_id is not None and (owner_id, title) in self.project_ids:
+            return self.project_ids[(owner_id, title)]
+        candidates = self.project_ids_by_title.get(title, [])
+        if len(candidates) == 1:
+            return candidates[0]
+        return None
+
+
+class LookupForeignKeyWidget(ForeignKeyWidget):
+    """ForeignKeyWidget, который резолвит значение через TaskImportLookups, а не SELECT на строку"""
+
+    def __init__(self, model, field, resolve, **kwargs):
+        super().__init__(model, field, **kwargs)
+        self.resolve = resolve
+        self.lookups = None
+        self._stubs = {}
+
+    def clean(self, value, row=None, **kwargs):
+        if self.lookups is None:
+            return super().clean(value, row=row, **kwargs)
+        value = Widget.clean(self, value)
+        if not value:
+            return None
+        pk = self.resolve(self.lookups, str(value).strip(), row)
+        if pk is None:
+            raise ValueError(f'{self.model._meta.verbose_name} «{value}» не найден')
+        # заглушка с pk: для сохранения нужен только project_id / author_id
+        if pk not in self._stubs:
+            self._stubs[pk] = self.model(pk=pk)
+        return self._stubs[pk]
+
+
+class ChoiceLabelWidget(Widget):
+    """принимает как код статуса, так и его читаемое название (как в экспорте)"""
+
+    def __init__(self, choices, **kwargs):
+        super().__init__(**kwargs)
+        self.labels = dict(choices)
+        self.codes = {label: code for code, label in choices}
+
+    def clean(self, value, row=None, **kwargs):
+        if value in (None, ''):
+            return None
+        value = str(value).strip()
+        if value in self.labels:
+            return value
+        if value in self.codes:
+            return self.codes[value]
+        raise ValueError(f'неизвестный статус «{value}»')
+
+    def render(self, value, obj=None, **kwargs):
+        return self.labels.get(value, value)
+
+
+class DayWidget(Widget):
+    """дата выполнения в формате экспорта (ДД-ММ-ГГГГ), 'Нет срока' или ISO"""
+
+    EMPTY = 'Нет срока'
+    FORMATS = ('%d-%m-%Y', '%Y-%m-%d', '%d.%m.%Y')
+
+    def clean(self, value, row=None, **kwargs):
+        if value in (None, '', self.EMPTY):
+            return None
+        if isinstance(value, datetime):
+            return value.date()
+        value = str(value).strip()
+        for fmt in self.FORMATS:
+            try:
+                return datetime.strptime(value, fmt).date()
+            except ValueError:
+                continue
+        raise ValueError(f'неверный формат даты «{value}»')
+
+
+def _resolve_author(lookups, username, row):
+    return lookups.user_id(username)
+
+
+def _resolve_project(lookups, title, row):
+    owner_id = lookups.user_id((row or {}).get('Автор') or '')
+    if owner_id is None:
+        owner_id = lookups.default_user_id
+    return lookups.project_id(title, owner_id)
+
+
+class TaskResource(resources.ModelResource):
+    """Ресурс для экспорта и массового импорта задач"""
+
+    # Кастомные поля
+    project_title = fields.Field(
+        column_name='Проект',
+        attribute='project',
+        widget=LookupForeignKeyWidget(Project, 'title', resolve=_resolve_project)
+    )
+
+    author_name = fields.Field(
+        column_name='Автор',
+        attribute='author',
+        widget=LookupForeignKeyWidget(User, 'username', resolve=_resolve_author)
+    )
+
+    # 1. Кастомный метод для статуса
+    status_display = fields.Field(
+        column_name='Статус',
+        attribute='status',
+        widget=ChoiceLabelWidget(Task.STATUS_CHOICES)
+    )
+
+    # 2. Кастомный метод для даты выполнения
+    due_date_formatted = fields.Field(
+        column_name='Дата выполнения',
+        attribute='due_date',
+        widget=DayWidget(),
+        saves_null_values=True
+    )
+
+    # 3. Кастомный метод для приоритета
+    priority_category = fields.Field(
+        column_name='Категория приоритета'
+    )
+
+    # метки времени только экспортируются
+    created_at = fields.Field(attribute='created_at', column_name='created_at', readonly=True)
+    updated_at = fields.Field(attribute='updated_at', column_name='updated_at', readonly=True)
+
+    class Meta:
+        model = Task
+        fields = (
+            'id', 'title', 'description', 'status_display',
+            'priority', 'priority_category', 'due_date_formatted',
+            'project_title', 'author_name', 'created_at', 'updated_at'
+        )
+        export_order = fields
+        skip_unchanged = True
+        report_skipped = False
+
+        # импорт: существующие задачи грузятся одним запросом на пачку,
+        # запись идёт через bulk_create/bulk_update
+        instance_loader_class = CachedInstanceLoader
+        use_bulk = True
+        batch_size = 1000
+        skip_diff = True
+
+    def __init__(self, lookups=None, batch_size=None, **kwargs):
+        super().__init__(**kwargs)
+        self.lookups = lookups
+        self.import_user = None
+        self.claimed_titles = {}  # (author_id, title) -> id строк текущей пачки
+        if batch_size is not None:
+            # _meta общий для класса — меняем копию
+            self._meta = copy(self._meta)
+            self._meta.batch_size = batch_size
+
+    # 1 для фильтрации queryset (только задачи с высоким приоритетом)
+    def get_export_queryset(self, request):
+        """Экспортировать только задачи с высоким приоритетом (1-2)"""
+        queryset = super().get_export_queryset(request)
+        return queryset.filter(priority__lte=2)
+
+    # 2. для преобразования даты
+    def dehydrate_due_date_formatted(self, task):
+        """Преобразовать поле due_date в формат DD-MM-YYYY"""
+        if task.due_date:
+            return task.due_date.strftime('%d-%m-%Y')
+        return 'Нет срока'
+
+    # 3. для преобразования статуса
+    def dehydrate_status_display(self, task):
+        """Преобразовать поле status в читаемый формат"""
+        status_map = {
+            'todo': 'К выполнению',
+            'in_progress': 'В процессе',
+            'done': 'Выполнено',
+            'backlog': 'Отложено'
+        }
+        return status_map.get(task.status, task.status)
+
+    # доп.кастомный метод
+    def dehydrate_priority_category(self, task):
+        """Категория приоритета"""
+        if task.priority == 1:
+            return 'Критический'
+        elif task.priority == 2:
+            return 'Высокий'
+        elif task.priority == 3:
+            return 'Средний'
+        elif task.priority == 4:
+            return 'Низкий'
+        else:
+            return 'Минимальный'
+
+    # форматирование дат создания/обновления
+    def dehydrate_created_at(self, task):
+        if task.created_at:
+            return task.created_at.strftime('%d-%m-%Y %H:%M')
+        return ''
+
+    def dehydrate_updated_at(self, task):
+        if task.updated_at:
+            return task.updated_at.strftime('%d-%m-%Y %H:%M')
+        return ''
+
+    # === ИМПОРТ ===
+
+    def before_import(self, dataset, **kwargs):
+        """справочники грузим один раз на весь импорт (команда переиспользует их между чанками)"""
+        user = kwargs.get('user')
+        self.import_user = user if user is not None and user.is_authenticated else None
+        if self.lookups is None:
+            self.lookups = TaskImportLookups()
+        self.lookups.default_user_id = self.import_user.pk if self.import_user else None
+        for name in ('project_title', 'author_name'):
+            self.fields[name].widget.lookups = self.lookups
+        # уникальность (author, title): существующие названия — одним запросом на пачку строк,
+        # а не SELECT на строку; повторы внутри файла ловит validate_instance
+        if 'title' in dataset.headers:
+            authors = dataset['Автор'] if 'Автор' in dataset.headers else [''] * len(dataset)
+            pairs = {
+                (self.lookups.user_id(str(author or '').strip()) or self.lookups.default_user_id, str(title))
+                for author, title in zip(authors, dataset['title']) if title not in (None, '')
+            }
+            self.lookups.load_task_titles(pairs, self._meta.batch_size or 1000)
+        self.claimed_titles = {}
+
+    def import_field(self, field, instance, row, is_m2m=False, **kwargs):
+        if field.attribute == 'due_date' and field.column_name in row:
+            # в файле только день: время существующего срока сохраняем
+            day = field.clean(row, **kwargs)
+            if day is None:
+                instance.due_date = None
+            elif not instance.due_date or timezone.localtime(instance.due_date).date() != day:
+                instance.due_date = timezone.make_aware(datetime.combine(day, time.max.replace(microsecond=0)))
+            return
+        super().import_field(field, instance, row, is_m2m, **kwargs)
+
+    def import_instance(self, instance, row, **kwargs):
+        super().import_instance(instance, row, **kwargs)
+        if instance.author_id is None and self.import_user is not None:
+            instance.author_id = self.import_user.pk
+
+    def skip_row(self, instance, original, row, import_validation_errors=None):
+        if not self._meta.skip_unchanged or import_validation_errors:
+            return False
+        if instance._state.adding:
+            return False
+        # снимок значений делает сама модель при загрузке (DirtyFieldsMixin)
+        return not instance.is_dirty()
+
+    def validate_instance(self, instance, import_validation_errors=None, validate_unique=True):
+        """проверка полей без SELECT-ов: FK уже проверены справочниками"""
+        errors = dict(import_validation_errors or {})
+        try:
+            instance.clean_fields(exclude=set(errors) | {'project', 'author', 'editor'})
+        except ValidationError as e:
+            errors = e.update_error_dict(errors)
+        if instance.project_id is None:
+            errors.setdefault('project', ValidationError('не указан проект'))
+        if instance.author_id is None:
+            errors.setdefault('author', ValidationError('не указан автор'))
+        elif 'title' not in errors:
+            key = (instance.author_id, instance.title)
+            owner = self.lookups.task_ids.get(key) if self.lookups is not None else None
+            if (owner is not None and owner != instance.pk) or key in self.claimed_titles:
+                errors['title'] = ValidationError(TITLE_TAKEN)
+            else:
+                self.claimed_titles[key] = instance.pk
+        if errors:
+            raise ValidationError(errors)
+
+    def get_bulk_update_fields(self):
+        return [attr.removesuffix('_id') for attr in IMPORT_ATTRIBUTES] + ['updated_at']
+
+    def bulk_create(self, using_transactions, dry_run, raise_errors, batch_size=None, result=None):
+        if self.create_instances and (using_transactions or not dry_run):
+            try:
+                bulk_create_with_history(
+                    self.create_instances, Task,
+                    batch_size=batch_size,
+                    default_user=self.import_user,
+                )
+                # bulk_create не отправляет post_save — версии кешей увеличиваем сами
+                invalidate_tasks(self.create_instances)
+            except Exception as e:
+                self.handle_import_error(result, e, raise_errors)
+            finally:
+                self.create_instances.clear()
+
+    def bulk_update(self, using_transactions, dry_run, raise_errors, batch_size=None, result=None):
+        if self.update_instances and (using_transactions or not dry_run):
+            try:
+                now = timezone.now()
+                for instance in self.update_instances:
+                    instance.updated_at = now  # auto_now не срабатывает в bulk_update
+                bulk_update_with_history(
+                    self.update_instances, Task,
+                    self.get_bulk_update_fields(),
+                    batch_size=batch_size,
+                    default_user=self.import_user,
+                )
+                invalidate_tasks(self.update_instances)
+            except Exception as e:
+                self.handle_import_error(result, e, raise_errors)
+            finally:
+                self.update_instances.clear()
@@ -0,0 +1,216 @@
+"""Генерация синтетических данных для нагрузочных тестов (команда seed_taskflow).
+
+Пользователи, проекты и теги создаются в основном процессе, задачи —
+чанками по chunk_size в процессах-воркерах. Каждый чанк строит задачи,
+связи с тегами, комментарии, вложения и записи истории одним bulk_create
+на таблицу в своей транзакции.
+
+Данные детерминированы: генератор чанка инициализируется (seed, номер
+чанка), а id задач задаются явно, поэтому одинаковые seed, chunk_size
+и дата отсчёта дают одни и те же строки при любом числе воркеров.
+Сигналы моделей при bulk_create не срабатывают — кеши и события не
+трогаются, дневные агрегаты команда пересчитывает в конце.
+"""
+import io
+import random
+import struct
+import zipfile
+import zlib
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+
+from .history import HistoricalTask
+from .models import Attachment, Comment, Task
+
+STATUS_WEIGHTS = {'todo': 30, 'in_progress': 20, 'done': 40, 'backlog': 10}
+PRIORITY_WEIGHTS = {1: 5, 2: 15, 3: 45, 4: 25, 5: 10}
+DUE_DATE_SHARE = 0.7      # у остальных задач срока нет
+HISTORY_SPAN_DAYS = 730   # задачи создаются равномерно за последние два года
+
+WORDS = (
+    'отчёт', 'релиз', 'миграция', 'дизайн', 'ревью', 'баг', 'документация', 'интеграция',
+    'платёж', 'клиент', 'сервер', 'поиск', 'уведомления', 'профиль', 'экспорт', 'импорт',
+    'аналитика', 'тесты', 'деплой', 'мобильное', 'приложение', 'оптимизация', 'безопасность',
+    'макет', 'встреча', 'договор', 'бюджет', 'план', 'роадмап', 'API', 'кеш', 'база',
+)
+VERBS = ('Подготовить', 'Исправить', 'Проверить', 'Обновить', 'Согласовать', 'Написать', 'Настроить', 'Обсудить')
+TAG_NAMES = (
+    'срочно', 'бэкенд', 'фронтенд', 'дизайн', 'баг', 'идея', 'клиент', 'документация',
+    'инфраструктура', 'тесты', 'релиз', 'аналитика', 'мобильное', 'безопасность', 'рефакторинг',
+)
+COLORS = ('#3498db', '#e74c3c', '#2ecc71', '#9b59b6', '#f1c40f', '#1abc9c', '#e67e22', '#34495e')
+
+
+def user_weights(count):
+    """доли задач по пользователям: немногие активные, длинный хвост (закон Ципфа)"""
+    return list(accumulate(1 / (rank + 1) ** 0.9 for rank in range(count)))
+
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def _png(width, height, color):
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    row = b'\x00' + bytes(color) * width
+    return (
+        b'\x89PNG\r\n\x1a\n'
+        + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+        + chunk(b'IDAT', zlib.compress(row * height))
+        + chunk(b'IEND', b'')
+    )
+
+
+def generate_files(storage, count, seed):
+    """count небольших файлов (txt, csv, png, zip) в storage; [(имя в storage, тип, размер)]"""
+    rng = random.Random(f'{seed}:files')
+    files = []
+    for number in range(count):
+        kind = ('txt', 'csv', 'png', 'zip')[number % 4]
+        if kind == 'txt':
+            content = '\n'.join(sentence(rng, 8) for _ in range(rng.randint(5, 40))).encode()
+        elif kind == 'csv':
+            content = '\n'.join(f'{i};{rng.randint(1, 1000)};{rng.choice(WORDS)}' for i in range(50)).encode()
+        elif kind == 'png':
+            content = _png(rng.randint(8, 64), rng.randint(8, 64), [rng.randrange(256) for _ in range(3)])
+        else:
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+                archive.writestr('readme.txt', sentence(rng, 30))
+            content = buffer.getvalue()
+        name = f'attachments/seed/{seed}/file{number}.{kind}'
+        if not storage.exists(name):
+            name = storage.save(name, ContentFile(content))
+        file_type = {'txt': 'document', 'csv': 'document', 'png': 'image', 'zip': 'archive'}[kind]
+        files.append((name, file_type, len(content)))
+    return files
+
+
+@contextmanager
+def explicit_timestamps():
+    """auto_now/auto_now_add не перезаписывают сгенерированные даты (только в этом процессе)"""
+    fields = [
+        field for model in (Task, Comment, Attachment) for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def build_chunk(plan, chunk_index, first_id, count):
+    """строки одного чанка: (задачи, связи с тегами, комментарии, вложения, история)"""
+    rng = random.Random(f"{plan['seed']}:{chunk_index}")
+    users, cum_weights = plan['users'], plan['user_weights']
+    projects, tags, files, now = plan['projects'], plan['tags'], plan['files'], plan['now']
+    statuses, status_weights = zip(*STATUS_WEIGHTS.items())
+    priorities, priority_weights = zip(*PRIORITY_WEIGHTS.items())
+    TaskTag = Task.tags.through
+
+    tasks, links, comments, attachments, history = [], [], [], [], []
+    for task_id in range(first_id, first_id + count):
+        author = rng.choices(users, cum_weights=cum_weights)[0]
+        created = now - timedelta(seconds=rng.randrange(HISTORY_SPAN_DAYS * 86400))
+        status = rng.choices(statuses, status_weights)[0]
+        due_date = None
+        if rng.random() < DUE_DATE_SHARE:
+            # сроки от недели до трёх месяцев после создания; незакрытые старые — просрочены
+            due_date = created + timedelta(days=rng.randint(7, 90), hours=rng.randint(0, 23))
+        completed = None
+        if status == 'done':
+            completed = min(now, created + timedelta(hours=rng.randint(1, 24 * 60)))
+        updated = completed or min(now, created + timedelta(hours=rng.randint(0, 24 * 30)))
+        task = Task(
+            id=task_id,
+            # номер в прогоне делает название уникальным у автора (ограничение author, title)
+            title=f"{rng.choice(VERBS)} {sentence(rng, rng.randint(1, 3))} #{task_id - plan['first_id'] + 1}",
+            description=sentence(rng, rng.randint(0, 40)),
+            status=status,
+            priority=rng.choices(priorities, priority_weights)[0],
+            due_date=due_date,
+            completed_at=completed,
+            project_id=rng.choice(projects[author]),
+            author_id=author,
+            created_at=created,
+            updated_at=updated,
+        )
+        tasks.append(task)
+
+        for tag_id in rng.sample(tags, min(len(tags), rng.choices((0, 1, 2, 3), (30, 40, 20, 10))[0])):
+            links.append(TaskTag(task_id=task_id, tag_id=tag_id))
+
+        for _ in range(min(20, int(rng.expovariate(1 / plan['comments'])) if plan['comments'] else 0)):
+            moment = created + (updated - created) * rng.random()
+            comments.append(Comment(
+                task_id=task_id,
+                author_id=author if rng.random() < 0.7 else rng.choice(users),
+                content=sentence(rng, rng.randint(3, 30)),
+                created_at=moment, updated_at=moment,
+            ))
+
+        if files and rng.random() < plan['attachments']:
+            for _ in range(rng.randint(1, 3)):
+                name, file_type, size = rng.choice(files)
+                attachments.append(Attachment(
+                    task_id=task_id, file=name, file_type=file_type, file_size=size,
+                    original_name=name.rsplit('/', 1)[-1], uploaded_by_id=author,
+                    uploaded_at=created, updated_at=created,
+                ))
+
+        if plan['history']:
+            history.append(history_row(task, '+', created, status='todo', completed_at=None))
+            if status != 'todo':
+                history.append(history_row(task, '~', updated))
+    return tasks, links, comments, attachments, history
+
+
+def history_row(task, history_type, moment, **overrides):
+    values = {
+        field.attname: getattr(task, field.attname) for field in Task._meta.concrete_fields if not field.generated
+    }
+    values.update(overrides, updated_at=moment)
+    return HistoricalTask(
+        **values, history_date=moment, history_type=history_type, history_user_id=task.author_id,
+    )
+
+
+def seed_chunk(plan, chunk_index, first_id, count):
+    """пишет чанк в БД; возвращает число строк по таблицам"""
+    tasks, links, comments, attachments, history = build_chunk(plan, chunk_index, first_id, count)
+    batch_size = plan['batch_size']
+    with explicit_timestamps(), transaction.atomic():
+        Task.objects.bulk_create(tasks, batch_size=batch_size)
+        Task.tags.through.objects.bulk_create(links, batch_size=batch_size)
+        Comment.objects.bulk_create(comments, batch_size=batch_size)
+        Attachment.objects.bulk_create(attachments, batch_size=batch_size)
+        HistoricalTask.objects.bulk_create(history, batch_size=batch_size)
+    return {
+        'tasks': len(tasks), 'tags': len(links), 'comments': len(comments),
+        'attachments': len(attachments), 'history': len(history),
+    }
+
+
+# воркеры: план передаётся один раз при старте процесса, а не с каждым чанком
+
+_plan = None
+
+
+def init_worker(plan):
+    global _plan
+    import django
+    django.setup()  # для spawn; при fork — без эффекта
+    _plan = plan
+
+
+def run_chunk(job):
+    return seed_chunk(_plan, *job)
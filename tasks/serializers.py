@@ -1,13 +1,26 @@
 from rest_framework import serializers
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import QuerySet
 from django.utils import timezone
-from .models import Task, Project, Tag, Comment, Attachment
+from .models import Task, Project, Tag, Comment, Attachment, readable_size, unique_title
+from .history import row_changes
+from .sparse import SparseFieldsSerializerMixin
+from monitoring.metrics import TimedSerializerMixin, measure
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
-class ProjectSerializer(serializers.ModelSerializer):
+class ProjectSerializer(TimedSerializerMixin, SparseFieldsSerializerMixin, serializers.ModelSerializer):
     # явно объявляем поле owner, чтобы видеть имя пользователя, а не id
     owner_username = serializers.ReadOnlyField(source='owner.username')
+
+    # ?expand=owner
+    expandable_fields = {
+        'owner': (
+            lambda: serializers.PrimaryKeyRelatedField(read_only=True),
+            lambda: UserSerializer(read_only=True),
+        ),
+    }
     
     class Meta:
         model = Project
@@ -26,12 +39,28 @@ class TagSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'color']
 
 
-class AttachmentSerializer(serializers.ModelSerializer):
+class TagUsageSerializer(TagSerializer):
+    """тег и число задач пользователя с ним (tasks_count аннотирует TagViewSet)"""
+    tasks_count = serializers.IntegerField(read_only=True)
+
+    class Meta(TagSerializer.Meta):
+        fields = TagSerializer.Meta.fields + ['tasks_count']
+
+
+class AttachmentSerializer(TimedSerializerMixin, SparseFieldsSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для вложений"""
     uploaded_by_username = serializers.ReadOnlyField(source='uploaded_by.username')
     file_url = serializers.FileField(source='file', read_only=True)
     file_icon = serializers.ReadOnlyField(source='get_file_icon')
     readable_size = serializers.ReadOnlyField(source='get_readable_size')
+
+    # ?expand=uploaded_by
+    expandable_fields = {
+        'uploaded_by': (
+            lambda: serializers.PrimaryKeyRelatedField(read_only=True),
+            lambda: UserSerializer(read_only=True),
+        ),
+    }
     
     class Meta:
         model = Attachment
@@ -67,7 +96,7 @@ class AttachmentSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class TaskSerializer(serializers.ModelSerializer):
+class TaskSerializer(TimedSerializerMixin, SparseFieldsSerializerMixin, serializers.ModelSerializer):
     # поля только для чтения
     project = ProjectSerializer(read_only=True)
     author_username = serializers.ReadOnlyField(source='author.username')
@@ -76,6 +105,22 @@ class TaskSerializer(serializers.ModelSerializer):
     
     attachments = AttachmentSerializer(many=True, read_only=True)
     
+    # ?expand=project,tags,attachments; без expand — только id
+    expandable_fields = {
+        'project': (
+            lambda: serializers.PrimaryKeyRelatedField(read_only=True),
+            lambda: ProjectSerializer(read_only=True),
+        ),
+        'tags': (
+            lambda: serializers.PrimaryKeyRelatedField(many=True, read_only=True),
+            lambda: TagSerializer(many=True, read_only=True),
+        ),
+        'attachments': (
+            lambda: serializers.PrimaryKeyRelatedField(many=True, read_only=True),
+            lambda: AttachmentSerializer(many=True, read_only=True),
+        ),
+    }
+
     # поля только для записи
     project_id = serializers.PrimaryKeyRelatedField(
         queryset=Project.objects.all(),
@@ -123,22 +168,15 @@ class TaskSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('срок выполнения не может быть в прошлом')
         return value
     
-    # ВАЛИДАЦИЯ 3: проверка уникальности названия для пользователя
-    def validate_title(self, value):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            # проверяем, нет ли уже задачи с таким названием у пользователя
-            existing_task = Task.objects.filter(
-                title=value,
-                author=request.user
-            ).exists()
-            
-            # если задача уже существует (и мы её редактируем, а не создаём)
-            if existing_task and (not self.instance or self.instance.title != value):
-                raise serializers.ValidationError('у вас уже есть задача с таким названием')
-        
-        return value
-    
+    # ВАЛИДАЦИЯ 3: уникальность названия для пользователя проверяет ограничение БД
+    # (author, title) при записи — без отдельного SELECT и без гонки между проверкой и INSERT
+    def save(self, **kwargs):
+        try:
+            with unique_title():
+                return super().save(**kwargs)
+        except DjangoValidationError as error:
+            raise serializers.ValidationError(error.message_dict)
+
     # автоматически устанавливаем автора при создании
     def create(self, validated_data):
         request = self.context.get('request')
@@ -173,3 +211,242 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = ['id', 'username', 'email', 'avatar', 'date_joined']
         read_only_fields = ['date_joined']
+
+
+class TaskHistorySerializer(TimedSerializerMixin, serializers.Serializer):
+    """запись истории задачи с диффом по полям (строки history.history_with_previous после attach_previous)"""
+    history_id = serializers.IntegerField()
+    task = serializers.IntegerField(source='id')
+    history_type = serializers.CharField()
+    history_date = serializers.DateTimeField()
+    user = serializers.IntegerField(source='history_user_id', allow_null=True)
+    changes = serializers.SerializerMethodField()
+
+    def get_changes(self, row):
+        changes = row_changes(row)
+        if 'due_date' in changes:
+            date_field = serializers.DateTimeField()
+            changes['due_date'] = [
+                date_field.to_representation(value) if value else None
+                for value in changes['due_date']
+            ]
+        return changes
+
+
+class TaskListFastSerializer:
+    """Быстрый read-only режим TaskSerializer для списков.
+
+    Даёт тот же JSON, что TaskSerializer(many=True), но строит его из строк
+    .values() и трёх словарей (проекты, теги, вложения), собранных по одному
+    запросу на каждый — без создания экземпляров моделей и полей DRF на строку.
+    Даты форматируются тем же DateTimeField.to_representation, ссылки на файлы —
+    через request.build_absolute_uri, как в FileField.
+
+    fields/expand — как у TaskSerializer (?fields=, ?expand=, см. tasks/sparse.py):
+    выбираются только нужные колонки, словари связей строятся только для
+    выбранных полей, а для свёрнутых связей содержат одни id.
+    """
+
+    TASK_COLUMNS = (
+        'id', 'title', 'description', 'status', 'priority', 'due_date', 'completed_at',
+        'project_id', 'author_id', 'author__username', 'editor_id', 'created_at', 'updated_at',
+    )
+    PROJECT_COLUMNS = ('id', 'title', 'color', 'owner_id', 'owner__username', 'created_at', 'updated_at')
+    ATTACHMENT_COLUMNS = (
+        'id', 'task_id', 'file', 'file_type', 'original_name', 'file_size', 'uploaded_by_id',
+        'uploaded_by__username', 'uploaded_at', 'updated_at', 'description',
+    )
+    # поле ответа -> колонки TASK_COLUMNS (в порядке полей TaskSerializer)
+    FIELD_COLUMNS = {
+        'id': ('id',),
+        'title': ('title',),
+        'description': ('description',),
+        'status': ('status',),
+        'status_display': ('status',),
+        'priority': ('priority',),
+        'due_date': ('due_date',),
+        'completed_at': ('completed_at',),
+        'project': ('project_id',),
+        'author_username': ('author__username',),
+        'tags': (),
+        'attachments': (),
+        'author': ('author_id',),
+        'editor': ('editor_id',),
+        'created_at': ('created_at',),
+        'updated_at': ('updated_at',),
+    }
+    EXPANDABLE = ('project', 'tags', 'attachments')
+
+    def __init__(self, rows, context=None, fields=None, expand=None):
+        self.rows = rows
+        self.context = context or {}
+        self.fields = self.selected_fields(fields)
+        # без параметров связи раскрыты, как в TaskSerializer
+        self.expand = self.EXPANDABLE if fields is None and expand is None else tuple(expand or ())
+
+    @classmethod
+    def selected_fields(cls, fields):
+        if fields is None:
+            return list(cls.FIELD_COLUMNS)
+        return [name for name in cls.FIELD_COLUMNS if name in fields]
+
+    @classmethod
+    def prepare(cls, queryset, fields=None, expand=None):
+        """queryset задач -> queryset строк .values() только с нужными колонками"""
+        columns = {'id'}
+        for name in cls.selected_fields(fields):
+            columns.update(cls.FIELD_COLUMNS[name])
+        return queryset.prefetch_related(None).values(
+            *(column for column in cls.TASK_COLUMNS if column in columns)
+        )
+
+    @property
+    def data(self):
+        rows = self.rows
+        if isinstance(rows, QuerySet):
+            rows = self.prepare(rows, self.fields, self.expand)
+        rows = list(rows)
+        related = {name: list(queryset) for name, queryset in self.related_querysets(rows).items()}
+        with measure('serializer'):
+            return self.build(rows, related)
+
+    async def adata(self):
+        """то же, что data, но запросы выполняются через async ORM"""
+        rows = self.rows
+        if isinstance(rows, QuerySet):
+            rows = [row async for row in self.prepare(rows, self.fields, self.expand)]
+        rows = list(rows)
+        related = {
+            name: [row async for row in queryset]
+            for name, queryset in self.related_querysets(rows).items()
+        }
+        with measure('serializer'):
+            return self.build(rows, related)
+
+    def related_querysets(self, rows):
+        """по одному запросу на связь, только для выбранных полей: {'project': qs, ...}"""
+        if not rows:
+            return {}
+        fields, expand = self.fields, self.expand
+        task_ids = [row['id'] for row in rows]
+        querysets = {}
+        if 'project' in fields and 'project' in expand:
+            project_ids = {row['project_id'] for row in rows}
+            querysets['project'] = Project.objects.filter(pk__in=project_ids).values(*self.PROJECT_COLUMNS)
+        if 'tags' in fields:
+            tags = Task.tags.through.objects.filter(task_id__in=task_ids).order_by('tag__name')
+            if 'tags' in expand:
+                querysets['tags'] = tags.values_list('task_id', 'tag_id', 'tag__name', 'tag__color')
+            else:
+                querysets['tags'] = tags.values_list('task_id', 'tag_id')
+        if 'attachments' in fields:
+            attachments = Attachment.objects.filter(task_id__in=task_ids)
+            if 'attachments' in expand:
+                querysets['attachments'] = attachments.values(*self.ATTACHMENT_COLUMNS)
+            else:
+                querysets['attachments'] = attachments.values_list('task_id', 'id')
+        return querysets
+
+    def build(self, rows, related):
+        """JSON из строк задач и строк связей (related: имя связи -> список строк)"""
+        if not rows:
+            return []
+
+        fields, expand = self.fields, self.expand
+        date = serializers.DateTimeField().to_representation
+        status_display = dict(Task.STATUS_CHOICES)
+
+        projects = self.project_map(related['project'], date) if 'project' in related else None
+
+        def project(row):
+            if projects is None:
+                return row['project_id']
+            return projects.get(row['project_id'])
+
+        if 'tags' in related:
+            tags = self.tag_map(related['tags'], expanded='tags' in expand)
+        if 'attachments' in related:
+            if 'attachments' in expand:
+                attachments = self.attachment_map(related['attachments'], date)
+            else:
+                attachments = self.attachment_id_map(related['attachments'])
+
+        values = {
+            'id': lambda row: row['id'],
+            'title': lambda row: row['title'],
+            'description': lambda row: row['description'],
+            'status': lambda row: row['status'],
+            'status_display': lambda row: status_display.get(row['status'], row['status']),
+            'priority': lambda row: row['priority'],
+            'due_date': lambda row: date(row['due_date']),
+            'completed_at': lambda row: date(row['completed_at']),
+            'project': project,
+            'author_username': lambda row: row['author__username'],
+            'tags': lambda row: tags.get(row['id'], []),
+            'attachments': lambda row: attachments.get(row['id'], []),
+            'author': lambda row: row['author_id'],
+            'editor': lambda row: row['editor_id'],
+            'created_at': lambda row: date(row['created_at']),
+            'updated_at': lambda row: date(row['updated_at']),
+        }
+        getters = [(name, values[name]) for name in fields]
+        return [{name: value(row) for name, value in getters} for row in rows]
+
+    def project_map(self, rows, date):
+        return {
+            row['id']: {
+                'id': row['id'],
+                'title': row['title'],
+                'color': row['color'],
+                'owner': row['owner_id'],
+                'owner_username': row['owner__username'],
+                'created_at': date(row['created_at']),
+                'updated_at': date(row['updated_at']),
+            }
+            for row in rows
+        }
+
+    def tag_map(self, rows, expanded=True):
+        tags = {}
+        if not expanded:
+            for task_id, tag_id in rows:
+                tags.setdefault(task_id, []).append(tag_id)
+            return tags
+        for task_id, tag_id, name, color in rows:
+            tags.setdefault(task_id, []).append({'id': tag_id, 'name': name, 'color': color})
+        return tags
+
+    def attachment_id_map(self, rows):
+        attachments = {}
+        for task_id, pk in rows:
+            attachments.setdefault(task_id, []).append(pk)
+        return attachments
+
+    def attachment_map(self, rows, date):
+        request = self.context.get('request')
+        storage = Attachment._meta.get_field('file').storage
+        attachments = {}
+        for row in rows:
+            url = None
+            if row['file']:
+                url = storage.url(row['file'])
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+            file_type = row['file_type']
+            attachments.setdefault(row['task_id'], []).append({
+                'id': row['id'],
+                'task': row['task_id'],
+                'file': url,
+                'file_url': url,
+                'file_type': file_type,
+                'original_name': row['original_name'],
+                'file_size': row['file_size'],
+                'readable_size': readable_size(row['file_size']),
+                'file_icon': Attachment.FILE_ICONS.get(file_type, '📎'),
+                'uploaded_by': row['uploaded_by_id'],
+                'uploaded_by_username': row['uploaded_by__username'],
+                'uploaded_at': date(row['uploaded_at']),
+                'updated_at': date(row['updated_at']),
+                'description': row['description'],
+            })
+        return attachments
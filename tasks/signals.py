@@ -0,0 +1,163 @@
+"""Сигналы моделей: увеличение версий данных для инвалидации кешей (tasks/invalidation.py)
+и события для SSE (tasks/events.py).
+
+Каждая запись увеличивает версии всех, чьи закешированные данные она
+меняет: задачи, её автора и проекта; для проекта — ещё его задач и их
+авторов (проект вложен в задачи и их списки), для тега — задач с этим тегом
+и их авторов и проектов, для пользователя — его задач и проектов.
+Записи, меняющие число задач проекта или тега и проектов пользователя,
+увеличивают версию счётчиков админки этой модели (admin_counts).
+Записи задач, вложений и комментариев публикуют событие автору задачи.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Q, QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import events, invalidation
+from .models import Attachment, Comment, Project, Tag, Task
+
+
+# версии счётчиков админки (AnnotatedCountsMixin.cached_counts): задачи проекта и тега, проекты пользователя
+PROJECT_COUNTS = Project._meta.label_lower
+TAG_COUNTS = Tag._meta.label_lower
+USER_COUNTS = get_user_model()._meta.label_lower
+
+
+def _bump_tasks(tasks, users=(), projects=(), **scopes):
+    """версии задач (queryset или id), их авторов и проектов одним запросом плюс дополнительные"""
+    if not isinstance(tasks, QuerySet):
+        tasks = Task.objects.filter(pk__in=tasks)
+    rows = list(tasks.values_list('pk', 'author_id', 'project_id'))
+    invalidation.bump(
+        task=[row[0] for row in rows],
+        user={*users, *(row[1] for row in rows)},
+        project={*projects, *(row[2] for row in rows)},
+        **scopes,
+    )
+    return rows
+
+
+def _action(signal, created=False):
+    if signal is post_delete:
+        return 'deleted'
+    return 'created' if created else 'updated'
+
+
+@receiver(pre_save, sender=Task)
+def task_pre_save(sender, instance, **kwargs):
+    # при переносе задачи сбрасываем и прежних автора/проект
+    dirty = instance.get_dirty_fields() if not instance._state.adding else {}
+    instance._previous_owners = {
+        'user': [dirty['author_id'][0]] if 'author_id' in dirty else [],
+        'project': [dirty['project_id'][0]] if 'project_id' in dirty else [],
+    }
+    # для события: имена изменённых полей (project, а не project_id)
+    names = {field.attname: field.name for field in instance._meta.concrete_fields}
+    instance._changed_fields = [names[attname] for attname in dirty]
+
+
+@receiver([post_save, post_delete], sender=Task)
+def task_changed(sender, instance, signal, created=False, **kwargs):
+    previous = getattr(instance, '_previous_owners', {})
+    counts = []
+    if signal is post_delete or created or previous.get('project'):
+        counts.append(PROJECT_COUNTS)
+    if signal is post_delete:
+        counts.append(TAG_COUNTS)  # связи с тегами удаляются каскадом без m2m_changed
+    invalidation.bump(
+        task=[instance.pk],
+        user=[instance.author_id, *previous.get('user', [])],
+        project=[instance.project_id, *previous.get('project', [])],
+        admin_counts=counts,
+    )
+    action = _action(signal, created)
+    fields = getattr(instance, '_changed_fields', []) if action == 'updated' else []
+    event = events.task_event('task', action, instance.pk, fields, instance.updated_at)
+    # задачу передали другому автору — прежний видит её удаление
+    for user_id in previous.get('user', []):
+        events.publish(user_id, {**event, 'action': 'deleted'})
+    events.publish(instance.author_id, event)
+
+
+@receiver(m2m_changed, sender=Task.tags.through)
+def task_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action.startswith('post_'):
+        invalidation.bump(admin_counts=[TAG_COUNTS])
+    if not reverse:
+        if action.startswith('post_'):
+            invalidation.bump(task=[instance.pk], user=[instance.author_id])
+        return
+    # tag.tasks.add(...)/clear() — меняются задачи разных авторов
+    if action == 'pre_clear':
+        instance._cleared_task_ids = list(instance.tasks.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        _bump_tasks(getattr(instance, '_cleared_task_ids', []))
+    elif action.startswith('post_'):
+        _bump_tasks(pk_set or [])
+
+
+@receiver([post_save, post_delete], sender=Project)
+def project_changed(sender, instance, **kwargs):
+    _bump_tasks(
+        Task.objects.filter(project_id=instance.pk),
+        users=[instance.owner_id], projects=[instance.pk], admin_counts=[USER_COUNTS],
+    )
+
+
+@receiver(post_save, sender=Tag)
+def tag_saved(sender, instance, created, **kwargs):
+    if not created:  # новый тег ещё ни в чьих задачах не виден
+        _bump_tasks(Task.objects.filter(tags=instance))
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    # связи с задачами удалятся каскадом без m2m_changed — собираем задачи заранее
+    _bump_tasks(Task.objects.filter(tags=instance))
+
+
+def _publish_related(kind, instance, task_rows, signal, created):
+    event = events.task_event(
+        kind, _action(signal, created), instance.task_id, [f'{kind}s'], instance.updated_at, object=instance.pk,
+    )
+    for _, author_id, _ in task_rows:
+        events.publish(author_id, event)
+
+
+def _deleted_with_task(origin):
+    """удаление пришло каскадом от задачи или проекта: task_changed сработает для самой задачи"""
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model in (Task, Project)
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def comment_changed(sender, instance, signal, created=False, origin=None, **kwargs):
+    if signal is post_delete and _deleted_with_task(origin):
+        return  # иначе — запрос задачи на каждый удаляемый комментарий
+    rows = _bump_tasks([instance.task_id], users=[instance.author_id])
+    _publish_related('comment', instance, rows, signal, created)
+
+
+@receiver([post_save, post_delete], sender=Attachment)
+def attachment_changed(sender, instance, signal, created=False, origin=None, **kwargs):
+    if signal is post_delete and _deleted_with_task(origin):
+        return
+    rows = _bump_tasks([instance.task_id])
+    _publish_related('attachment', instance, rows, signal, created)
+
+
+@receiver(post_save, sender=get_user_model())
+def user_changed(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return  # вход в систему: last_login нигде не выводится
+    if created:
+        invalidation.bump(user=[instance.pk])
+        return
+    # имя пользователя выводится в его задачах, проектах (и во вложенном проекте задачи) и вложениях
+    _bump_tasks(
+        Task.objects.filter(
+            Q(author=instance) | Q(project__owner=instance) | Q(attachments__uploaded_by=instance),
+        ).distinct(),
+        users=[instance.pk], projects=Project.objects.filter(owner=instance).values_list('pk', flat=True),
+    )
@@ -0,0 +1,120 @@
+"""Выборочные поля (?fields=) и раскрываемые связи (?expand=) для API.
+
+    /api/tasks/?fields=id,title,status
+    /api/tasks/?fields=id,title,project&expand=project
+
+Без параметров ответ прежний. Если передан хотя бы один из них:
+- ?fields= оставляет только перечисленные поля (по умолчанию — все);
+- связь из expandable_fields выводится объектом, только если указана в ?expand=,
+  иначе — её id (или список id).
+
+Запрос к БД сужается вместе с ответом: выбираются только колонки нужных
+полей (QuerySet.only), а join/prefetch делаются только для выбранных связей
+и в объёме, нужном для свёрнутого (id) или раскрытого вида.
+"""
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+def parse_field_list(value):
+    if value is None:
+        return None
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+class SparseFieldsSerializerMixin:
+    """Принимает fields= и expand= (их передаёт SparseFieldsViewMixin)."""
+
+    # поле -> (свёрнутое поле, раскрытое поле): фабрики, вызываются при сужении
+    expandable_fields = {}
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is None and expand is None:
+            return
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        for name, (collapsed, expanded) in self.expandable_fields.items():
+            if name in self.fields:
+                self.fields[name] = expanded() if name in (expand or ()) else collapsed()
+
+
+class SparseFieldsViewMixin:
+    """Для viewset-ов: разбирает ?fields=/?expand=, сужает queryset и сериализатор.
+
+    sparse_columns   — поле ответа -> колонки/лукапы модели, нужные для него;
+    sparse_relations — раскрываемая связь -> (свёрнутая, раскрытая): кортеж
+                       колонок (через '__' — join) или функция queryset -> queryset
+                       (prefetch, см. prefetch());
+    default_expand   — какие связи раскрыты, когда параметров нет (прежний ответ).
+    """
+
+    sparse_columns = {}
+    sparse_relations = {}
+    default_expand = ()
+
+    def get_sparse_params(self):
+        """(fields, expand) или (None, None), если параметров нет"""
+        if self.request is None or self.request.method not in SAFE_METHODS:
+            return None, None
+        params = self.request.query_params
+        fields = parse_field_list(params.get('fields'))
+        expand = parse_field_list(params.get('expand'))
+        if fields is None and expand is None:
+            return None, None
+        errors = {}
+        unknown = set(fields or ()) - set(self.sparse_columns)
+        if unknown:
+            errors['fields'] = f"неизвестные поля: {', '.join(sorted(unknown))}"
+        unknown = set(expand or ()) - set(self.sparse_relations)
+        if unknown:
+            errors['expand'] = f"нельзя раскрыть: {', '.join(sorted(unknown))}"
+        if errors:
+            raise serializers.ValidationError(errors)
+        return fields, expand or []
+
+    def sparse_queryset(self, queryset):
+        """join/prefetch по запрошенным полям; с параметрами — ещё и only() по колонкам"""
+        fields, expand = self.get_sparse_params()
+        sparse = fields is not None or expand is not None
+        if fields is None:
+            fields = list(self.sparse_columns)
+        if not sparse:
+            expand = self.default_expand
+
+        columns = {'pk'}
+        for name in fields:
+            columns.update(self.sparse_columns[name])
+            if name in self.sparse_relations:
+                collapsed, expanded = self.sparse_relations[name]
+                load = expanded if name in expand else collapsed
+                if callable(load):
+                    queryset = load(queryset)
+                else:
+                    columns.update(load)
+
+        joins = {column.rsplit('__', 1)[0] for column in columns if '__' in column}
+        if joins:
+            queryset = queryset.select_related(*sorted(joins))
+        if sparse:
+            queryset = queryset.only(*columns)
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        fields, expand = self.get_sparse_params()
+        if fields is not None or expand is not None:
+            kwargs.setdefault('fields', fields)
+            kwargs.setdefault('expand', expand)
+        return super().get_serializer(*args, **kwargs)
+
+
+def related_columns(relation, *names):
+    """related_columns('owner', 'username') -> ('owner', 'owner__username')"""
+    return (relation, *(f'{relation}__{name}' for name in names))
+
+
+def prefetch(lookup, queryset):
+    """для sparse_relations: загрузка связи отдельным запросом"""
+    return lambda objects: objects.prefetch_related(Prefetch(lookup, queryset=queryset))
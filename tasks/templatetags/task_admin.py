@@ -0,0 +1,91 @@
+import datetime
+
+from django import template
+from django.contrib.admin.templatetags.admin_list import date_hierarchy
+from django.db.models import Max, Min
+from django.utils import formats
+from django.utils.text import capfirst
+from django.utils.translation import gettext as _
+
+register = template.Library()
+
+
+@register.inclusion_tag('admin/date_hierarchy.html')
+def rollup_date_hierarchy(cl):
+    """date_hierarchy по предрасчитанной таблице вида (day, count).
+
+    Модель агрегатов задаётся в ModelAdmin.date_hierarchy_rollup. Если
+    в списке есть фильтры или поиск (агрегаты их не учитывают) либо таблица
+    агрегатов пуста — используется стандартный date_hierarchy.
+    """
+    rollup = getattr(cl.model_admin, 'date_hierarchy_rollup', None)
+    field_name = cl.date_hierarchy
+    field_generic = f'{field_name}__'
+    year_field = f'{field_name}__year'
+    month_field = f'{field_name}__month'
+    day_field = f'{field_name}__day'
+    filtered = cl.query or any(
+        key not in (year_field, month_field, day_field) for key in cl.get_filters_params()
+    )
+    if rollup is None or filtered or not rollup.objects.exists():
+        return date_hierarchy(cl)
+
+    year_lookup = cl.params.get(year_field)
+    month_lookup = cl.params.get(month_field)
+    day_lookup = cl.params.get(day_field)
+    days = rollup.objects.filter(tasks_count__gt=0)
+
+    def link(filters):
+        return cl.get_query_string(filters, [field_generic])
+
+    if not (year_lookup or month_lookup or day_lookup):
+        date_range = days.aggregate(first=Min('day'), last=Max('day'))
+        if date_range['first'] and date_range['first'].year == date_range['last'].year:
+            year_lookup = date_range['first'].year
+            if date_range['first'].month == date_range['last'].month:
+                month_lookup = date_range['first'].month
+
+    if year_lookup and month_lookup and day_lookup:
+        day = datetime.date(int(year_lookup), int(month_lookup), int(day_lookup))
+        return {
+            'show': True,
+            'back': {
+                'link': link({year_field: year_lookup, month_field: month_lookup}),
+                'title': capfirst(formats.date_format(day, 'YEAR_MONTH_FORMAT')),
+            },
+            'choices': [{'title': capfirst(formats.date_format(day, 'MONTH_DAY_FORMAT'))}],
+        }
+    if year_lookup and month_lookup:
+        month_days = days.filter(day__year=year_lookup, day__month=month_lookup).dates('day', 'day')
+        return {
+            'show': True,
+            'back': {'link': link({year_field: year_lookup}), 'title': str(year_lookup)},
+            'choices': [
+                {
+                    'link': link({year_field: year_lookup, month_field: month_lookup, day_field: day.day}),
+                    'title': capfirst(formats.date_format(day, 'MONTH_DAY_FORMAT')),
+                }
+                for day in month_days
+            ],
+        }
+    if year_lookup:
+        months = days.filter(day__year=year_lookup).dates('day', 'month')
+        return {
+            'show': True,
+            'back': {'link': link({}), 'title': _('All dates')},
+            'choices': [
+                {
+                    'link': link({year_field: year_lookup, month_field: month.month}),
+                    'title': capfirst(formats.date_format(month, 'YEAR_MONTH_FORMAT')),
+                }
+                for month in months
+            ],
+        }
+    return {
+        'show': True,
+        'back': None,
+        'choices': [
+            {'link': link({year_field: str(year.year)}), 'title': str(year.year)}
+            for year in days.dates('day', 'year')
+        ],
+    }
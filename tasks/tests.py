@@ -1 +1,1420 @@
-# Create your tests here.
+import asyncio
+import gzip
+import json
+import tempfile
+import zlib
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock, skipIf, skipUnless
+
+import tablib
+
+from asgiref.sync import async_to_sync, sync_to_async
+
+from django.conf import settings
+from django.contrib import admin as django_admin
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Prefetch, Sum
+from django.http import HttpResponse
+from django.test import (
+    AsyncClient, AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.fields import DateTimeField
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from monitoring.tests import QueryBudgetTestMixin
+from taskflow_manager import compression
+from taskflow_manager.compression import accepted_encodings
+from taskflow_manager.database_url import parse_database_url
+from taskflow_manager.db_routers import (
+    PIN_COOKIE, ReadYourWritesMiddleware, ReplicaRouter, _lag_cache, choose_replica, primary_only, replica_reads,
+)
+from taskflow_manager.renderers import FastJSONRenderer
+from taskflow_manager.urls import build_urlpatterns
+from . import events, history, invalidation, views_async
+from .bench import load_collection
+from .dates import day_start, due_day_in
+from .filters import TaskFilter
+from .management.commands.bench_suite import Command as BenchSuiteCommand, Fixtures as BenchFixtures
+from .resources import TaskImportLookups, TaskResource
+from .serializers import TaskSerializer
+from .models import TITLE_TAKEN, Attachment, Comment, Project, Tag, Task, TaskDailyCount
+
+User = get_user_model()
+
+
+class ChangelistQueriesMixin:
+    """проверка, что changelist делает одинаковое число запросов при любом числе строк"""
+
+    def assertConstantQueries(self, url, add_rows):
+        with CaptureQueriesContext(connection) as before:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        add_rows()
+        with CaptureQueriesContext(connection) as after:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            len(before), len(after),
+            'число запросов changelist растёт вместе с числом строк:\n'
+            + '\n'.join(q['sql'] for q in after.captured_queries)
+        )
+
+
+class AdminChangelistQueriesTests(ChangelistQueriesMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.tag = Tag.objects.create(name='срочно')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.counter = 0
+
+    def add_rows(self, count=3):
+        for _ in range(count):
+            self.counter += 1
+            user = User.objects.create_user(f'user{self.counter}')
+            project = Project.objects.create(title=f'Проект {self.counter}', owner=user)
+            task = Task.objects.create(title=f'Задача {self.counter}', project=project, author=user)
+            task.tags.add(self.tag)
+            Tag.objects.create(name=f'тег {self.counter}').tasks.add(task)
+            Comment.objects.create(content='комментарий', task=task, author=user)
+            Attachment.objects.create(
+                task=task,
+                file=f'attachments/file{self.counter}.txt',
+                file_type='document',
+                original_name=f'file{self.counter}.txt',
+                uploaded_by=user,
+            )
+
+    def test_project_changelist(self):
+        self.add_rows()
+        self.assertConstantQueries('/admin/tasks/project/', self.add_rows)
+
+    def test_project_changelist_sorted_by_tasks_count(self):
+        self.add_rows()
+        self.assertConstantQueries('/admin/tasks/project/?o=-4', self.add_rows)
+
+    def test_tag_changelist(self):
+        self.add_rows()
+        self.assertConstantQueries('/admin/tasks/tag/', self.add_rows)
+
+    def test_task_changelist(self):
+        self.add_rows()
+        self.assertConstantQueries('/admin/tasks/task/', self.add_rows)
+
+    def test_task_changelist_filtered_by_project(self):
+        self.add_rows()
+        project = Project.objects.first()
+        self.assertConstantQueries(f'/admin/tasks/task/?project__id__exact={project.pk}', self.add_rows)
+
+    def test_comment_changelist(self):
+        self.add_rows()
+        self.assertConstantQueries('/admin/tasks/comment/', self.add_rows)
+
+    def test_attachment_changelist(self):
+        self.add_rows()
+        self.assertConstantQueries('/admin/tasks/attachment/', self.add_rows)
+
+    def test_autocomplete_filter_does_not_list_projects(self):
+        self.add_rows()
+        response = self.client.get('/admin/tasks/comment/')
+        self.assertContains(response, 'autocomplete-filter-task__project')
+        self.assertNotContains(response, 'Проект 2</a>')
+
+
+class AdminCachedCountsTests(TestCase):
+    """AnnotatedCountsMixin.cached_counts: счётчики из кеша, сброс — сигналами через версии admin_counts"""
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(self.admin)
+        self.project = Project.objects.create(title='Проект', owner=self.admin)
+        self.tag = Tag.objects.create(name='срочно')
+        self.task = Task.objects.create(title='Задача', project=self.project, author=self.admin)
+        self.task.tags.add(self.tag)
+        for model in (Project, Tag, User):
+            model_admin = django_admin.site._registry[model]
+            model_admin.cached_counts = True
+            self.addCleanup(delattr, model_admin, 'cached_counts')
+
+    def counts(self, url):
+        response = self.client.get(url)
+        return {obj.pk: next(getattr(obj, name) for name in ('tasks_count', 'projects_count') if hasattr(obj, name))
+                for obj in response.context['cl'].result_list}
+
+    def test_counts_are_cached_without_group_by_over_table(self):
+        self.assertEqual(self.counts('/admin/tasks/project/'), {self.project.pk: 1})
+        with CaptureQueriesContext(connection) as queries:
+            self.counts('/admin/tasks/project/')
+        self.assertFalse([q for q in queries.captured_queries if 'COUNT(' in q['sql'] and 'tasks_task' in q['sql']])
+
+    def test_writes_invalidate_cached_counts(self):
+        self.assertEqual(self.counts('/admin/tasks/project/'), {self.project.pk: 1})
+        self.assertEqual(self.counts('/admin/tasks/tag/'), {self.tag.pk: 1})
+        self.assertEqual(self.counts('/admin/users/user/'), {self.admin.pk: 1})
+
+        other = Project.objects.create(title='Другой', owner=self.admin)
+        self.assertEqual(self.counts('/admin/users/user/'), {self.admin.pk: 2})
+        second = Task.objects.create(title='Вторая', project=self.project, author=self.admin)
+        self.assertEqual(self.counts('/admin/tasks/project/'), {self.project.pk: 2, other.pk: 0})
+        second.tags.add(self.tag)
+        self.assertEqual(self.counts('/admin/tasks/tag/'), {self.tag.pk: 2})
+
+        second.project = other
+        second.save()
+        self.assertEqual(self.counts('/admin/tasks/project/'), {self.project.pk: 1, other.pk: 1})
+        second.delete()
+        self.assertEqual(self.counts('/admin/tasks/project/'), {self.project.pk: 1, other.pk: 0})
+        self.assertEqual(self.counts('/admin/tasks/tag/'), {self.tag.pk: 1})
+
+        # bulk-запись импорта — через invalidate_tasks
+        bulk = Task(title='Пачка', project=other, author=self.admin)
+        Task.objects.bulk_create([bulk])
+        invalidation.invalidate_tasks([bulk])
+        self.assertEqual(self.counts('/admin/tasks/project/'), {self.project.pk: 1, other.pk: 1})
+
+
+class TaskAdminLargeTableTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        project = Project.objects.create(title='Проект', owner=cls.admin)
+        for i in range(3):
+            Task.objects.create(title=f'Задача {i}', project=project, author=cls.admin)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_date_hierarchy_uses_rollup(self):
+        call_command('refresh_task_rollups', stdout=StringIO())
+        self.assertEqual(TaskDailyCount.objects.get().tasks_count, 3)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/admin/tasks/task/')
+        self.assertEqual(response.status_code, 200)
+        sql = '\n'.join(q['sql'] for q in ctx.captured_queries)
+        self.assertIn('tasks_task_daily_count', sql)
+        self.assertNotIn('MIN("tasks_task"."created_at")', sql)
+
+        year = TaskDailyCount.objects.get().day.year
+        response = self.client.get(f'/admin/tasks/task/?created_at__year={year}')
+        self.assertContains(response, 'created_at__month=')
+
+    def test_filtered_changelist_counts_once(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/admin/tasks/task/?status__exact=todo')
+        self.assertEqual(response.status_code, 200)
+        counts = [q for q in ctx.captured_queries if 'COUNT(*)' in q['sql']]
+        self.assertEqual(len(counts), 1)
+
+
+class TaskHistoryRetentionTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('author')
+        project = Project.objects.create(title='Проект', owner=self.user)
+        self.task = Task.objects.create(title='Задача', project=project, author=self.user)
+
+    def test_compact_removes_rows_without_changes(self):
+        # явный update_fields пишет историю даже без изменений (как старые записи)
+        self.task.save(update_fields=['updated_at'])
+        self.task.status = 'in_progress'
+        self.task.save()
+        self.task.save(update_fields=['updated_at'])
+        self.assertEqual(self.task.history.count(), 4)
+
+        self.assertEqual(history.compact_history(dry_run=True), 2)
+        self.assertEqual(history.compact_history(), 2)
+        self.assertEqual(
+            list(self.task.history.order_by('history_id').values_list('history_type', 'status')),
+            [('+', 'todo'), ('~', 'in_progress')],
+        )
+
+    def test_thin_keeps_last_row_per_day_and_expires_old_rows(self):
+        for status in ('in_progress', 'done'):
+            self.task.status = status
+            self.task.save()
+        now = timezone.now()
+        rows = list(self.task.history.order_by('history_id'))
+        # два изменения за один старый день и одна запись старше срока хранения
+        HistoricalTask = Task.history.model
+        HistoricalTask.objects.filter(pk=rows[0].pk).update(history_date=now - timedelta(days=800))
+        HistoricalTask.objects.filter(pk=rows[1].pk).update(history_date=now - timedelta(days=100, hours=1))
+        HistoricalTask.objects.filter(pk=rows[2].pk).update(history_date=now - timedelta(days=100))
+
+        call_command('prune_task_history', keep_all_days=90, keep_daily_days=730, stdout=StringIO())
+        self.assertEqual(list(self.task.history.values_list('status', flat=True)), ['done'])
+
+    @skipIf(connection.vendor == 'postgresql', 'проверка отказа на других СУБД')
+    def test_partition_requires_postgresql(self):
+        with self.assertRaisesMessage(CommandError, 'только на PostgreSQL'):
+            call_command('prune_task_history', partition=True, stdout=StringIO())
+
+    def test_thin_keeps_latest_row_of_live_tasks(self):
+        stale = Task.objects.create(title='Давно не менялась', project=self.task.project, author=self.user)
+        gone = Task.objects.create(title='Удалённая', project=self.task.project, author=self.user)
+        gone_id = gone.pk
+        gone.delete()
+        HistoricalTask = Task.history.model
+        HistoricalTask.objects.filter(id__in=[stale.pk, gone_id]).update(history_date=timezone.now() - timedelta(days=800))
+
+        self.assertEqual(history.thin_history(90, 730, batch_size=1, dry_run=True), 2)
+        self.assertEqual(history.thin_history(90, 730, batch_size=1), 2)
+        self.assertEqual(list(stale.history.values_list('history_type', flat=True)), ['+'])
+        self.assertFalse(HistoricalTask.objects.filter(id=gone_id).exists())
+
+    def test_compact_in_batches_from_previous_pass(self):
+        for _ in range(3):
+            self.task.save(update_fields=['updated_at'])
+        after = history.latest_history_id()
+        self.assertEqual(history.compact_history(batch_size=1), 3)
+        # следующий проход читает только новые строки, сравнивая их с последней до границы
+        self.task.save(update_fields=['updated_at'])
+        self.task.status = 'done'
+        self.task.save()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(history.compact_history(batch_size=1, after=after), 1)
+        self.assertIn(f'"history_id" > {after} ', queries.captured_queries[0]['sql'])
+        self.assertEqual(list(self.task.history.order_by('history_id').values_list('status', flat=True)), ['todo', 'done'])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'секционирование есть только на PostgreSQL')
+class TaskHistoryPartitionTests(TransactionTestCase):
+    """CREATE INDEX CONCURRENTLY не работает в транзакции — поэтому TransactionTestCase"""
+
+    def test_existing_table_becomes_first_partition(self):
+        user = User.objects.create_user('author')
+        task = Task.objects.create(title='Задача', project=Project.objects.create(title='П', owner=user), author=user)
+        task.status = 'done'
+        task.save()
+        last_id = task.history.latest('history_id').history_id
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [history.TABLE, 'history_id'])
+            sequence = cursor.fetchone()[0]
+            cursor.execute('SELECT indexname FROM pg_indexes WHERE tablename = %s', [history.TABLE])
+            indexes = {row[0] for row in cursor.fetchall()} - {f'{history.TABLE}_pkey'}
+
+        self.assertTrue(history.partition_history_table(months_ahead=1))
+        self.assertTrue(history.is_partitioned())
+        first, _ = history.list_partitions()[0]
+        with connection.cursor() as cursor:
+            # строки не копировались: прежняя таблица — первая секция
+            cursor.execute(f'SELECT count(*) FROM ONLY "{first}"')
+            self.assertEqual(cursor.fetchone()[0], 2)
+            cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [history.TABLE, 'history_id'])
+            self.assertEqual(cursor.fetchone()[0], sequence)
+            cursor.execute('SELECT indexname FROM pg_indexes WHERE tablename = %s', [history.TABLE])
+            self.assertLessEqual(indexes, {row[0] for row in cursor.fetchall()})
+
+        task.status = 'todo'
+        task.save()
+        self.assertEqual(task.history.count(), 3)
+        self.assertGreater(task.history.latest('history_id').history_id, last_id)
+        self.assertFalse(history.partition_history_table())
+        # секция с единственной записью живой задачи не удаляется целиком
+        far = timezone.now() + timedelta(days=3650)
+        self.assertNotIn(first, history.drop_partitions_before(far, dry_run=True))
+
+
+class TaskHistoryApiTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('author')
+        self.client.force_login(self.user)
+        project = Project.objects.create(title='Проект', owner=self.user)
+        self.task = Task.objects.create(title='Задача', project=project, author=self.user)
+        self.task.status = 'in_progress'
+        self.task.save()
+        self.task.title = 'Задача 2'
+        self.task.save()
+
+    def test_task_history_diffs(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/api/tasks/{self.task.pk}/history/')
+        self.assertEqual(response.status_code, 200)
+        changes = [row['changes'] for row in response.json()['results']]
+        self.assertEqual(changes[1], {'status': ['todo', 'in_progress']})
+        self.assertEqual(changes[2], {'title': ['Задача', 'Задача 2']})
+        # строки страницы с номером предыдущей записи + сами предыдущие записи
+        history_queries = [q['sql'] for q in ctx.captured_queries if 'tasks_historicaltask' in q['sql']]
+        self.assertEqual(len(history_queries), 2)
+        self.assertNotIn(' OVER ', history_queries[0])
+        self.assertEqual(history_queries[0].count('"tasks_historicaltask"."title"'), 1)
+
+    def test_feed_keyset_pagination_keeps_previous_values(self):
+        response = self.client.get('/api/history/', {'page_size': 2})
+        data = response.json()
+        self.assertEqual(len(data['results']), 2)
+        # страница по курсору всё равно видит предыдущую запись задачи
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(data['next']).json()
+        self.assertEqual([row['changes'] for row in data['results']], [{'title': ['Задача', 'Задача 2']}])
+        self.assertIsNone(data['next'])
+        # курсор — условие самого запроса страницы, без окна по всей истории автора
+        sql = next(q['sql'] for q in ctx.captured_queries if 'tasks_historicaltask' in q['sql'])
+        self.assertNotIn(' OVER ', sql)
+        self.assertIn('"history_id" >', sql.split(' WHERE ')[-1])
+
+    def test_feed_since(self):
+        since = self.task.history.order_by('history_id')[1].history_date
+        response = self.client.get('/api/history/', {'since': since.isoformat()})
+        self.assertEqual(
+            [row['changes'] for row in response.json()['results']],
+            [{'status': ['todo', 'in_progress']}, {'title': ['Задача', 'Задача 2']}],
+        )
+        self.assertEqual(self.client.get('/api/history/', {'since': 'вчера'}).status_code, 400)
+
+
+class TaskDirtyFieldsTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('author')
+        self.project = Project.objects.create(title='Проект', owner=self.user)
+        self.task = Task.objects.create(title='Задача', project=self.project, author=self.user)
+
+    def test_unchanged_save_is_skipped(self):
+        task = Task.objects.get(pk=self.task.pk)
+        updated_at = task.updated_at
+        task.priority = '3'
+        task.project_id = str(self.project.pk)
+        with self.assertNumQueries(0):
+            task.save()
+        task.refresh_from_db()
+        self.assertEqual(task.updated_at, updated_at)
+        self.assertEqual(task.history.count(), 1)
+
+    def test_only_changed_columns_are_written(self):
+        task = Task.objects.get(pk=self.task.pk)
+        task.status = 'done'
+        self.assertEqual(task.get_dirty_fields(), {'status': ('todo', 'done')})
+        with CaptureQueriesContext(connection) as ctx:
+            task.save()
+        update = next(q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE'))
+        self.assertIn('"status"', update)
+        self.assertNotIn('"title"', update)
+        self.assertFalse(task.is_dirty())
+        self.assertEqual(task.history.count(), 2)
+
+    def test_naive_due_date_string_matches_stored_value(self):
+        self.task.due_date = timezone.make_aware(timezone.datetime(2030, 1, 1, 10, 0))
+        self.task.save()
+        self.task.due_date = '2030-01-01T10:00'
+        self.assertFalse(self.task.is_dirty())
+
+    def test_api_update_with_same_data_keeps_history(self):
+        self.client.force_login(self.user)
+        Task.objects.filter(pk=self.task.pk).update(editor=self.user)
+        response = self.client.patch(
+            f'/api/tasks/{self.task.pk}/', {'title': 'Задача', 'status': 'todo'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.task.history.count(), 1)
+
+
+class ImportTasksCommandTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('author')
+        self.other = User.objects.create_user('other')
+        self.project = Project.objects.create(title='Проект', owner=self.user)
+        self.other_project = Project.objects.create(title='Проект', owner=self.other)
+        self.task = Task.objects.create(title='Старая', project=self.project, author=self.user)
+
+    def import_csv(self, rows, **options):
+        headers = ['id', 'title', 'description', 'Статус', 'priority', 'Дата выполнения', 'Проект', 'Автор']
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', newline='', encoding='utf-8', delete=False) as f:
+            f.write('\n'.join(','.join(map(str, row)) for row in [headers, *rows]))
+        self.addCleanup(Path(f.name).unlink)
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_tasks', f.name, user='author', stdout=stdout, stderr=stderr, **options)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_bulk_import_in_chunks(self):
+        rows = [[self.task.pk, 'Старая', 'обновлена', 'Выполнено', 2, '01-02-2031', 'Проект', 'author']]
+        rows += [['', f'Новая {n}', '', 'todo', 3, 'Нет срока', 'Проект', 'author'] for n in range(4)]
+        rows += [['', 'Чужая', '', 'В процессе', 3, '2031-03-01', 'Проект', 'other']]
+        versions = invalidation.get_versions(user=[self.user.pk, self.other.pk])
+        with CaptureQueriesContext(connection) as queries:
+            stdout, stderr = self.import_csv(rows, chunk_size=2, batch_size=2)
+        self.assertIn('создано: 5, обновлено: 1', stdout)
+        self.assertEqual(stderr, '')
+
+        # чанки по 2 строки: вставки пачками, а не INSERT на строку; справочники — один раз
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "tasks_task"')]
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(sum('FROM "tasks_project"' in q['sql'] for q in queries.captured_queries), 1)
+
+        # проект — по автору строки (у обоих пользователей есть «Проект»)
+        foreign = Task.objects.get(title='Чужая')
+        self.assertEqual((foreign.author, foreign.project), (self.other, self.other_project))
+        self.task.refresh_from_db()
+        self.assertEqual((self.task.status, self.task.description), ('done', 'обновлена'))
+        self.assertEqual(timezone.localtime(self.task.due_date).date(), date(2031, 2, 1))
+
+        # история пишется и для bulk-записей, автор записей — --user
+        self.assertEqual(list(self.task.history.values_list('history_type', flat=True).order_by('history_id')),
+                         ['+', '~'])
+        created = Task.history.filter(history_type='+', title__startswith='Новая')
+        self.assertEqual(created.count(), 4)
+        self.assertEqual(set(created.values_list('history_user', flat=True)), {self.user.pk})
+
+        # bulk_create/bulk_update без сигналов — версии кешей увеличивает invalidate_tasks
+        after = invalidation.get_versions(user=[self.user.pk, self.other.pk])
+        self.assertTrue(all(after[key] != versions[key] for key in versions))
+
+    def test_invalid_rows_are_reported(self):
+        rows = [['', 'Без проекта', '', 'todo', 3, 'Нет срока', 'Нет такого', 'author'],
+                ['', 'Новая', '', 'todo', 3, 'вчера', 'Проект', 'author']]
+        stdout, stderr = self.import_csv(rows)
+        self.assertIn('с ошибками валидации: 2', stdout)
+        self.assertIn('не найден', stderr)
+        self.assertFalse(Task.objects.exclude(pk=self.task.pk).exists())
+
+
+@override_settings(DATABASE_REPLICAS={'replica_a': 3, 'replica_b': 1}, DATABASE_REPLICA_MAX_LAG=None)
+class ReplicaRoutingTests(TestCase):
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def test_reads_go_to_replicas_only_when_allowed(self):
+        self.assertEqual(self.router.db_for_read(Task), 'default')
+        with replica_reads():
+            self.assertIn(self.router.db_for_read(Task), {'replica_a', 'replica_b'})
+            with primary_only():
+                self.assertEqual(self.router.db_for_read(Task), 'default')
+        self.assertEqual(self.router.db_for_write(Task), 'default')
+
+    def test_weighted_choice(self):
+        with replica_reads():
+            picks = [self.router.db_for_read(Task) for _ in range(400)]
+        self.assertGreater(picks.count('replica_a'), picks.count('replica_b'))
+
+    def test_write_pins_user_to_primary(self):
+        seen = []
+
+        def view(request):
+            with replica_reads():
+                seen.append(self.router.db_for_read(Task))
+                if request.method == 'POST':
+                    self.router.db_for_write(Task)
+                    seen.append(self.router.db_for_read(Task))
+            return HttpResponse()
+
+        middleware = ReadYourWritesMiddleware(view)
+        factory = RequestFactory()
+        response = middleware(factory.post('/'))
+        self.assertEqual(seen[1], 'default')
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        request = factory.get('/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        seen.clear()
+        middleware(request)
+        self.assertEqual(seen, ['default'])
+
+    @override_settings(DATABASE_REPLICAS={'default': 1}, DATABASE_REPLICA_MAX_LAG=5)
+    def test_lagging_replica_is_skipped(self):
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Task), 'default')
+            _lag_cache['default'] = (float('inf'), False)
+            try:
+                self.assertEqual(choose_replica(), None)
+            finally:
+                _lag_cache.clear()
+
+
+class DatabaseUrlTests(TestCase):
+
+    def test_postgres_url(self):
+        config, extra = parse_database_url(
+            'postgres://user:p%40ss@db:5432/taskflow?sslmode=require&weight=2', conn_max_age=60,
+        )
+        self.assertEqual(config['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual(
+            (config['NAME'], config['USER'], config['PASSWORD'], config['HOST'], config['PORT']),
+            ('taskflow', 'user', 'p@ss', 'db', '5432'),
+        )
+        self.assertEqual(config['OPTIONS'], {'sslmode': 'require'})
+        self.assertTrue(config['CONN_HEALTH_CHECKS'])
+        self.assertEqual(extra['weight'], 2)
+
+    def test_pool_disables_persistent_connections(self):
+        config, _ = parse_database_url('postgres://db/taskflow', conn_max_age=60, pool='20')
+        self.assertEqual(config['OPTIONS']['pool']['max_size'], 20)
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+
+    def test_sqlite_relative_path(self):
+        config, _ = parse_database_url('sqlite:///db.replica.sqlite3', base_dir=Path('/srv'))
+        self.assertEqual(config['NAME'], Path('/srv/db.replica.sqlite3'))
+        self.assertEqual(config['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+        self.assertIn('journal_mode=WAL', config['OPTIONS']['init_command'])
+
+    def test_sqlite_tuning_can_be_disabled(self):
+        config, _ = parse_database_url('sqlite:///db.sqlite3', sqlite_tuning=False)
+        self.assertEqual(config['OPTIONS'], {})
+
+
+class ApiResponseCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('author')
+        self.client.force_login(self.user)
+        self.project = Project.objects.create(title='Проект', owner=self.user)
+        self.task = Task.objects.create(title='Задача', project=self.project, author=self.user)
+
+    def get_titles(self, url):
+        return [row['title'] for row in self.client.get(url).json()['results']]
+
+    def test_repeated_list_skips_database(self):
+        self.get_titles('/api/tasks/?status=todo&ordering=-created_at')
+        with CaptureQueriesContext(connection) as ctx:
+            # тот же набор параметров в другом порядке
+            titles = self.get_titles('/api/tasks/?ordering=-created_at&status=todo&search=')
+        self.assertEqual(titles, ['Задача'])
+        self.assertFalse([q for q in ctx.captured_queries if 'tasks_task' in q['sql']])
+
+    def test_writes_invalidate_cached_lists(self):
+        self.get_titles('/api/tasks/')
+        self.get_titles('/api/projects/')
+        Task.objects.create(title='Новая', project=self.project, author=self.user)
+        self.assertEqual(self.get_titles('/api/tasks/'), ['Новая', 'Задача'])
+
+        self.project.title = 'Переименован'
+        self.project.save()
+        self.assertEqual(self.get_titles('/api/projects/'), ['Переименован'])
+
+        tag = Tag.objects.create(name='срочно')
+        self.task.tags.add(tag)
+        response = self.client.get('/api/tasks/').json()['results']
+        self.assertEqual([t['name'] for t in response[1]['tags']], ['срочно'])
+
+    def test_cache_is_per_user(self):
+        self.get_titles('/api/tasks/')
+        other = User.objects.create_user('other')
+        self.client.force_login(other)
+        self.assertEqual(self.get_titles('/api/tasks/'), [])
+
+
+class CacheInvalidationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('author')
+        self.other = User.objects.create_user('other')
+        self.project = Project.objects.create(title='Проект', owner=self.user)
+        self.task = Task.objects.create(title='Задача', project=self.project, author=self.user)
+
+    def token(self):
+        return invalidation.version_token(
+            user=[self.user.pk, self.other.pk], project=[self.project.pk], task=[self.task.pk],
+        )
+
+    def assertBumps(self, action):
+        before = self.token()
+        action()
+        self.assertNotEqual(before, self.token())
+
+    def test_versions_are_stable_without_writes(self):
+        self.assertEqual(self.token(), self.token())
+
+    def test_model_writes_bump_versions(self):
+        tag = Tag.objects.create(name='срочно')
+        self.assertBumps(lambda: self.task.tags.add(tag))
+        self.assertBumps(lambda: tag.tasks.clear())
+        self.assertBumps(lambda: Comment.objects.create(content='!', task=self.task, author=self.other))
+        self.task.tags.add(tag)
+        tag.name = 'важно'
+        self.assertBumps(tag.save)
+        self.assertBumps(tag.delete)
+
+    def test_writes_bump_only_their_own_objects(self):
+        other_task = Task.objects.create(title='Другая', project=self.project, author=self.user)
+        before = invalidation.get_versions(task=[self.task.pk])
+        other_task.title = 'Переименована'
+        other_task.save()
+        self.assertEqual(before, invalidation.get_versions(task=[self.task.pk]))
+        # проект вложен в задачу: его правка сбрасывает и её
+        self.project.title = 'Новое название'
+        self.project.save()
+        self.assertNotEqual(before, invalidation.get_versions(task=[self.task.pk]))
+
+    def test_moving_task_bumps_previous_author_and_project(self):
+        other_project = Project.objects.create(title='Другой', owner=self.other)
+        before = invalidation.get_versions(user=[self.user.pk], project=[self.project.pk])
+        self.task.author = self.other
+        self.task.project = other_project
+        self.task.save()
+        after = invalidation.get_versions(user=[self.user.pk], project=[self.project.pk])
+        self.assertNotEqual(before[('user', self.user.pk)], after[('user', self.user.pk)])
+        self.assertNotEqual(before[('project', self.project.pk)], after[('project', self.project.pk)])
+
+    def test_bulk_paths_use_explicit_hooks(self):
+        before = self.token()
+        self.task.status = 'done'
+        invalidation.invalidate_tasks([self.task])
+        self.assertNotEqual(before, self.token())
+
+        tasks = Task.objects.filter(pk=self.task.pk)
+        before = self.token()
+        invalidation.invalidate_task_queryset(tasks)
+        tasks.update(status='todo')
+        self.assertNotEqual(before, self.token())
+
+    def test_new_tag_does_not_bump_users(self):
+        before = self.token()
+        Tag.objects.create(name='новый')
+        self.assertEqual(before, self.token())
+
+    def test_login_does_not_bump_and_rename_bumps_user_tasks(self):
+        before = self.token()
+        self.client.force_login(self.user)  # обновляет только last_login
+        self.assertEqual(before, self.token())
+        self.user.username = 'renamed'
+        self.assertBumps(self.user.save)
+
+    @override_settings(API_RESPONSE_CACHE_TIMEOUT=300)
+    def test_detail_cache_is_keyed_by_object_version(self):
+        other_task = Task.objects.create(title='Другая', project=self.project, author=self.user)
+        self.client.force_login(self.user)
+        url = f'/api/tasks/{self.task.pk}/'
+        self.assertEqual(self.client.get(url).json()['title'], 'Задача')
+        other_task.title = 'Переименована'
+        other_task.save()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).json()['title'], 'Задача')
+        self.assertFalse([q for q in queries.captured_queries if 'tasks_task' in q['sql']])
+
+        self.project.title = 'Новое название'
+        self.project.save()
+        self.assertEqual(self.client.get(url).json()['project']['title'], 'Новое название')
+        self.user.username = 'renamed'
+        self.user.save()
+        self.assertEqual(self.client.get(url).json()['author_username'], 'renamed')
+        # чужой пользователь не получает закешированный ответ автора
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class TaskFastSerializerTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('author')
+        self.client.force_login(self.user)
+        project = Project.objects.create(title='Проект', owner=self.user)
+        tags = [Tag.objects.create(name=name) for name in ('б', 'а')]
+        for i in range(3):
+            task = Task.objects.create(
+                title=f'Задача {i}', project=project, author=self.user,
+                due_date=timezone.now() + timedelta(days=i + 1),
+            )
+            task.tags.set(tags[:i])
+            Attachment.objects.create(
+                task=task, file=f'attachments/file{i}.txt', file_type='document',
+                original_name=f'file{i}.txt', uploaded_by=self.user,
+            )
+
+    def test_list_matches_task_serializer(self):
+        response = self.client.get('/api/tasks/')
+        request = response.wsgi_request
+        tasks = Task.objects.filter(author=self.user).order_by('-created_at').prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.order_by('name'))
+        )
+        expected = TaskSerializer(tasks, many=True, context={'request': request}).data
+        self.assertEqual(response.json()['results'], json.loads(json.dumps(expected, cls=JSONEncoder)))
+
+    def test_list_queries_do_not_grow_with_rows(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/tasks/?ordering=due_date')
+        # сессия, пользователь, COUNT, задачи, проекты, теги, вложения
+        self.assertEqual(len(ctx.captured_queries), 7)
+
+
+class SparseFieldsetsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('author', email='author@example.com')
+        self.client.force_login(self.user)
+        self.project = Project.objects.create(title='Проект', owner=self.user)
+        self.tag = Tag.objects.create(name='срочно')
+        self.task = Task.objects.create(title='Задача', description='текст', project=self.project, author=self.user)
+        self.task.tags.add(self.tag)
+        self.attachment = Attachment.objects.create(
+            task=self.task, file='attachments/file.txt', file_type='document',
+            original_name='file.txt', uploaded_by=self.user,
+        )
+
+    def test_fields_limit_payload_and_columns(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/tasks/?fields=id,title')
+        self.assertEqual(response.json()['results'], [{'id': self.task.pk, 'title': 'Задача'}])
+        sql = [query['sql'] for query in ctx.captured_queries if 'FROM "tasks_task"' in query['sql']]
+        self.assertNotIn('"description"', sql[-1])
+        # без тегов, вложений и проектов: сессия, пользователь, COUNT, задачи
+        self.assertEqual(len(ctx.captured_queries), 4)
+
+    def test_relations_are_ids_unless_expanded(self):
+        response = self.client.get('/api/tasks/?fields=id,project,tags,attachments')
+        self.assertEqual(response.json()['results'], [{
+            'id': self.task.pk, 'project': self.project.pk,
+            'tags': [self.tag.pk], 'attachments': [self.attachment.pk],
+        }])
+
+        response = self.client.get(f'/api/tasks/{self.task.pk}/?fields=id,project,tags&expand=project,tags')
+        data = response.json()
+        self.assertEqual(set(data), {'id', 'project', 'tags'})
+        self.assertEqual(data['project']['title'], 'Проект')
+        self.assertEqual(data['tags'], [{'id': self.tag.pk, 'name': 'срочно', 'color': self.tag.color}])
+
+    def test_fast_list_matches_serializer(self):
+        query = '?fields=id,status_display,project,tags,attachments&expand=project,attachments'
+        listed = self.client.get(f'/api/tasks/{query}').json()['results'][0]
+        detail = self.client.get(f'/api/tasks/{self.task.pk}/{query}').json()
+        self.assertEqual(listed, detail)
+
+    def test_project_and_attachment_expand_user(self):
+        data = self.client.get('/api/projects/?fields=id,owner&expand=owner').json()['results'][0]
+        self.assertEqual(data['owner']['email'], 'author@example.com')
+        data = self.client.get('/api/attachments/?fields=id,uploaded_by').json()['results'][0]
+        self.assertEqual(data, {'id': self.attachment.pk, 'uploaded_by': self.user.pk})
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get('/api/tasks/?fields=id,secret&expand=author')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {'fields', 'expand'})
+
+
+class ApiEncodingTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('author')
+        self.client.force_login(self.user)
+        self.project = Project.objects.create(title='Проект', owner=self.user)
+        for i in range(30):
+            Task.objects.create(title=f'Задача {i}', description='описание ' * 20, project=self.project, author=self.user)
+        # без пакета brotli — заглушка: проверяется выбор кодировки, а не сам формат
+        stub = SimpleNamespace(compress=lambda content, quality: zlib.compress(content))
+        patcher = mock.patch.object(compression, 'brotli', compression.brotli or stub)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_fast_renderer_matches_json_renderer(self):
+        data = {
+            'date': timezone.now(), 'amount': Decimal('1.50'), 'text': 'строка ',
+            'items': [{'id': 1, 'none': None}],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_fast_parser_reads_request_body(self):
+        response = self.client.post(
+            '/api/tasks/', data=json.dumps({'title': 'Новая', 'priority': 2, 'project_id': self.project.pk}), content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post('/api/tasks/', data='{"title":', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_accepted_encodings(self):
+        self.assertEqual(accepted_encodings('gzip, br;q=0.5, *;q=0'), {'gzip': 1.0, 'br': 0.5, '*': 0.0})
+
+    def test_large_responses_are_compressed(self):
+        response = self.client.get('/api/tasks/?page_size=30', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))['results']), 30)
+
+        response = self.client.get('/api/tasks/?page_size=30', HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_pages_with_csrf_token_use_gzip_with_random_bytes(self):
+        # BREACH: у brotli нет поля для случайных байтов — страницы с токеном сжимаются gzip
+        for _ in range(2):
+            response = self.client.get('/tasks/', HTTP_ACCEPT_ENCODING='br, gzip;q=0.5')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertIn(b'csrfmiddlewaretoken', gzip.decompress(response.content))
+        gzip_header = response.content[:10]
+        self.assertEqual(gzip_header[3] & 0x08, 0x08)  # FNAME: случайные байты в имени файла
+
+    def test_csrf_token_detected_with_compression_below_csrf_middleware(self):
+        middleware = [name for name in settings.MIDDLEWARE if not name.endswith('CompressionMiddleware')]
+        middleware.insert(middleware.index('django.middleware.csrf.CsrfViewMiddleware') + 1,
+                          'taskflow_manager.compression.CompressionMiddleware')
+        with self.settings(MIDDLEWARE=middleware):
+            response = self.client.get('/tasks/', HTTP_ACCEPT_ENCODING='br, gzip;q=0.5')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_brotli_for_responses_without_secrets(self):
+        response = self.client.get('/api/tasks/?page_size=30', HTTP_ACCEPT_ENCODING='br, gzip;q=0.5')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        response = self.client.get('/tasks/', HTTP_ACCEPT_ENCODING='br')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    @override_settings(RESPONSE_COMPRESSION_MIN_SIZE=10 ** 6)
+    def test_small_responses_are_not_compressed(self):
+        response = self.client.get('/api/tasks/?page_size=30', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+class AsyncViewsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('author')
+        self.client.force_login(self.user)
+        self.project = Project.objects.create(title='Проект', owner=self.user)
+        tag = Tag.objects.create(name='срочно')
+        for i in range(3):
+            task = Task.objects.create(title=f'Задача {i}', project=self.project, author=self.user)
+            task.tags.add(tag)
+            Attachment.objects.create(
+                task=task, file=f'attachments/file{i}.txt', file_type='document',
+                original_name=f'file{i}.txt', uploaded_by=self.user,
+            )
+        self.task = task
+
+    def call(self, view, path, *args, headers=None):
+        request = AsyncRequestFactory().get(path, headers=headers)
+
+        async def auser():
+            return self.user
+
+        request.auser = auser
+        return async_to_sync(view)(request, *args)
+
+    @override_settings(API_RESPONSE_CACHE_TIMEOUT=0)
+    def test_api_matches_sync_viewsets(self):
+        cases = [
+            (views_async.tasks_api, '/api/tasks/?page_size=2&page=2', ()),
+            (views_async.tasks_api, '/api/tasks/?fields=id,tags&expand=tags&status=todo', ()),
+            (views_async.task_api, f'/api/tasks/{self.task.pk}/', (self.task.pk,)),
+            (views_async.projects_api, '/api/projects/?fields=id,owner&expand=owner', ()),
+            (views_async.project_api, f'/api/projects/{self.project.pk}/', (self.project.pk,)),
+        ]
+        for view, path, args in cases:
+            with self.subTest(path=path):
+                response = self.call(view, path, *args)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(json.loads(response.content), self.client.get(path).json())
+
+    def test_api_errors(self):
+        self.assertEqual(self.call(views_async.task_api, '/api/tasks/0/', 0).status_code, 404)
+        self.assertEqual(self.call(views_async.tasks_api, '/api/tasks/?page=9').status_code, 404)
+        self.assertEqual(self.call(views_async.tasks_api, '/api/tasks/?fields=secret').status_code, 400)
+
+    def test_html_views(self):
+        response = self.call(views_async.task_list, '/tasks/')
+        self.assertContains(response, 'Задача 2')
+        response = self.call(
+            views_async.task_detail_modal, '/tasks/', self.task.pk, headers={'X-Requested-With': 'XMLHttpRequest'},
+        )
+        self.assertIn('file2.txt', json.loads(response.content)['html'])
+        response = self.call(views_async.task_form_modal, '/tasks/', headers={'X-Requested-With': 'XMLHttpRequest'})
+        self.assertIn('Проект', json.loads(response.content)['html'])
+
+
+class AsyncUrlconf:
+    """ROOT_URLCONF как при ASYNC_VIEWS=1"""
+    urlpatterns = build_urlpatterns(async_views=True)
+
+
+@override_settings(ROOT_URLCONF=AsyncUrlconf)
+class AsyncRoutesTests(TestCase):
+    """маршруты при ASYNC_VIEWS=1 через AsyncClient: middleware сессий и аутентификации, CSRF, бюджеты"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('author')
+        self.async_client.force_login(self.user)
+        self.project = Project.objects.create(title='Проект', owner=self.user)
+        self.task = Task.objects.create(title='Задача', project=self.project, author=self.user)
+
+    async def test_routes_use_async_views(self):
+        ajax = {'X-Requested-With': 'XMLHttpRequest'}
+        cases = [
+            ('/tasks/', {}, 'task_list'),
+            (f'/tasks/task/{self.task.pk}/detail/', ajax, 'task_detail_modal'),
+            ('/tasks/task/form/', ajax, 'task_form_modal'),
+            (f'/tasks/task/{self.task.pk}/form/', ajax, 'task_form_modal'),
+            (f'/tasks/task/{self.task.pk}/delete-modal/', ajax, 'task_delete_modal'),
+            ('/api/tasks/', {}, 'view'),
+            (f'/api/tasks/{self.task.pk}/', {}, 'view'),
+            ('/api/projects/', {}, 'view'),
+            (f'/api/projects/{self.project.pk}/', {}, 'view'),
+        ]
+        for path, headers, name in cases:
+            with self.subTest(path=path):
+                # бюджеты строгие в тестах: превышение — исключение, а не 500 в логе
+                response = await self.async_client.get(path, headers=headers)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(asyncio.iscoroutinefunction(response.resolver_match.func))
+                self.assertEqual(response.resolver_match.func.__name__, name)
+        response = await self.async_client.get('/tasks/')
+        self.assertContains(response, 'Задача')
+        # ключи кеша списков у задач и проектов разные
+        response = await self.async_client.get('/api/projects/')
+        self.assertEqual(response.json()['results'][0]['title'], 'Проект')
+
+    def test_task_list_budget(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = async_to_sync(self.async_client.get)('/tasks/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 4)  # сессия, пользователь, задачи, проекты
+
+    async def test_anonymous_and_csrf(self):
+        await self.async_client.alogout()
+        response = await self.async_client.get('/tasks/')
+        self.assertEqual(response.status_code, 302)
+        response = await self.async_client.get('/api/tasks/')
+        self.assertEqual(response.status_code, 403)
+        client = AsyncClient(enforce_csrf_checks=True)
+        await client.aforce_login(self.user)
+        response = await client.post('/api/tasks/', {'title': 'Новая', 'project_id': self.project.pk},
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(await Task.objects.filter(title='Новая').aexists())
+
+
+class RecordingEventsBackend:
+    """бэкенд событий для тестов: запоминает опубликованное"""
+    published = []
+
+    def publish(self, user_id, event):
+        self.published.append((user_id, event))
+
+    def ensure_listener(self):
+        pass
+
+
+@override_settings(TASK_EVENTS_BACKEND='tasks.tests.RecordingEventsBackend')
+class TaskEventsTests(TestCase):
+
+    def setUp(self):
+        RecordingEventsBackend.published.clear()
+        self.user = User.objects.create_user('author')
+        self.project = Project.objects.create(title='Проект', owner=self.user)
+
+    def published(self, action):
+        with self.captureOnCommitCallbacks(execute=True):
+            action()
+        events_ = list(RecordingEventsBackend.published)
+        RecordingEventsBackend.published.clear()
+        return events_
+
+    def test_task_writes_publish_changed_fields(self):
+        [(user_id, event)] = self.published(
+            lambda: Task.objects.create(title='Задача', project=self.project, author=self.user)
+        )
+        self.assertEqual((user_id, event['type'], event['action']), (self.user.pk, 'task', 'created'))
+        task = Task.objects.get()
+
+        def update():
+            task.status = 'done'
+            task.priority = 5
+            task.save()
+
+        [(_, event)] = self.published(update)
+        self.assertEqual(event['fields'], ['priority', 'status'])
+        self.assertEqual(event['updated_at'], DateTimeField().to_representation(task.updated_at))
+
+        comment = self.published(lambda: Comment.objects.create(task=task, author=self.user, content='текст'))
+        self.assertEqual(comment[0][1]['type'], 'comment')
+        deleted = [event for _, event in self.published(task.delete) if event['type'] == 'task']
+        self.assertEqual([event['action'] for event in deleted], ['deleted'])
+
+    def test_no_event_before_commit(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            Task.objects.create(title='Задача', project=self.project, author=self.user)
+        self.assertEqual(RecordingEventsBackend.published, [])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(len(RecordingEventsBackend.published), 1)
+
+
+class TaskEventStreamTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('author')
+
+    def open_stream(self):
+        request = AsyncRequestFactory().get('/api/events/')
+
+        async def auser():
+            return self.user
+
+        request.auser = auser
+        return views_async.task_events(request)
+
+    def test_stream_delivers_events_and_unsubscribes(self):
+        async def scenario():
+            response = await self.open_stream()
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            stream = response.streaming_content
+            self.assertTrue((await anext(stream)).startswith(b'retry:'))
+            events.get_backend().publish(self.user.pk, events.task_event('task', 'updated', 7, ['status']))
+            events.get_backend().publish(self.user.pk + 1, events.task_event('task', 'updated', 8))
+            chunk = await asyncio.wait_for(anext(stream), 1)
+            await stream.aclose()
+            return chunk.decode()
+
+        chunk = async_to_sync(scenario)()
+        self.assertIn('event: task', chunk)
+        self.assertEqual(json.loads(chunk.split('data: ', 1)[1])['task'], 7)
+        self.assertEqual(events.broker.subscriber_count(), 0)
+
+    def test_wsgi_gets_503_and_page_does_not_subscribe(self):
+        # под WSGI бесконечный поток собирался бы в список и держал поток воркера
+        self.client.force_login(self.user)
+        response = self.client.get('/api/events/')
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.streaming)
+        self.assertNotContains(self.client.get('/tasks/'), 'subscribeTaskEvents();')
+
+        async_client = AsyncClient()
+        async_to_sync(async_client.aforce_login)(self.user)
+        response = async_to_sync(async_client.get)('/tasks/')
+        self.assertContains(response, 'subscribeTaskEvents();')
+
+    def test_cache_backend_fans_out_between_processes(self):
+        backend = events.CacheBackend()
+        backend.poll_interval = 0.01
+
+        async def scenario():
+            subscription = events.broker.subscribe(self.user.pk)
+            listener = asyncio.get_running_loop().create_task(backend.listen())
+            await asyncio.sleep(0.02)
+            # другой процесс: публикация только в общий кеш
+            await sync_to_async(backend.publish)(self.user.pk, events.task_event('task', 'created', 3))
+            try:
+                return await asyncio.wait_for(subscription.get(), 1)
+            finally:
+                listener.cancel()
+                subscription.close()
+
+        event = async_to_sync(scenario)()
+        self.assertEqual((event['task'], event['action']), (3, 'created'))
+
+
+@override_settings(API_RESPONSE_CACHE_TIMEOUT=0, QUERY_BUDGET_STRICT=True)
+class QueryBudgetEndpointsTests(QueryBudgetTestMixin, TestCase):
+    """бюджеты view (query_budgets, @query_budget) не зависят от числа строк"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('author')
+        self.client.force_login(self.user)
+        self.project = Project.objects.create(title='Проект', owner=self.user)
+        self.tags = [Tag.objects.create(name=f'тег {i}') for i in range(3)]
+
+    def add_tasks(self, count):
+        start = Task.objects.count()  # названия у автора уникальны
+        for i in range(start, start + count):
+            task = Task.objects.create(title=f'Задача {i}', project=self.project, author=self.user)
+            task.tags.set(self.tags)
+            for j in range(2):
+                Attachment.objects.create(
+                    task=task, file=f'attachments/file{j}.txt', original_name=f'file{j}.txt', uploaded_by=self.user,
+                )
+                Comment.objects.create(task=task, author=self.user, content='текст')
+        return task
+
+    def test_reads_within_budget_for_any_number_of_rows(self):
+        ajax = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+        for count in (1, 15):
+            task = self.add_tasks(count)
+            attachment = task.attachments.first()
+            urls = [
+                '/api/tasks/?page_size=5', '/api/tasks/?page_size=50', '/api/tasks/overdue/',
+                '/api/tasks/upcoming/', f'/api/tasks/{task.pk}/', f'/api/tasks/{task.pk}/history/',
+                '/api/history/', '/api/projects/', f'/api/projects/{self.project.pk}/',
+                '/api/attachments/', f'/api/attachments/{attachment.pk}/', '/tasks/',
+            ]
+            for url in urls:
+                with self.subTest(url=url, count=count):
+                    self.assertEqual(self.client.get(url).status_code, 200)
+            for url in [f'/tasks/task/{task.pk}/detail/', f'/tasks/task/{task.pk}/form/',
+                        '/tasks/task/form/', f'/tasks/task/{task.pk}/delete-modal/']:
+                with self.subTest(url=url, count=count):
+                    self.assertEqual(self.client.get(url, **ajax).status_code, 200)
+
+    def test_cascade_delete_does_not_query_per_related_row(self):
+        task = self.add_tasks(1)
+        with self.assertMaxQueries(12):
+            self.assertEqual(self.client.delete(f'/api/tasks/{task.pk}/').status_code, 204)
+        self.add_tasks(3)
+        # по запросу на задачу — только записи истории
+        with self.assertMaxQueries(12 + 3):
+            self.assertEqual(self.client.delete(f'/api/projects/{self.project.pk}/').status_code, 204)
+
+    def test_serializer_prefetches_relations(self):
+        self.add_tasks(5)
+        tasks = Task.objects.select_related('project__owner', 'author').prefetch_related(
+            'tags', Prefetch('attachments', queryset=Attachment.objects.select_related('uploaded_by')),
+        )
+        with self.assertMaxQueries(3):
+            TaskSerializer(tasks, many=True, context={'request': None}).data
+
+
+class SeedTaskflowTests(TestCase):
+
+    def seed(self, prefix, **options):
+        options = {'tasks': 30, 'users': 3, 'tags': 5, 'files': 4, 'attachments': 0.5, 'chunk_size': 10,
+                   'workers': 1, 'until': '2025-01-01', 'prefix': prefix, **options}
+        call_command('seed_taskflow', stdout=StringIO(), **options)
+        return Task.objects.filter(author__username__startswith=f'{prefix}_').order_by('pk')
+
+    def rows(self, tasks):
+        return [
+            (task.title, task.status, task.priority, task.due_date, task.created_at, task.completed_at,
+             task.tags.count(), task.comments.count(), task.attachments.count())
+            for task in tasks
+        ]
+
+    def test_seed_is_deterministic_and_consistent(self):
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            first = self.seed('a')
+            second = self.seed('b')
+            self.assertEqual(first.count(), 30)
+            self.assertEqual(self.rows(first), self.rows(second))
+
+            until = timezone.make_aware(datetime(2025, 1, 1))
+            for task in first:
+                self.assertEqual(task.project.owner_id, task.author_id)
+                self.assertLessEqual(task.created_at, until)
+                self.assertEqual(task.status == 'done', task.completed_at is not None)
+                self.assertTrue(task.history.filter(history_type='+').exists())
+            attachment = Attachment.objects.filter(task__in=first).first()
+            self.assertTrue(attachment.file.storage.exists(attachment.file.name))
+            self.assertEqual(
+                TaskDailyCount.objects.aggregate(total=Sum('tasks_count'))['total'], Task.objects.count(),
+            )
+
+            with self.assertRaises(CommandError):
+                self.seed('a')
+
+
+class BenchSuiteTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('author')
+        self.project = Project.objects.create(title='Проект', owner=self.user)
+        for number in range(3):
+            Task.objects.create(title=f'Задача {number}', project=self.project, author=self.user, status='todo')
+        self.collection = load_collection(settings.BASE_DIR / 'postman_collection.json',
+                                          {'base_url': 'http://127.0.0.1:1', 'csrf_token': 'token'})
+
+    def item(self, method, path):
+        return next(item for item in self.collection if item['method'] == method and item['path'] == path)
+
+    def test_collection_is_parsed(self):
+        self.assertTrue(all(item['path'].startswith('/') for item in self.collection))
+        self.assertEqual(self.item('POST', '/api/tasks/')['headers']['X-CSRFToken'], 'token')
+        self.assertEqual(self.item('POST', '/api/tasks/1/upload_attachment/')['form']['file'], None)
+        self.assertIn('/api/tasks/?status=todo', [item['path'] for item in self.collection])
+
+    def test_requests_get_real_ids_and_fresh_objects(self):
+        command, fixtures = BenchSuiteCommand(), BenchFixtures(self.user)
+        try:
+            deletes = command.concrete(self.item('DELETE', '/api/tasks/1/'), fixtures, 3, 'cookie')
+            self.assertEqual(len({path for _, path, _, _ in deletes}), 3)
+            creates = command.concrete(self.item('POST', '/api/tasks/'), fixtures, 2, 'cookie')
+            bodies = [json.loads(body) for _, _, body, _ in creates]
+            self.assertNotEqual(bodies[0]['title'], bodies[1]['title'])
+            self.assertEqual(bodies[0]['project_id'], fixtures.project.pk)
+            self.assertGreater(bodies[0]['due_date'], timezone.now().isoformat())
+        finally:
+            fixtures.cleanup()
+        self.assertEqual(Task.objects.count(), 3)
+        self.assertEqual(Project.objects.count(), 1)
+
+    def test_micro_benchmarks_are_saved_and_compared(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / 'first.json'
+            call_command('bench_suite', no_http=True, repeat=1, output=str(output), stdout=StringIO())
+            results = json.loads(output.read_text(encoding='utf-8'))
+            self.assertEqual(results['meta']['user'], 'author')
+            self.assertIn('TaskFilter ?status=todo', results['micro'])
+            self.assertIn('send_task_reminders --days 1', results['micro'])
+            stdout = StringIO()
+            call_command('bench_suite', no_http=True, repeat=1, output=str(Path(directory) / 'second.json'),
+                         compare=str(output), stdout=stdout)
+            self.assertIn('TaskFilter ?status=todo', stdout.getvalue().split('Сравнение')[1])
+
+
+@override_settings(API_RESPONSE_CACHE_TIMEOUT=0)
+class DueDayFilterTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('author')
+        self.client.force_login(self.user)
+        project = Project.objects.create(title='Проект', owner=self.user)
+        moments = {
+            'вечер 1 марта': datetime(2030, 3, 1, 22, 30),  # в Москве уже 2 марта
+            'полдень 2 марта': datetime(2030, 3, 2, 12, 0),
+            'конец марта': datetime(2030, 3, 31, 23, 59),
+            'апрель': datetime(2030, 4, 1, 0, 0),
+        }
+        for title, moment in moments.items():
+            Task.objects.create(title=title, project=project, author=self.user,
+                                due_date=timezone.make_aware(moment, dt_timezone.utc))
+
+    def titles(self, query):
+        response = self.client.get(f'/api/tasks/?page_size=50&{query}')
+        return sorted(task['title'] for task in response.json()['results'])
+
+    def test_due_day_is_utc_date_and_follows_due_date(self):
+        task = Task.objects.get(title='вечер 1 марта')
+        self.assertEqual(task.due_day, date(2030, 3, 1))
+        task.due_date += timedelta(hours=2)
+        task.save()
+        self.assertEqual(task.due_day, date(2030, 3, 2))
+        self.assertNotIn('due_day', [field.name for field in task.history.model._meta.fields])
+
+    def test_filters_use_day_ranges(self):
+        self.assertEqual(self.titles('due_date=2030-03-01'), ['вечер 1 марта'])
+        self.assertEqual(self.titles('due_date__gte=2030-03-31'), ['апрель', 'конец марта'])
+        self.assertEqual(self.titles('due_date__lte=2030-03-01'), ['вечер 1 марта'])
+        self.assertEqual(self.titles('due_month=2030-03'), ['вечер 1 марта', 'конец марта', 'полдень 2 марта'])
+        with CaptureQueriesContext(connection) as queries:
+            self.titles('due_month=2030-03')
+        sql = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertIn('"due_day" >=', sql)
+
+    def test_other_timezone_falls_back_to_due_date(self):
+        with timezone.override('Europe/Moscow'):
+            tasks = Task.objects.filter(due_day_in(date(2030, 3, 2), date(2030, 3, 2)))
+            self.assertEqual(sorted(tasks.values_list('title', flat=True)), ['вечер 1 марта', 'полдень 2 марта'])
+            self.assertNotIn('due_day', str(tasks.query).split('WHERE')[1])
+
+    def test_reminders_filter_by_range(self):
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        Task.objects.create(title='Завтра', project=Project.objects.get(), author=self.user,
+                            due_date=day_start(tomorrow) + timedelta(hours=23, minutes=59))
+        stdout = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('send_task_reminders', dry_run=True, stdout=stdout)
+        self.assertIn('Найдено задач: 1', stdout.getvalue())
+        self.assertIn('"due_date" <', queries.captured_queries[0]['sql'])
+
+
+@override_settings(API_RESPONSE_CACHE_TIMEOUT=0)
+class UniqueTaskTitleTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('author')
+        self.client.force_login(self.user)
+        self.project = Project.objects.create(title='Проект', owner=self.user)
+        self.task = Task.objects.create(title='Отчёт', project=self.project, author=self.user)
+
+    def test_api_rejects_duplicate_title_without_select(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/tasks/', {'title': 'Отчёт', 'project_id': self.project.pk},
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['title'], [TITLE_TAKEN])
+        self.assertFalse([q for q in queries.captured_queries if 'AS "a" FROM "tasks_task"' in q['sql']])
+
+        other = Task.objects.create(title='План', project=self.project, author=self.user)
+        response = self.client.patch(f'/api/tasks/{other.pk}/', {'title': 'Отчёт'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.patch(f'/api/tasks/{self.task.pk}/', {'title': 'Отчёт', 'priority': 5},
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Task.objects.filter(title='Отчёт').count(), 1)
+
+    def test_other_author_may_reuse_title(self):
+        other = User.objects.create_user('other')
+        project = Project.objects.create(title='Свой', owner=other)
+        Task.objects.create(title='Отчёт', project=project, author=other)
+        self.assertEqual(Task.objects.filter(title='Отчёт').count(), 2)
+
+    def test_ajax_views_report_duplicate(self):
+        ajax = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+        response = self.client.post('/tasks/task/create/', {'title': 'Отчёт', 'project': self.project.pk}, **ajax)
+        self.assertEqual(response.json(), {'success': False, 'error': TITLE_TAKEN})
+        other = Task.objects.create(title='План', project=self.project, author=self.user)
+        response = self.client.post(f'/tasks/task/{other.pk}/update/', {'title': 'Отчёт', 'project': self.project.pk},
+                                    **ajax)
+        self.assertEqual(response.json(), {'success': False, 'error': TITLE_TAKEN})
+        self.assertEqual(Task.objects.get(pk=other.pk).title, 'План')
+
+    def test_import_checks_titles_per_batch(self):
+        headers = ('title', 'Проект', 'Автор', 'priority')
+        rows = [('Отчёт', 'Проект', 'author', 3), ('Новая', 'Проект', 'author', 3), ('Новая', 'Проект', 'author', 3)]
+        rows += [(f'Задача {number}', 'Проект', 'author', 3) for number in range(20)]
+        resource = TaskResource(lookups=TaskImportLookups())
+        with CaptureQueriesContext(connection) as queries:
+            result = resource.import_data(tablib.Dataset(*rows, headers=headers), dry_run=True, user=self.user)
+        invalid = {row.number: row.error_dict for row in result.invalid_rows}
+        self.assertEqual(sorted(invalid), [1, 3])
+        self.assertEqual(invalid[1]['title'], [TITLE_TAKEN])
+        title_queries = [q for q in queries.captured_queries if '"tasks_task"."title" IN' in q['sql']]
+        self.assertEqual(len(title_queries), 1)
+
+
+@override_settings(API_RESPONSE_CACHE_TIMEOUT=0)
+class TagFilterTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('author')
+        self.client.force_login(self.user)
+        project = Project.objects.create(title='Проект', owner=self.user)
+        self.red, self.green, self.blue = (Tag.objects.create(name=name) for name in ('red', 'green', 'blue'))
+        tags = {'обе': [self.red, self.green], 'красная': [self.red], 'синяя': [self.blue], 'без тегов': []}
+        for title, task_tags in tags.items():
+            Task.objects.create(title=title, project=project, author=self.user).tags.set(task_tags)
+        other = User.objects.create_user('other')
+        Task.objects.create(title='чужая', project=Project.objects.create(title='Свой', owner=other),
+                            author=other).tags.set([self.red])
+
+    def titles(self, query):
+        response = self.client.get(f'/api/tasks/?page_size=50&{query}')
+        return sorted(task['title'] for task in response.json()['results'])
+
+    def test_any_and_all(self):
+        red, green, blue = self.red.pk, self.green.pk, self.blue.pk
+        self.assertEqual(self.titles(f'tags_any={red},{green}'), ['красная', 'обе'])
+        self.assertEqual(self.titles(f'tags_any={green},{blue}'), ['обе', 'синяя'])
+        self.assertEqual(self.titles(f'tags_all={red},{green}'), ['обе'])
+        self.assertEqual(self.titles(f'tags_all={red},{red}'), ['красная', 'обе'])
+        self.assertEqual(self.titles(f'tags_all={red},{blue}'), [])
+        self.assertEqual(self.titles(f'tags_any={red}&tags_all={green}'), ['обе'])
+
+    def test_filters_do_not_join_tags(self):
+        tasks = TaskFilter({'tags_any': f'{self.red.pk},{self.green.pk}'}, queryset=Task.objects.all()).qs
+        sql = str(tasks.query)
+        self.assertIn('EXISTS', sql)
+        self.assertNotIn('DISTINCT', sql)
+        tasks = TaskFilter({'tags_all': f'{self.red.pk},{self.green.pk}'}, queryset=Task.objects.all()).qs
+        self.assertIn('HAVING', str(tasks.query))
+        with connection.cursor() as cursor:
+            indexes = connection.introspection.get_constraints(cursor, 'tasks_task_tags')
+        self.assertIn(['tag_id', 'task_id'], [index['columns'] for index in indexes.values()])
+
+    def test_tag_counts_in_one_query(self):
+        Tag.objects.create(name='unused')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/tags/')
+        self.assertEqual(response.status_code, 200)
+        counts = {tag['name']: tag['tasks_count'] for tag in response.json()}
+        self.assertEqual(counts, {'red': 2, 'green': 1, 'blue': 1})
+        self.assertEqual(response.json()[0]['name'], 'red')
+        sql = [query['sql'] for query in queries.captured_queries if '"tasks_tag"' in query['sql']]
+        self.assertEqual(len(sql), 1)
+        self.assertIn('"tasks_task"."author_id" =', sql[0].split(' WHERE ')[1])
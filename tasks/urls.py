@@ -1,22 +1,30 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, views_async
 
-urlpatterns = [
-    path('', views.task_list, name='task_list'),
-    
-    # AJAX endpoints для модалок
-    path('task/<int:pk>/detail/', views.task_detail_modal, name='task_detail_modal'),
-    path('task/form/', views.task_form_modal, name='task_form_modal'),
-    path('task/<int:pk>/form/', views.task_form_modal, name='task_form_modal_edit'),
-    path('task/<int:pk>/delete-modal/', views.task_delete_modal, name='task_delete_modal'),
-    
-    # AJAX endpoints для действий
-    path('task/create/', views.task_create, name='task_create_ajax'),
-    path('task/<int:pk>/update/', views.task_update, name='task_update_ajax'),
-    path('task/<int:pk>/delete/', views.task_delete, name='task_delete_ajax'),
-    
-    # Вложения
-    path('task/<int:pk>/upload-attachment/', views.upload_attachment, name='upload_attachment'),
-    path('task/<int:pk>/upload-multiple-attachments/', views.upload_multiple_attachments, name='upload_multiple_attachments'),
-    path('attachment/<int:pk>/delete/', views.delete_attachment, name='delete_attachment'),
-]
\ No newline at end of file
+
+def task_urlpatterns(async_views):
+    """страница списка и модалки только читают — под ASGI их можно отдавать async-версиями"""
+    read_views = views_async if async_views else views
+    return [
+        path('', read_views.task_list, name='task_list'),
+
+        # AJAX endpoints для модалок
+        path('task/<int:pk>/detail/', read_views.task_detail_modal, name='task_detail_modal'),
+        path('task/form/', read_views.task_form_modal, name='task_form_modal'),
+        path('task/<int:pk>/form/', read_views.task_form_modal, name='task_form_modal_edit'),
+        path('task/<int:pk>/delete-modal/', read_views.task_delete_modal, name='task_delete_modal'),
+
+        # AJAX endpoints для действий
+        path('task/create/', views.task_create, name='task_create_ajax'),
+        path('task/<int:pk>/update/', views.task_update, name='task_update_ajax'),
+        path('task/<int:pk>/delete/', views.task_delete, name='task_delete_ajax'),
+
+        # Вложения
+        path('task/<int:pk>/upload-attachment/', views.upload_attachment, name='upload_attachment'),
+        path('task/<int:pk>/upload-multiple-attachments/', views.upload_multiple_attachments, name='upload_multiple_attachments'),
+        path('attachment/<int:pk>/delete/', views.delete_attachment, name='delete_attachment'),
+    ]
+
+
+urlpatterns = task_urlpatterns(settings.ASYNC_VIEWS)
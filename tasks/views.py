@@ -1,27 +1,41 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import ValidationError
 from django.http import JsonResponse
 from django.template.loader import render_to_string
-from .models import Task, Project, Attachment
+from .models import Task, Project, Attachment, unique_title
+from . import events
+from taskflow_manager.db_routers import replica_reads
+from monitoring.budget import query_budget
 import os
 
+
+def files_budget(base, per_file=2):
+    """бюджет запросов view с загрузкой файлов: на каждый файл — вложение и версия задачи"""
+    return lambda request, *args, **kwargs: base + per_file * len(request.FILES.getlist('files'))
+
 # основной view (главная страница)
+@query_budget(3)
 @login_required
+@replica_reads()
 def task_list(request):
     """Главная страница со списком задач."""
-    tasks = Task.objects.filter(author=request.user).order_by('-created_at')
+    tasks = Task.objects.filter(author=request.user).select_related('project').order_by('-created_at')
     projects = Project.objects.filter(owner=request.user)
     return render(request, 'tasks/task_list.html', {
         'tasks': tasks,
-        'projects': projects
+        'projects': projects,
+        'live_events': events.streaming_supported(request),
     })
 
 # ajax views для модалок 
+@query_budget(4)
 @login_required
+@replica_reads()
 def task_detail_modal(request, pk):
     """детали задачи С ВЛОЖЕНИЯМИ"""
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        task = get_object_or_404(Task, pk=pk, author=request.user)
+        task = get_object_or_404(Task.objects.select_related('project'), pk=pk, author=request.user)
         attachments = task.attachments.all()  # явно получаем вложения
         html = render_to_string('tasks/task_detail_content.html', {
             'task': task,
@@ -31,13 +45,15 @@ def task_detail_modal(request, pk):
     return redirect('task_list')
 
 
+@query_budget(4)
 @login_required
+@replica_reads()
 def task_form_modal(request, pk=None):
     """форма создания/редактирования задачи"""
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         task = None
         if pk:
-            task = get_object_or_404(Task, pk=pk, author=request.user)
+            task = get_object_or_404(Task.objects.select_related('project'), pk=pk, author=request.user)
         
         projects = Project.objects.filter(owner=request.user)
         html = render_to_string('tasks/task_form_content.html', {
@@ -47,7 +63,9 @@ def task_form_modal(request, pk=None):
         return JsonResponse({'html': html})
     return redirect('task_list')
 
+@query_budget(4)
 @login_required
+@replica_reads()
 def task_delete_modal(request, pk):
     """подтверждение удаления."""
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -57,21 +75,23 @@ def task_delete_modal(request, pk):
     return redirect('task_list')
 
 # обработка форм 
+@query_budget(files_budget(4))
 @login_required
 def task_create(request):
     # создание через ajax С ФАЙЛАМИ
     if request.method == 'POST' and request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         try:
-            # Создаем задачу
-            task = Task.objects.create(
-                title=request.POST.get('title'),
-                description=request.POST.get('description', ''),
-                status=request.POST.get('status', 'todo'),
-                priority=int(request.POST.get('priority', 3)),
-                due_date=request.POST.get('due_date') or None,
-                author=request.user,
-                project_id=request.POST.get('project') or None
-            )
+            # Создаем задачу (повтор названия у автора отклонит ограничение БД)
+            with unique_title():
+                task = Task.objects.create(
+                    title=request.POST.get('title'),
+                    description=request.POST.get('description', ''),
+                    status=request.POST.get('status', 'todo'),
+                    priority=int(request.POST.get('priority', 3)),
+                    due_date=request.POST.get('due_date') or None,
+                    author=request.user,
+                    project_id=request.POST.get('project') or None
+                )
             
             # Обрабатываем файлы если есть
             files = request.FILES.getlist('files')
@@ -98,10 +118,13 @@ def task_create(request):
             
             return JsonResponse(response_data)
             
+        except ValidationError as e:
+            return JsonResponse({'success': False, 'error': ' '.join(e.messages)})
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)})
     return JsonResponse({'success': False, 'error': 'Invalid request'})
 
+@query_budget(5)
 @login_required
 def task_update(request, pk):
     # обновление задачи через ajax.
@@ -114,16 +137,20 @@ def task_update(request, pk):
             task.priority = int(request.POST.get('priority', 3))
             task.due_date = request.POST.get('due_date') or None
             task.project_id = request.POST.get('project') or None
-            task.save()
+            with unique_title():
+                task.save()
             
             return JsonResponse({
                 'success': True,
                 'message': f'Задача "{task.title}" обновлена!'
             })
+        except ValidationError as e:
+            return JsonResponse({'success': False, 'error': ' '.join(e.messages)})
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)})
     return JsonResponse({'success': False, 'error': 'Invalid request'})
 
+@query_budget(11)
 @login_required
 def task_delete(request, pk):
     # удаление черещ ajax
@@ -140,6 +167,7 @@ def task_delete(request, pk):
             return JsonResponse({'success': False, 'error': str(e)})
     return JsonResponse({'success': False, 'error': 'Invalid request'})
 
+@query_budget(files_budget(3))
 @login_required
 def upload_multiple_attachments(request, pk):
     """загрузка нескольких вложений к задаче через AJAX"""
@@ -190,6 +218,7 @@ def upload_multiple_attachments(request, pk):
     })
 
 
+@query_budget(5)
 @login_required
 def upload_attachment(request, pk):
     """загрузка вложения к задаче через AJAX"""
@@ -239,16 +268,17 @@ def upload_attachment(request, pk):
         'error': 'Invalid request'
     })
 
+@query_budget(6)
 @login_required
 def delete_attachment(request, pk):
     """удаление вложения через AJAX"""
     if request.method == 'POST' and request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         try:
             # Ищем вложение по ID и проверяем, что пользователь владелец задачи
-            attachment = get_object_or_404(Attachment, pk=pk)
+            attachment = get_object_or_404(Attachment.objects.select_related('task'), pk=pk)
             
             # Проверяем, что текущий пользователь - автор задачи
-            if attachment.task.author != request.user:
+            if attachment.task.author_id != request.user.pk:
                 return JsonResponse({
                     'success': False, 
                     'error': 'У вас нет прав на удаление этого файла'
@@ -1,37 +1,82 @@
-from rest_framework import viewsets, filters, status
+from rest_framework import viewsets, filters, status, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q
+from django.db.models import Count, Q
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from datetime import timedelta
 
-from .models import Task, Project, Attachment
-from .serializers import TaskSerializer, ProjectSerializer, CommentSerializer, AttachmentSerializer
+from .models import Task, Project, Attachment, Tag
+from .serializers import (
+    TaskSerializer, ProjectSerializer, CommentSerializer, AttachmentSerializer, TaskHistorySerializer,
+    TaskListFastSerializer, TagUsageSerializer,
+)
 from .filters import TaskFilter 
-from .pagination import TaskPagination
+from .pagination import TaskPagination, HistoryCursorPagination
+from .history import HistoricalTask, attach_previous, history_with_previous, history_since
+from taskflow_manager.db_routers import ReplicaReadMixin
+from .caching import CachedDetailMixin, CachedListMixin
+from .invalidation import PROJECT, TASK
+from .sparse import SparseFieldsViewMixin, prefetch, related_columns
+from monitoring.budget import QueryBudgetMixin
 
+USER_COLUMNS = ('username', 'email', 'avatar', 'date_joined')
 
-class ProjectViewSet(viewsets.ModelViewSet):
+
+class ProjectViewSet(QueryBudgetMixin, SparseFieldsViewMixin, CachedListMixin, CachedDetailMixin, viewsets.ModelViewSet):
     """API для управления проектами"""
+    cache_scope = PROJECT  # retrieve кешируется по версии проекта (tasks/caching.py)
     serializer_class = ProjectSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     search_fields = ['title']
+
+    # не больше SQL-запросов на действие при любом числе строк, вместе с сессией и пользователем
+    # (см. monitoring/budget.py); у destroy бюджета нет — история пишет строку на каждую задачу проекта
+    query_budgets = {
+        'list': 4, 'retrieve': 3, 'create': 4, 'update': 5, 'partial_update': 5,
+    }
+
+    # ?fields= / ?expand=owner (см. tasks/sparse.py)
+    sparse_columns = {
+        'id': ('id',),
+        'title': ('title',),
+        'color': ('color',),
+        'owner': (),
+        'owner_username': ('owner__username',),
+        'created_at': ('created_at',),
+        'updated_at': ('updated_at',),
+    }
+    sparse_relations = {
+        'owner': (('owner',), related_columns('owner', *USER_COLUMNS)),
+    }
     
     def get_queryset(self):
         # показываем только проекты текущего пользователя
-        return Project.objects.filter(owner=self.request.user)
+        return self.sparse_queryset(Project.objects.filter(owner=self.request.user))
     
     def perform_create(self, serializer):
         # автоматически устанавливаем владельца
         serializer.save(owner=self.request.user)
 
-class TaskViewSet(viewsets.ModelViewSet):
+class TaskViewSet(
+    QueryBudgetMixin, SparseFieldsViewMixin, ReplicaReadMixin, CachedListMixin, CachedDetailMixin, viewsets.ModelViewSet,
+):
     """API для управления задачами (ОСНОВНОЙ)"""
+    cache_scope = TASK  # retrieve кешируется по версии задачи
     serializer_class = TaskSerializer
     permission_classes = [IsAuthenticated]
+    # чтения, которые можно отдавать с реплик
+    replica_actions = ('list', 'retrieve', 'overdue', 'upcoming')
+
+    # списки: сессия, пользователь, COUNT, страница, проекты, теги, вложения — при любом page_size
+    query_budgets = {
+        'list': 7, 'overdue': 7, 'upcoming': 7, 'retrieve': 5, 'history': 7,
+        'create': 9, 'update': 12, 'partial_update': 12, 'destroy': 12,
+        'change_status': 7, 'upload_attachment': 7,
+    }
     
     # настройки фильтрации
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -41,10 +86,64 @@ class TaskViewSet(viewsets.ModelViewSet):
     ordering = ['-created_at']
     
     pagination_class = TaskPagination
+
+    # списки сериализуются быстрым read-only путём (тот же JSON, см. TaskListFastSerializer)
+    fast_serializer_actions = ('list', 'overdue', 'upcoming')
+
+    # ?fields= / ?expand=project,tags,attachments (см. tasks/sparse.py)
+    sparse_columns = {
+        'id': ('id',),
+        'title': ('title',),
+        'description': ('description',),
+        'status': ('status',),
+        'status_display': ('status',),
+        'priority': ('priority',),
+        'due_date': ('due_date',),
+        'completed_at': ('completed_at',),
+        'project': (),
+        'author_username': ('author__username',),
+        'tags': (),
+        'attachments': (),
+        'author': ('author',),
+        'editor': ('editor',),
+        'created_at': ('created_at',),
+        'updated_at': ('updated_at',),
+    }
+    sparse_relations = {
+        'project': (
+            ('project',),
+            related_columns('project', 'title', 'color', 'owner', 'owner__username', 'created_at', 'updated_at'),
+        ),
+        'tags': (
+            prefetch('tags', Tag.objects.only('id').order_by('name')),
+            prefetch('tags', Tag.objects.order_by('name')),
+        ),
+        'attachments': (
+            prefetch('attachments', Attachment.objects.only('id', 'task')),
+            prefetch('attachments', Attachment.objects.select_related('uploaded_by')),
+        ),
+    }
+    default_expand = ('project', 'tags', 'attachments')
     
     def get_queryset(self):
         # 5. фильтрация по текущему пользователю (автоматически)
-        return Task.objects.filter(author=self.request.user)
+        return self.sparse_queryset(Task.objects.filter(author=self.request.user))
+
+    def use_fast_serializer(self):
+        return self.action in self.fast_serializer_actions
+
+    def paginate_queryset(self, queryset):
+        if self.use_fast_serializer():
+            queryset = TaskListFastSerializer.prepare(queryset, *self.get_sparse_params())
+        return super().paginate_queryset(queryset)
+
+    def get_serializer(self, *args, **kwargs):
+        if kwargs.get('many') and self.use_fast_serializer():
+            fields, expand = self.get_sparse_params()
+            return TaskListFastSerializer(
+                *args, context=self.get_serializer_context(), fields=fields, expand=expand,
+            )
+        return super().get_serializer(*args, **kwargs)
     
     # @action методы (специальные эндпоинты)
     
@@ -144,19 +243,100 @@ class TaskViewSet(viewsets.ModelViewSet):
         
         serializer = AttachmentSerializer(attachment, context={'request': request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get'])
+    def history(self, request, pk=None):
+        """история изменений задачи с диффом по полям"""
+        task = self.get_object()
+        rows = history_with_previous(HistoricalTask.objects.filter(id=task.pk))
+        paginator = HistoryCursorPagination()
+        page = attach_previous(paginator.paginate_queryset(rows, request, view=self))
+        serializer = TaskHistorySerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
         
 
-class AttachmentViewSet(viewsets.ModelViewSet):
+class TaskHistoryViewSet(QueryBudgetMixin, viewsets.GenericViewSet):
+    """Лента изменений задач пользователя: /api/history/?since=<ISO дата>
+
+    Диффы считаются двумя запросами на страницу: строки с номером предыдущей
+    записи задачи и сами предыдущие записи (history.attach_previous), страницы — по курсору.
+    """
+    serializer_class = TaskHistorySerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = HistoryCursorPagination
+    query_budgets = {'list': 4}
+
+    def get_queryset(self):
+        history = HistoricalTask.objects.filter(author_id=self.request.user.pk)
+        since = self.request.query_params.get('since')
+        if not since:
+            return history_with_previous(history)
+        since_date = parse_datetime(since)
+        if since_date is None:
+            raise serializers.ValidationError({'since': 'ожидается дата и время в формате ISO 8601'})
+        if timezone.is_naive(since_date):
+            since_date = timezone.make_aware(since_date)
+        return history_since(history, since_date)
+
+    def list(self, request):
+        page = attach_previous(self.paginate_queryset(self.get_queryset()))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class TagViewSet(QueryBudgetMixin, viewsets.ReadOnlyModelViewSet):
+    """Теги задач текущего пользователя с числом задач: /api/tags/
+
+    Один запрос: задачи автора (индекс по author) -> их связи -> GROUP BY
+    по тегу; теги, которых нет в задачах пользователя, не попадают в список.
+    Тегов немного, поэтому список отдаётся без пагинации.
+    """
+    serializer_class = TagUsageSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = None
+    query_budgets = {'list': 3, 'retrieve': 3}
+
+    def get_queryset(self):
+        return Tag.objects.filter(tasks__author=self.request.user).annotate(
+            tasks_count=Count('tasks'),
+        ).order_by('-tasks_count', 'name')
+
+
+class AttachmentViewSet(QueryBudgetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     """API для управления вложениями"""
     serializer_class = AttachmentSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['file_type', 'task']
+    query_budgets = {
+        'list': 4, 'retrieve': 3, 'create': 6, 'update': 5, 'partial_update': 5, 'destroy': 5,
+    }
+
+    # ?fields= / ?expand=uploaded_by (см. tasks/sparse.py)
+    sparse_columns = {
+        'id': ('id',),
+        'task': ('task',),
+        'file': ('file',),
+        'file_url': ('file',),
+        'file_type': ('file_type',),
+        'original_name': ('original_name',),
+        'file_size': ('file_size',),
+        'readable_size': ('file_size',),
+        'file_icon': ('file_type',),
+        'uploaded_by': (),
+        'uploaded_by_username': ('uploaded_by__username',),
+        'uploaded_at': ('uploaded_at',),
+        'updated_at': ('updated_at',),
+        'description': ('description',),
+    }
+    sparse_relations = {
+        'uploaded_by': (('uploaded_by',), related_columns('uploaded_by', *USER_COLUMNS)),
+    }
     
     def get_queryset(self):
-        queryset = Attachment.objects.filter(
+        queryset = self.sparse_queryset(Attachment.objects.filter(
             task__author=self.request.user
-        )
+        ))
         
         # дополнительная фильтрация по задаче, если передали task_id
         task_id = self.request.query_params.get('task_id')
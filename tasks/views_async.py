@@ -0,0 +1,298 @@
+"""Асинхронные версии горячих путей чтения (включаются settings.ASYNC_VIEWS).
+
+Под ASGI-сервером синхронная view целиком уходит в поток через
+sync_to_async. Эти view работают в цикле событий и обращаются к БД через
+async ORM (aget, acount, aiterator), поэтому запрос не занимает поток, пока
+ждёт базу. Ответы те же, что у синхронных версий:
+
+- task_list и модалки — как в tasks/views.py;
+- GET списка и объекта задач и проектов — как у TaskViewSet/ProjectViewSet
+  (те же фильтры, ?fields=/?expand=, пагинация и кеш ответов). Остальные
+  методы и Browsable API (Accept: text/html) обслуживает прежний viewset.
+
+task_events (SSE, /api/events/) асинхронна всегда: соединение висит долго
+и под WSGI заняло бы поток воркера, поэтому там она отвечает 503.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
+from django.core.paginator import InvalidPage
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, redirect, render
+from django.template.loader import render_to_string
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException, NotAuthenticated, NotFound
+
+from taskflow_manager.db_routers import replica_reads
+from taskflow_manager.renderers import FastJSONRenderer
+from monitoring.budget import query_budget
+from . import events
+from .caching import CachedDetailMixin, CachedListMixin
+from .models import Project, Task
+from .serializers import TaskListFastSerializer
+from .views_api import ProjectViewSet, TaskViewSet
+
+
+async def request_user(request):
+    """пользователь через async-сессию; request.user заменяется им, чтобы шаблоны не ходили в БД"""
+    user = await request.auser()
+    request.user = user
+    return user
+
+
+async def evaluated(queryset):
+    """выполняет запрос асинхронно и заполняет кеш результатов (дальше шаблон читает из него)"""
+    async for _ in queryset:
+        break
+    return queryset
+
+
+# HTML
+
+@query_budget(4)  # сессия, пользователь, задачи, проекты
+@login_required
+async def task_list(request):
+    """Главная страница со списком задач."""
+    user = await request_user(request)
+    with replica_reads():
+        tasks = await evaluated(
+            Task.objects.filter(author=user).select_related('project').order_by('-created_at')
+        )
+        projects = await evaluated(Project.objects.filter(owner=user))
+    return render(request, 'tasks/task_list.html', {
+        'tasks': tasks,
+        'projects': projects,
+        'live_events': events.streaming_supported(request),
+    })
+
+
+@query_budget(4)
+@login_required
+async def task_detail_modal(request, pk):
+    """детали задачи С ВЛОЖЕНИЯМИ"""
+    if request.headers.get('X-Requested-With') != 'XMLHttpRequest':
+        return redirect('task_list')
+    user = await request_user(request)
+    with replica_reads():
+        task = await aget_object_or_404(Task.objects.select_related('project'), pk=pk, author=user)
+        attachments = [attachment async for attachment in task.attachments.all()]
+    html = render_to_string('tasks/task_detail_content.html', {
+        'task': task,
+        'attachments': attachments
+    })
+    return JsonResponse({'html': html})
+
+
+@query_budget(4)
+@login_required
+async def task_form_modal(request, pk=None):
+    """форма создания/редактирования задачи"""
+    if request.headers.get('X-Requested-With') != 'XMLHttpRequest':
+        return redirect('task_list')
+    user = await request_user(request)
+    with replica_reads():
+        task = None
+        if pk:
+            task = await aget_object_or_404(Task.objects.select_related('project'), pk=pk, author=user)
+        projects = await evaluated(Project.objects.filter(owner=user))
+    html = render_to_string('tasks/task_form_content.html', {
+        'task': task,
+        'projects': projects
+    })
+    return JsonResponse({'html': html})
+
+
+@query_budget(4)
+@login_required
+async def task_delete_modal(request, pk):
+    """подтверждение удаления."""
+    if request.headers.get('X-Requested-With') != 'XMLHttpRequest':
+        return redirect('task_list')
+    user = await request_user(request)
+    with replica_reads():
+        task = await aget_object_or_404(Task.objects.select_related('project'), pk=pk, author=user)
+    html = render_to_string('tasks/task_delete_content.html', {'task': task})
+    return JsonResponse({'html': html})
+
+
+# REST API
+
+def json_response(data, status=200):
+    return HttpResponse(FastJSONRenderer().render(data), status=status, content_type='application/json')
+
+
+def api_error(exc):
+    """как rest_framework.views.exception_handler"""
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    return json_response(data, status=exc.status_code)
+
+
+async def init_view(viewset_class, basename, request, action, **kwargs):
+    """viewset с DRF-запросом для action, без диспетчеризации (аутентификация — async)"""
+    user = await request_user(request)
+    # basename — как при регистрации в роутере: на нём ключи кеша списков
+    view = viewset_class(
+        action=action, action_map={'get': action}, basename=basename, args=(), kwargs=kwargs, format_kwarg=None,
+    )
+    view.request = view.initialize_request(request, **kwargs)
+    view.headers = {}
+    if not user.is_authenticated:
+        exc = NotAuthenticated()
+        if not view.get_authenticate_header(view.request):
+            exc.status_code = 403  # как APIView.handle_exception: у SessionAuthentication нет WWW-Authenticate
+        raise exc
+    return view
+
+
+def use_replica(view):
+    return replica_reads(view.action in getattr(view, 'replica_actions', ()))
+
+
+async def api_list(viewset_class, basename, request):
+    try:
+        view = await init_view(viewset_class, basename, request, 'list')
+        with use_replica(view), view.query_budget('list'):
+            timeout = getattr(settings, 'API_RESPONSE_CACHE_TIMEOUT', 0)
+            key = None
+            if timeout and isinstance(view, CachedListMixin):
+                key = await sync_to_async(view.get_list_cache_key)(view.request)
+                data = await cache.aget(key)
+                if data is not None:
+                    return json_response(data)
+            data = await list_data(view)
+            if key is not None:
+                await cache.aset(key, data, timeout)
+            return json_response(data)
+    except APIException as exc:
+        return api_error(exc)
+
+
+async def list_data(view):
+    # фильтры django-filter могут проверять значения запросом (?project=) — в потоке
+    queryset = await sync_to_async(view.filter_queryset)(view.get_queryset())
+    fast = getattr(view, 'use_fast_serializer', lambda: False)()
+    fields, expand = view.get_sparse_params()
+    if fast:
+        queryset = TaskListFastSerializer.prepare(queryset, fields, expand)
+
+    pagination = view.paginator
+    page_size = pagination.get_page_size(view.request) if pagination is not None else None
+    if page_size:
+        paginator = pagination.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()
+        number = pagination.get_page_number(view.request, paginator)
+        try:
+            page = paginator.page(number)
+        except InvalidPage as exc:
+            raise NotFound(pagination.invalid_page_message.format(page_number=number, message=str(exc)))
+        page.object_list = [obj async for obj in page.object_list.aiterator(chunk_size=page_size)]
+        pagination.page, pagination.request = page, view.request
+        objects = page.object_list
+    else:
+        objects = [obj async for obj in queryset.aiterator(chunk_size=2000)]
+
+    if fast:
+        data = await TaskListFastSerializer(
+            objects, context=view.get_serializer_context(), fields=fields, expand=expand,
+        ).adata()
+    else:
+        data = view.get_serializer(objects, many=True).data
+    if page_size:
+        data = pagination.get_paginated_response(data).data
+    return data
+
+
+async def api_retrieve(viewset_class, basename, request, pk):
+    try:
+        view = await init_view(viewset_class, basename, request, 'retrieve', pk=pk)
+        with use_replica(view), view.query_budget('retrieve'):
+            timeout = getattr(settings, 'API_RESPONSE_CACHE_TIMEOUT', 0)
+            key = None
+            if timeout and isinstance(view, CachedDetailMixin):
+                key = await sync_to_async(view.get_detail_cache_key)(view.request)
+                data = await cache.aget(key)
+                if data is not None:
+                    return json_response(data)
+            queryset = await sync_to_async(view.filter_queryset)(view.get_queryset())
+            try:
+                instance = await queryset.aget(pk=pk)
+            except (queryset.model.DoesNotExist, ValueError):
+                raise NotFound(f'No {queryset.model._meta.object_name} matches the given query.')
+            data = view.get_serializer(instance).data
+            if key is not None:
+                await cache.aset(key, data, timeout)
+            return json_response(data)
+    except APIException as exc:
+        return api_error(exc)
+
+
+def reads_async(async_view, sync_view):
+    """GET — async-версия, остальное (и Browsable API) — прежний синхронный viewset"""
+    sync_view = sync_to_async(sync_view)
+
+    async def view(request, *args, **kwargs):
+        if request.method == 'GET' and 'text/html' not in request.headers.get('Accept', ''):
+            return await async_view(request, *args, **kwargs)
+        return await sync_view(request, *args, **kwargs)
+
+    return csrf_exempt(view)
+
+
+DETAIL_ACTIONS = {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}
+
+tasks_api = reads_async(
+    lambda request: api_list(TaskViewSet, 'task', request),
+    TaskViewSet.as_view({'get': 'list', 'post': 'create'}, basename='task'),
+)
+task_api = reads_async(
+    lambda request, pk: api_retrieve(TaskViewSet, 'task', request, pk),
+    TaskViewSet.as_view(DETAIL_ACTIONS, basename='task'),
+)
+projects_api = reads_async(
+    lambda request: api_list(ProjectViewSet, 'project', request),
+    ProjectViewSet.as_view({'get': 'list', 'post': 'create'}, basename='project'),
+)
+project_api = reads_async(
+    lambda request, pk: api_retrieve(ProjectViewSet, 'project', request, pk),
+    ProjectViewSet.as_view(DETAIL_ACTIONS, basename='project'),
+)
+
+
+class EventsUnavailable(APIException):
+    status_code = 503
+    default_detail = 'Поток событий доступен только под ASGI-сервером.'
+    default_code = 'events_unavailable'
+
+
+@query_budget(2)  # только сессия и пользователь; дальше поток без запросов
+async def task_events(request):
+    """Поток изменений задач пользователя (Server-Sent Events), см. tasks/events.py"""
+    if not events.streaming_supported(request):
+        return api_error(EventsUnavailable())
+    user = await request_user(request)
+    if not user.is_authenticated:
+        return api_error(NotAuthenticated())
+    subscription = events.subscribe(user.pk)
+    heartbeat = getattr(settings, 'TASK_EVENTS_HEARTBEAT', 15)
+
+    async def stream():
+        try:
+            # клиент переподключается через 3 с; после переподключения он перечитывает список
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield ': ping\n\n'  # не даём прокси закрыть простаивающее соединение
+                    continue
+                yield events.format_sse(event)
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx не буферизует поток
+    return response
@@ -1,15 +1,17 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.utils.html import format_html
+from tasks.admin_utils import AnnotatedCountsMixin
 from .models import User
 
 @admin.register(User)
-class CustomUserAdmin(UserAdmin):
+class CustomUserAdmin(AnnotatedCountsMixin, UserAdmin):
     list_display = ('username', 'email', 'avatar_display', 'projects_count', 'is_staff', 'date_joined')
     list_filter = ('is_staff', 'is_superuser', 'is_active', 'date_joined')
     search_fields = ('username', 'email', 'first_name', 'last_name')
     ordering = ('-date_joined',)
     readonly_fields = ('date_joined', 'last_login', 'avatar_preview')
+    count_annotations = {'projects_count': 'projects'}
     
     fieldsets = (
         (None, {'fields': ('username', 'password')}),
@@ -48,4 +50,4 @@ class CustomUserAdmin(UserAdmin):
 
     @admin.display(description='Проектов', ordering='projects_count')
     def projects_count(self, obj):
-        return obj.projects.count()
\ No newline at end of file
+        return obj.projects_count
\ No newline at end of file
@@ -1 +1,30 @@
-# Create your tests here.
+from django.test import TestCase
+
+from tasks.models import Project
+from tasks.tests import ChangelistQueriesMixin
+from .models import User
+
+
+class UserAdminChangelistQueriesTests(ChangelistQueriesMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.counter = 0
+
+    def add_rows(self, count=3):
+        for _ in range(count):
+            self.counter += 1
+            user = User.objects.create_user(f'user{self.counter}')
+            Project.objects.create(title=f'Проект {self.counter}', owner=user)
+
+    def test_user_changelist(self):
+        self.add_rows()
+        self.assertConstantQueries('/admin/users/user/', self.add_rows)
+
+    def test_user_changelist_sorted_by_projects_count(self):
+        self.add_rows()
+        self.assertConstantQueries('/admin/users/user/?o=-5', self.add_rows)